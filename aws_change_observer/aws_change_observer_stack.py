@@ -11,6 +11,7 @@ from aws_cdk import (
     aws_events as events,
     aws_events_targets as event_targets,
     Duration,
+    BundlingOptions,
     aws_s3 as s3,
     aws_sns as sns
 )
@@ -25,13 +26,15 @@ class AwsChangeObserverStack(Stack):
         # Constants
         DOMAIN_NAME = 'change-observer.com'
         SUBDOMAIN = 'api'
-        TABLE_NAME = 'LocationMarkers'        
+        TABLE_NAME = 'LocationMarkerItems'  # renamed with the sort key, which requires a new table
+        LEGACY_TABLE_NAME = 'LocationMarkers'  # one item per marker, copied by the migrate lambda
         GET_MARKERS_REQUEST_LAMBDA_CODE_PATH = 'lambdas/get_markers_request'
         GET_MARKER_REQUEST_LAMBDA_CODE_PATH = 'lambdas/get_marker_request'
         ADD_MARKER_REQUEST_LAMBDA_CODE_PATH = 'lambdas/add_marker_request'
         DELETE_MARKER_REQUEST_LAMBDA_CODE_PATH = 'lambdas/delete_marker_request'
         UPDATE_MARKER_REQUEST_LAMBDA_CODE_PATH = 'lambdas/update_marker_request'
         OBSERVE_LAMBDA_CODE_PATH = 'lambdas/observe'
+        MIGRATE_MARKERS_LAMBDA_CODE_PATH = 'lambdas/migrate_markers'
 
         # Create an SNS Topic
         topic = sns.Topic(
@@ -41,14 +44,31 @@ class AwsChangeObserverStack(Stack):
             topic_name="observer-sns-topic"    
         )
 
+        # The table markers were stored in before the history items, kept unchanged until they were copied.
+        # RETAIN keeps its data when this construct is removed from the stack after the migration.
+        legacy_table = dynamodb.Table(
+            self, 'LocationMarkersTable',
+            table_name=LEGACY_TABLE_NAME,
+            partition_key=dynamodb.Attribute(
+                name='markerId',
+                type=dynamodb.AttributeType.STRING
+            ),
+            removal_policy=RemovalPolicy.RETAIN,
+        )
+
         # Create the DynamoDB table
         table = dynamodb.Table(
-            self, 'LocationMarkersTable',
+            self, 'LocationMarkerItemsTable',
             table_name=TABLE_NAME,
             partition_key=dynamodb.Attribute(
                 name='markerId',
                 type=dynamodb.AttributeType.STRING
             ),
+            # One summary item per marker (sk "MARKER") and one item per history entry in its partition
+            sort_key=dynamodb.Attribute(
+                name='sk',
+                type=dynamodb.AttributeType.STRING
+            ),
             removal_policy=RemovalPolicy.DESTROY,  # Use RETAIN in production
         )
 
@@ -63,13 +83,23 @@ class AwsChangeObserverStack(Stack):
                 block_public_policy=False,  # Allow public bucket policies
                 ignore_public_acls=False,  # Do not ignore public ACLs
                 restrict_public_buckets=False  # Do not restrict public buckets
-            )
+            ),
+            lifecycle_rules=[
+                # Memoized Rekognition results, see DETECTION_TTL_SECONDS in detection_cache.py
+                s3.LifecycleRule(prefix="detections/", expiration=Duration.days(30))
+            ]
         )
 
         # Define the Lambda Layer for shared classes
         shared_classes_layer = aws_lambda.LayerVersion(
             self, 'SharedClassesLayer',
-            code=aws_lambda.Code.from_asset("layers/shared_classes_layer"), 
+            code=aws_lambda.Code.from_asset(
+                "layers/shared_classes_layer",
+                bundling=BundlingOptions(  # installs third party packages (numpy) next to the shared classes
+                    image=aws_lambda.Runtime.PYTHON_3_8.bundling_image,
+                    command=["bash", "-c", "pip install -r requirements.txt -t /asset-output/python && cp -au python /asset-output"],
+                ),
+            ),
             compatible_runtimes=[aws_lambda.Runtime.PYTHON_3_8],
             description="A layer containing the shared classes module"
         )
@@ -182,6 +212,22 @@ class AwsChangeObserverStack(Stack):
             },
         )
 
+        # One-off lambda copying the markers of the legacy table, invoked by hand after the deployment
+        migrate_markers_lambda = aws_lambda.Function(
+            self, 'MigrateMarkersFunction',
+            function_name='migrateMarkers',
+            runtime=aws_lambda.Runtime.PYTHON_3_8,
+            handler="migrate_markers_lambda_function.lambda_handler",
+            code=aws_lambda.Code.from_asset(MIGRATE_MARKERS_LAMBDA_CODE_PATH),
+            layers=[shared_classes_layer],
+            role=lambda_role_basic,
+            timeout=Duration.minutes(15),
+            environment={
+                'SOURCE_TABLE_NAME': legacy_table.table_name,
+                'TABLE_NAME': table.table_name,
+            },
+        )
+
         daily_rule = events.Rule(
             self, 'DailyRule',
             schedule=events.Schedule.cron(minute='0', hour='0'),  # Triggers at 00:00 UTC daily
@@ -198,6 +244,8 @@ class AwsChangeObserverStack(Stack):
         table.grant_write_data(delete_marker_request_lambda)
         table.grant_read_data(observe_lambda)
         table.grant_write_data(observe_lambda)
+        legacy_table.grant_read_data(migrate_markers_lambda)
+        table.grant_read_write_data(migrate_markers_lambda)
 
         # Grant access to the S3 bucket
         image_bucket.grant_read_write(observe_lambda)
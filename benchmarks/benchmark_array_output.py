@@ -0,0 +1,209 @@
+"""
+Compare fetching Process API renders as PNG and decoding them with fetching raw uint8 arrays.
+
+Sentinel Hub is replaced by a local stub that answers the token and Process API requests after
+a fixed delay with a pre-encoded render of the requested size: a PNG, or an uncompressed TIFF for
+raw sample types. The PNGs are filtered with --png-filter, Paeth (4) by default, as encoders like
+libpng mostly choose for photographic images; raster.decode_png() reverses Average and Paeth row
+by row, while None, Sub and Up are vectorized. Each row runs the pixel work the async engine does
+after the fetch:
+
+- single tile: the marker's tile is needed as pixels for the variants and the change score,
+  so the PNG is decoded, while the array is encoded to PNG for the upload.
+- group render: the render is cropped into --tiles tiles and each tile is encoded to PNG.
+
+    python benchmarks/benchmark_array_output.py --renders 20 --stub-latency-ms 200
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layers", "shared_classes_layer", "python"))
+
+import raster  # noqa: E402
+from image_fetcher import SAMPLE_TYPE_UINT8, ConnectionPool, ImageFetcher  # noqa: E402
+
+
+def encode_tiff(pixels: np.ndarray) -> bytes:
+    """
+    Encode a (height, width, bands) uint8 array as an uncompressed single-strip TIFF like the Process API returns.
+    """
+    height, width, bands = pixels.shape
+    entries = [(256, 4, width), (257, 4, height), (258, 3, 8), (259, 3, 1), (262, 3, 2), (273, 4, 0),
+               (277, 3, bands), (278, 4, height), (279, 4, pixels.nbytes), (284, 3, 1), (339, 3, 1)]
+    data_offset = 8 + 2 + 12 * len(entries) + 4
+    ifd = struct.pack("<H", len(entries))
+    for tag, field_type, value in entries:
+        value = data_offset if tag == 273 else value
+        ifd += struct.pack("<HHI", tag, field_type, 1) + struct.pack("<I" if field_type == 4 else "<HH", *(
+            (value,) if field_type == 4 else (value, 0)))
+    return b"II*\x00" + struct.pack("<I", 8) + ifd + struct.pack("<I", 0) + pixels.tobytes()
+
+
+def png_chunk(chunk_type: bytes, payload: bytes) -> bytes:
+    crc = zlib.crc32(payload, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", crc)
+
+
+def encode_filtered_png(pixels: np.ndarray, kind: int) -> bytes:
+    """
+    Encode a (height, width, 3) uint8 array as a PNG with every row filtered with filter type `kind`.
+    """
+    height, width, channels = pixels.shape
+    current = pixels.reshape(height, width * channels).astype(np.int16)
+    left = np.zeros_like(current)
+    left[:, channels:] = current[:, :-channels]
+    up = np.zeros_like(current)
+    up[1:] = current[:-1]
+    upper_left = np.zeros_like(current)
+    upper_left[1:, channels:] = current[:-1, :-channels]
+    if kind == 0:
+        predictor = np.zeros_like(current)
+    elif kind == 1:
+        predictor = left
+    elif kind == 2:
+        predictor = up
+    elif kind == 3:
+        predictor = (left + up) >> 1
+    else:
+        estimate = left + up - upper_left
+        distance_left, distance_up = np.abs(estimate - left), np.abs(estimate - up)
+        distance_upper_left = np.abs(estimate - upper_left)
+        predictor = np.where((distance_left <= distance_up) & (distance_left <= distance_upper_left), left,
+                             np.where(distance_up <= distance_upper_left, up, upper_left))
+    raw = np.empty((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 0] = kind
+    raw[:, 1:] = (current - predictor) & 0xFF
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"".join([raster.PNG_SIGNATURE, png_chunk(b"IHDR", header),
+                     png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)), png_chunk(b"IEND", b"")])
+
+
+def build_scene(width: int, height: int) -> np.ndarray:
+    """
+    Build a smooth, textured scene so the PNG compresses like a real render rather than like noise.
+    """
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = 96 + 48 * np.sin(x / 37.0) * np.cos(y / 53.0)
+    channels = [base + 20 * channel + rng.normal(0, 3, (height, width)) for channel in range(3)]
+    return np.clip(np.stack(channels, axis=-1), 0, 255).astype(np.uint8)
+
+
+class SentinelHubStub(BaseHTTPRequestHandler):
+    """
+    Answers token requests and Process API requests with pre-encoded renders after `latency` seconds.
+    """
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    png_filter = 4
+    renders = {}
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/oauth/token":
+            self._respond("application/json", json.dumps({"access_token": "benchmark", "expires_in": 3600}).encode())
+            return
+        request = json.loads(body)
+        output = request["output"]
+        content_type = output["responses"][0]["format"]["type"]
+        key = (output["width"], output["height"], content_type)
+        with self.lock:
+            if key not in self.renders:
+                scene = build_scene(output["width"], output["height"])
+                if content_type == "image/tiff":
+                    self.renders[key] = encode_tiff(scene)
+                else:
+                    self.renders[key] = encode_filtered_png(scene, self.png_filter)
+        time.sleep(self.latency)
+        self._respond(content_type, self.renders[key])
+
+    def _respond(self, content_type: str, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def tile_windows(size: int, tiles: int, tile_size: int):
+    """
+    Spread `tiles` tile origins over a square render of `size` pixels.
+    """
+    per_side = max(1, int(np.ceil(np.sqrt(tiles))))
+    step = max(1, (size - tile_size) // max(1, per_side - 1))
+    return [(row * step, col * step) for row in range(per_side) for col in range(per_side)][:tiles]
+
+
+def measure(name: str, run, renders: int, transferred: list):
+    transferred.clear()
+    started = time.perf_counter()
+    for _ in range(renders):
+        run()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<30} {renders:>5} renders {elapsed:>8.2f} s {1000 * elapsed / renders:>9.1f} ms/render "
+          f"{sum(transferred) / renders / 2 ** 10:>9.0f} KiB/render")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=10)
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--group-size", type=int, default=2048, help="Width and height of a group render.")
+    parser.add_argument("--tiles", type=int, default=9, help="Tiles cropped out of each group render.")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--png-filter", type=int, choices=range(5), default=4)
+    args = parser.parse_args()
+
+    SentinelHubStub.latency = args.stub_latency_ms / 1000
+    SentinelHubStub.png_filter = args.png_filter
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SentinelHubStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool = ConnectionPool("127.0.0.1", port=server.server_address[1], use_https=False)
+    fetcher = ImageFetcher("benchmark", "benchmark", pool=pool)
+    dates = fetcher.date_range_days_ago(0)
+    aoi = fetcher.build_aoi("10.0", "50.0")
+    transferred = []
+
+    def fetch_png(size: int) -> np.ndarray:
+        data = fetcher.get_images_by_date(*dates, aoi=aoi, width=size, height=size)
+        transferred.append(len(data))
+        return raster.decode_png(data)
+
+    def fetch_array(size: int) -> np.ndarray:
+        pixels = fetcher.get_array_by_date(*dates, aoi=aoi, width=size, height=size, sample_type=SAMPLE_TYPE_UINT8)
+        transferred.append(pixels.nbytes)
+        return pixels
+
+    def crop_and_encode(pixels: np.ndarray):
+        for row, col in tile_windows(pixels.shape[0], args.tiles, args.tile_size):
+            raster.encode_png(raster.crop(pixels, row, col, args.tile_size, args.tile_size))
+
+    # Warm up the connection, the token and the stub's render cache.
+    fetch_png(args.tile_size), fetch_array(args.tile_size), fetch_png(args.group_size), fetch_array(args.group_size)
+
+    size = args.tile_size
+    measure(f"png + decode, {size}px tile", lambda: fetch_png(size), args.renders, transferred)
+    measure(f"array + encode, {size}px tile", lambda: raster.encode_png(fetch_array(size)), args.renders, transferred)
+    size = args.group_size
+    measure(f"png + decode, {size}px group", lambda: crop_and_encode(fetch_png(size)), args.renders, transferred)
+    measure(f"array, {size}px group", lambda: crop_and_encode(fetch_array(size)), args.renders, transferred)
+
+    pool.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure the compute time of the pixel change score and the detection time it saves.
+
+Each marker gets a previous and a new synthetic render. A share of --changed-fraction of the
+markers has a changed block covering --changed-area of the image; the others only differ by sensor
+noise. The gate does what ObservationEngine._plan_detection() does for a marker: decode both
+images at the variant width they are loaded at and score them with ChangeDetector. Object
+detection is only counted for markers whose score is significant, at --detection-ms per call, the
+latency of a Rekognition DetectLabels request (see benchmark_detectors.py).
+
+    python benchmarks/benchmark_change_gate.py --markers 200 --changed-fraction 0.1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layers", "shared_classes_layer", "python"))
+
+import raster  # noqa: E402
+from change_detection import ChangeDetector  # noqa: E402
+
+
+def build_scene(size: int, rng: np.random.Generator) -> np.ndarray:
+    y, x = np.mgrid[0:size, 0:size]
+    base = 96 + 48 * np.sin(x / rng.uniform(20, 60)) * np.cos(y / rng.uniform(20, 60))
+    return np.clip(np.stack([base + 20 * channel for channel in range(3)], axis=-1), 0, 255)
+
+
+def observe(scene: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Render a scene with fresh sensor noise.
+    """
+    return np.clip(scene + rng.normal(0, 3, scene.shape), 0, 255).astype(np.uint8)
+
+
+def build_pair(size: int, changed: bool, changed_area: float, rng: np.random.Generator):
+    """
+    Build the previous and new PNG of a marker at `size` pixels.
+    """
+    scene = build_scene(size, rng)
+    previous = observe(scene, rng)
+    if changed:
+        side = int(size * changed_area ** 0.5)
+        row, col = rng.integers(0, size - side, 2)
+        scene = scene.copy()
+        scene[row:row + side, col:col + side] = rng.uniform(0, 255, 3)
+    return raster.encode_png(previous), raster.encode_png(observe(scene, rng))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--markers", type=int, default=200)
+    parser.add_argument("--changed-fraction", type=float, default=0.1)
+    parser.add_argument("--changed-area", type=float, default=0.1)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512],
+                        help="Widths the images are compared at. The engine loads the 256 px variants.")
+    parser.add_argument("--detection-ms", type=float, default=300.0)
+    parser.add_argument("--score-threshold", type=float, default=0.02)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rng = np.random.default_rng(0)
+        changed = rng.random(args.markers) < args.changed_fraction
+        pairs = [build_pair(size, is_changed, args.changed_area, rng) for is_changed in changed]
+        detector = ChangeDetector(score_threshold=args.score_threshold)
+
+        started = time.perf_counter()
+        significant = [detector.is_significant(detector.compare(raster.decode_png(previous), raster.decode_png(new)))
+                       for previous, new in pairs]
+        gate_seconds = time.perf_counter() - started
+
+        stats = detector.get_stats()
+        detections = sum(significant)
+        missed = int(np.sum(changed & ~np.array(significant)))
+        saved = (args.markers - detections) * args.detection_ms / 1000
+        print(f"{size}x{size} px, {args.markers} markers, {int(changed.sum())} changed")
+        print(f"  gate     {1000 * gate_seconds / args.markers:>7.1f} ms/marker with decode, "
+              f"{1000 * stats['mean_seconds']:>6.1f} ms/marker scoring only")
+        print(f"  detect   {detections:>5} of {args.markers} markers ({missed} changed markers missed)")
+        print(f"  saved    {saved:>7.1f} s of detection for {gate_seconds:.1f} s of gate compute "
+              f"at {args.detection_ms:.0f} ms/detection")
+
+
+if __name__ == "__main__":
+    main()
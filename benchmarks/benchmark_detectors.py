@@ -0,0 +1,150 @@
+"""
+Compare the per-image latency and throughput of the object detection backends.
+
+Rekognition is replaced by a local stub that answers DetectLabels after a fixed delay, so the
+benchmark runs offline and measures the client side of the backend plus the configured service
+latency. The ONNX backend runs a real model on the CPU. Without --model, a small randomly
+initialized classifier is generated with the onnx package to measure the pipeline itself.
+
+    python benchmarks/benchmark_detectors.py --images 64 --stub-latency-ms 300
+    python benchmarks/benchmark_detectors.py --model mobilenet.onnx --labels labels.txt
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layers", "shared_classes_layer", "python"))
+
+import raster  # noqa: E402
+from detectors import OnnxDetector, RekognitionDetector  # noqa: E402
+
+
+class RekognitionStub(BaseHTTPRequestHandler):
+    """
+    Answers Rekognition DetectLabels requests with fixed labels after `latency` seconds.
+    """
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        body = json.dumps({"Labels": [{"Name": "Tree", "Confidence": 99.0}, {"Name": "Road", "Confidence": 90.0}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-amz-json-1.1")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalBucket:
+    """
+    Serves the benchmark images to the ONNX backend in place of S3.
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def build_random_model(path: str, classes: int, input_size: int):
+    """
+    Write a small convolutional classifier with random weights.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(0)
+    weights = [
+        numpy_helper.from_array(rng.normal(0, 0.1, (16, 3, 3, 3)).astype(np.float32), "conv1"),
+        numpy_helper.from_array(rng.normal(0, 0.1, (32, 16, 3, 3)).astype(np.float32), "conv2"),
+        numpy_helper.from_array(rng.normal(0, 0.1, (32, classes)).astype(np.float32), "fc"),
+    ]
+    nodes = [
+        helper.make_node("Conv", ["input", "conv1"], ["c1"], strides=[2, 2], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["c1"], ["r1"]),
+        helper.make_node("Conv", ["r1", "conv2"], ["c2"], strides=[2, 2], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["c2"], ["r2"]),
+        helper.make_node("GlobalAveragePool", ["r2"], ["pooled"]),
+        helper.make_node("Flatten", ["pooled"], ["flat"]),
+        helper.make_node("MatMul", ["flat", "fc"], ["scores"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "benchmark",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 3, input_size, input_size])],
+        [helper.make_tensor_value_info("scores", TensorProto.FLOAT, ["N", classes])],
+        weights,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8  # loadable by older ONNX Runtime releases
+    onnx.save(model, path)
+
+
+def measure(name: str, run, images: int):
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} {images:>6} images {elapsed:>8.2f} s {1000 * elapsed / images:>9.1f} ms/image "
+          f"{images / elapsed:>8.1f} images/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--size", type=int, default=512, help="Width and height of the benchmark images.")
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--model", help="ONNX classification model. Generated if omitted.")
+    parser.add_argument("--labels", help="Label names of the model, one per line.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    keys = [f"image-{i}.png" for i in range(args.images)]
+    bucket = LocalBucket({
+        key: raster.encode_png(rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)) for key in keys
+    })
+    images = [("benchmark", key) for key in keys]
+
+    RekognitionStub.latency = args.stub_latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RekognitionStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = boto3.client(
+        "rekognition", endpoint_url=f"http://127.0.0.1:{server.server_address[1]}", region_name="us-east-1",
+        aws_access_key_id="benchmark", aws_secret_access_key="benchmark",
+    )
+    rekognition = RekognitionDetector(client)
+    measure(f"rekognition stub {args.stub_latency_ms:.0f} ms", lambda: rekognition.detect_batch(images), args.images)
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = args.model
+        if args.labels:
+            with open(args.labels) as labels_file:
+                labels = [line.strip() for line in labels_file if line.strip()]
+        else:
+            labels = [f"label-{i}" for i in range(1000)]
+        if not model_path:
+            model_path = os.path.join(directory, "random.onnx")
+            build_random_model(model_path, len(labels), 224)
+
+        for batch_size in sorted({1, args.batch_size}):
+            onnx_detector = OnnxDetector(model_path, labels, s3_client=bucket, batch_size=batch_size, min_confidence=0)
+            measure(f"onnx cpu, batch {batch_size}", lambda: onnx_detector.detect_batch(images), args.images)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
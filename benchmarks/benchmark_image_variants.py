@@ -0,0 +1,102 @@
+"""
+Measure the image bytes a marker page view downloads with the full-size images and with the
+downscaled variants selected by the imageSize query parameter.
+
+Renders are synthetic: a smooth, textured scene with sensor noise, different for every epoch and
+marker. They are stored through ImageService.store_epoch_image(), so every image gets its variants
+like in the observe run, into a local S3 stand-in that keeps the objects in memory. A page view is
+what the GET endpoints return: the current and four historical images for GET /marker, the current
+image for each marker of GET /markers.
+
+    python benchmarks/benchmark_image_variants.py --markers 5 --render-size 512
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layers", "shared_classes_layer", "python"))
+
+import raster  # noqa: E402
+from coordinate import Coordinate  # noqa: E402
+from image_fetcher import ImageFetcher  # noqa: E402
+from image_service import HISTORICAL_EPOCHS, LATEST_EPOCH, ImageService  # noqa: E402
+from location_marker import LocationMarker  # noqa: E402
+
+
+class LocalS3:
+    """
+    Keeps the objects ImageService uploads in memory.
+    """
+
+    class meta:
+        region_name = "us-east-1"
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+        return {}
+
+    def head_object(self, Bucket, Key):
+        raise KeyError(Key)
+
+
+def build_scene(size: int, seed: int) -> np.ndarray:
+    """
+    Build a smooth, textured scene with sensor noise, so the PNG compresses like a real render.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size]
+    base = 96 + 48 * np.sin(x / rng.uniform(20, 60)) * np.cos(y / rng.uniform(20, 60))
+    channels = [base + 20 * channel + rng.normal(0, 3, (size, size)) for channel in range(3)]
+    return np.clip(np.stack(channels, axis=-1), 0, 255).astype(np.uint8)
+
+
+def page_bytes(s3: LocalS3, service: ImageService, images) -> int:
+    prefix = service.get_image_url("")
+    return sum(len(s3.objects[image.get_image_url()[len(prefix):]]) for image in images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--markers", type=int, default=5)
+    parser.add_argument("--render-size", type=int, default=512)
+    parser.add_argument("--image-sizes", type=int, nargs="+", default=[0, 256, 128],
+                        help="imageSize query parameters to compare. 0 requests the full-size images.")
+    args = parser.parse_args()
+
+    s3 = LocalS3()
+    service = ImageService(s3, "benchmark", ImageFetcher("benchmark", "benchmark"))
+    markers = []
+    for index in range(args.markers):
+        coordinate = Coordinate(f"{10 + index / 10:.4f}", "50.0")
+        marker = LocationMarker(coordinate)
+        marker.set_marker_id(f"marker-{index}")
+        images = []
+        for epoch_index, epoch in enumerate([LATEST_EPOCH] + HISTORICAL_EPOCHS):
+            pixels = build_scene(args.render_size, index * 10 + epoch_index)
+            images.append(service.store_epoch_image(coordinate, epoch, raster.encode_png(pixels), pixels=pixels))
+        marker.set_current_image(images[0])
+        marker.set_historical_images(images[1:])
+        markers.append(marker)
+    service.flush_uploads()
+
+    print(f"{args.markers} markers, {args.render_size}x{args.render_size} px renders")
+    for image_size in args.image_sizes:
+        detail = list_view = 0
+        for stored in markers:
+            marker = LocationMarker.from_json(stored.to_json())
+            if image_size:
+                marker.select_image_variants(image_size)
+            detail += page_bytes(s3, service, [marker.get_current_image()] + marker.get_historical_images())
+            list_view += page_bytes(s3, service, [marker.get_current_image()])
+        label = f"imageSize={image_size}" if image_size else "full size"
+        print(f"  {label:<14} GET /marker {detail / args.markers / 1e6:>7.3f} MB/page view   "
+              f"GET /markers {list_view / 1e6:>7.3f} MB for {args.markers} markers")
+
+
+if __name__ == "__main__":
+    main()
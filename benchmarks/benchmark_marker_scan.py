@@ -0,0 +1,195 @@
+"""
+Compare reading all markers as one list with streaming them page by page, reading only their
+summaries with reading their history as well, and measure the throughput of parallel scans by
+segment count.
+
+The table is a local stand-in for DynamoDB that synthesizes its items on demand, so it takes no
+memory itself, and pages scans like DynamoDB does: at most `Limit` items and at most 1 MB of data
+read per page, continued from ExclusiveStartKey, optionally within one of TotalSegments segments,
+with the filter for summary items applied after reading. Each scan request waits --page-latency-ms
+to model the round trip. Peak memory is measured with tracemalloc, throughput without it.
+
+    python benchmarks/benchmark_marker_scan.py --items 10000 100000 --segments 1 2 4 8
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layers", "shared_classes_layer", "python"))
+
+from data_service import DataService  # noqa: E402
+from marker_items import SUMMARY_KEY  # noqa: E402
+
+PAGE_BYTES = 1024 * 1024
+
+
+def build_item(index: int) -> dict:
+    """
+    Build a marker like the observe job stores it, as one item.
+    """
+    lon, lat = f"{(index % 3600) / 10 - 180:.4f}", f"{(index // 3600) % 1800 / 10 - 90:.4f}"
+
+    def image(epoch: str) -> dict:
+        key = f"images/{lon}_{lat}/{epoch}/{index:032x}.png"
+        return {"s3BucketName": "bucket", "s3Key": key, "url": f"https://bucket.s3.amazonaws.com/{key}",
+                "dateTaken": "2024-06-01", "variants": {"256": key.replace(".png", "_256.png")}}
+
+    return {
+        "markerId": f"marker-{index:09d}", "name": f"Marker {index}", "subscribedEmails": ["owner@example.com"],
+        "coordinate": {"longitude": lon, "latitude": lat}, "status": "No object changes.",
+        "dateCreated": "2024-01-01T00:00:00", "currentImage": image("latest"),
+        "historicalImages": [image(epoch) for epoch in ("6m", "1y", "2y", "5y")],
+        "detectedObjects": [{"dateDetected": "2024-06-01 00:00:00", "detectedObjects": ["Tree", "Road", "Building"]}
+                            for _ in range(3)],
+        "lastAcquisition": "2024-06-01T10:00:00Z", "changeScore": "0.0100",
+    }
+
+
+def build_items(index: int) -> list:
+    """
+    Build the items of a marker in the layout of marker_items: its history items and its summary, by sort key.
+    """
+    marker = build_item(index)
+    marker_id = marker["markerId"]
+    items = [{"markerId": marker_id, "sk": f"IMAGE#{position:02d}", "image": image}
+             for position, image in enumerate(marker.pop("historicalImages"))]
+    items += [{"markerId": marker_id, "sk": f"DETECTION#{detection['dateDetected']}#{occurrence:02d}",
+               "detection": detection}
+              for occurrence, detection in enumerate(marker.pop("detectedObjects"))]
+    marker["sk"] = SUMMARY_KEY
+    items.append(marker)
+    return sorted(items, key=lambda item: item["sk"])
+
+
+def project(item: dict, expression: str, names: dict) -> dict:
+    projected = {}
+    for path in expression.split(", "):
+        parts = [names.get(part, part) for part in path.split(".")]
+        source, target = item, projected
+        for part in parts[:-1]:
+            if part not in source:
+                break
+            source = source[part]
+            target = target.setdefault(part, {})
+        else:
+            if parts[-1] in source:
+                target[parts[-1]] = source[parts[-1]]
+    return projected
+
+
+class LocalTable:
+    """
+    Answers Table.scan() over the items of `count` synthesized markers with DynamoDB's paging rules.
+    """
+
+    def __init__(self, count: int, page_latency: float = 0.0):
+        self.count = count
+        self.page_latency = page_latency
+        items = build_items(0)
+        self.sort_keys = [item["sk"] for item in items]
+        self.item_sizes = [len(json.dumps(item)) for item in items]
+        self.scans = 0
+        self._lock = threading.Lock()
+
+    def scan(self, Limit: int = None, ExclusiveStartKey: dict = None, ProjectionExpression: str = None,
+             ExpressionAttributeNames: dict = None, ExpressionAttributeValues: dict = None,
+             FilterExpression: str = None, Segment: int = 0, TotalSegments: int = 1):
+        with self._lock:
+            self.scans += 1
+        time.sleep(self.page_latency)
+        # Marker i belongs to segment i % TotalSegments; its items are read in sort key order.
+        if ExclusiveStartKey:
+            index = int(ExclusiveStartKey["markerId"].split("-")[1])
+            position = self.sort_keys.index(ExclusiveStartKey["sk"]) + 1
+            if position == len(self.sort_keys):
+                index, position = index + TotalSegments, 0
+        else:
+            index, position = Segment, 0
+        items = []
+        read = read_bytes = 0
+        marker_items = None
+        last_key = None
+        while index < self.count and (Limit is None or read < Limit) and read_bytes < PAGE_BYTES:
+            # Only the filter used by DataService is supported: the summary items.
+            if not FilterExpression or self.sort_keys[position] == ExpressionAttributeValues[":summary"]:
+                marker_items = marker_items or build_items(index)
+                item = marker_items[position]
+                if ProjectionExpression:
+                    item = project(item, ProjectionExpression, ExpressionAttributeNames or {})
+                items.append(item)
+            read += 1
+            read_bytes += self.item_sizes[position]
+            last_key = {"markerId": f"marker-{index:09d}", "sk": self.sort_keys[position]}
+            position += 1
+            if position == len(self.sort_keys):
+                index, position, marker_items = index + TotalSegments, 0, None
+        response = {"Items": items, "Count": len(items), "ScannedCount": read}
+        if index < self.count:
+            response["LastEvaluatedKey"] = last_key
+        return response
+
+
+class LocalDynamoDB:
+    def __init__(self, table: LocalTable):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+def measure(name: str, run):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    markers = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name:<34} {markers:>8} markers {elapsed:>8.2f} s {markers / elapsed:>10.0f} markers/s "
+          f"peak {peak / 2 ** 20:>8.1f} MiB")
+
+
+def consume(markers) -> int:
+    count = 0
+    for _ in markers:
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--page-latency-ms", type=float, default=50.0)
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    for count in args.items:
+        table = LocalTable(count, args.page_latency_ms / 1000)
+        service = DataService("LocationMarkers", dynamodb_resource=LocalDynamoDB(table))
+        print(f"{count} markers of {len(json.dumps(build_item(0)))} bytes, stored as {len(table.sort_keys)} items "
+              f"of {sum(table.item_sizes)} bytes")
+        print(f"  a single scan() call reads the items of {table.scan()['ScannedCount'] // len(table.sort_keys)} markers")
+        measure("get_markers() list", lambda: len(service.get_markers()))
+        measure("iter_markers()", lambda: consume(service.iter_markers(args.page_size)))
+        measure("iter_markers() id+coordinate", lambda: consume(
+            service.iter_markers(args.page_size, projection=["markerId", "coordinate"])
+        ))
+        measure("iter_markers() with history", lambda: consume(service.iter_markers(args.page_size, history=True)))
+        # Parallel scans as the observe job reads the table, with the history.
+        for segments in args.segments:
+            table.scans = 0
+            started = time.perf_counter()
+            markers = consume(service.iter_markers(args.page_size, total_segments=segments, history=True))
+            elapsed = time.perf_counter() - started
+            print(f"  parallel scan, {segments:>2} segments      {markers:>8} markers {elapsed:>8.2f} s "
+                  f"{markers / elapsed:>10.0f} markers/s {table.scans:>5} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Compare the cost of the former get/delete/put update of whole marker items with the conditional
+UpdateItem and with batched writes through the MarkerWriteBuffer, which store the marker summary
+and its history as separate items, and compare the cost of reading a marker in both layouts.
+
+Runs against an in-memory DynamoDB from moto (pip install "moto[dynamodb]<5"). Every table
+request waits --latency-ms to model the round trip. Capacity is counted with DynamoDB's rules:
+writes cost one WCU per started KB of the larger of the old and new item, eventually consistent
+reads half an RCU per started 4 KB, consistent reads one. BatchGetItem and BatchWriteItem are
+charged per item like the single-item requests. Item sizes are approximated by their JSON length.
+
+    python benchmarks/benchmark_marker_update.py --markers 200 --latency-ms 10 --index-observations 30
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layers", "shared_classes_layer", "python"))
+
+from coordinate import Coordinate  # noqa: E402
+from data_service import DataService  # noqa: E402
+from detected_objects import DetectedObjects  # noqa: E402
+from image import Image  # noqa: E402
+from location_marker import LocationMarker  # noqa: E402
+from marker_items import SUMMARY_KEY  # noqa: E402
+
+
+def item_size(item) -> int:
+    return len(json.dumps(item, default=str)) if item else 0
+
+
+def scan_all(table) -> list:
+    items = []
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        items += response["Items"]
+        if "LastEvaluatedKey" not in response:
+            return items
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def item_key(key: dict) -> tuple:
+    return key["markerId"], key.get("sk")
+
+
+class MeteredTable:
+    """
+    Wraps a table, adding latency to every request and counting requests, bytes sent and capacity units.
+    Item sizes for the capacity counts come from a local copy of the items, kept up to date by the writes.
+    """
+
+    def __init__(self, table, latency: float, dynamodb=None):
+        self.table = table
+        self.latency = latency
+        self.dynamodb = dynamodb
+        self.items = {item_key(item): item for item in scan_all(table)}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.request_bytes = 0
+        self.wcu = 0.0
+        self.rcu = 0.0
+
+    def _call(self, method, kwargs, target=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            self.request_bytes += item_size(kwargs)
+        return getattr(target or self.table, method)(**kwargs)
+
+    def _write(self, key: tuple, item: dict = None):
+        """
+        Charge a write of `item`, or a delete if it is None, and update the local copy.
+        """
+        with self._lock:
+            old = self.items.pop(key, None)
+            if item is not None:
+                self.items[key] = item
+            self.wcu += max(1, math.ceil(max(item_size(old), item_size(item)) / 1024))
+
+    def _read(self, size: int, consistent: bool):
+        with self._lock:
+            self.rcu += math.ceil(size / 4096) * (1 if consistent else 0.5)
+
+    def get_item(self, **kwargs):
+        response = self._call("get_item", kwargs)
+        self._read(item_size(self.items.get(item_key(kwargs["Key"]))), kwargs.get("ConsistentRead"))
+        return response
+
+    def query(self, **kwargs):
+        response = self._call("query", kwargs)
+        # A query is charged for the total size of the items it reads, not per item.
+        marker_id = kwargs["ExpressionAttributeValues"][":markerId"]
+        self._read(sum(item_size(item) for key, item in self.items.items() if key[0] == marker_id), False)
+        return response
+
+    def put_item(self, **kwargs):
+        response = self._call("put_item", kwargs)
+        self._write(item_key(kwargs["Item"]), kwargs["Item"])
+        return response
+
+    def delete_item(self, **kwargs):
+        response = self._call("delete_item", kwargs)
+        self._write(item_key(kwargs["Key"]))
+        return response
+
+    def update_item(self, **kwargs):
+        response = self._call("update_item", kwargs)
+        key = item_key(kwargs["Key"])
+        # Apply the SET assignments of DataService._build_update() to the local copy.
+        item = dict(self.items[key])
+        names, values = kwargs["ExpressionAttributeNames"], kwargs["ExpressionAttributeValues"]
+        for placeholder, name in names.items():
+            if placeholder.startswith("#a"):
+                item[name] = values[":" + placeholder[1:]]
+        item.update(response["Attributes"])
+        self._write(key, item)
+        return response
+
+    def batch_get_item(self, **kwargs):
+        response = self._call("batch_get_item", kwargs, self.dynamodb)
+        for request in kwargs["RequestItems"].values():
+            for key in request["Keys"]:
+                # Projections do not reduce the read cost, which is based on the whole item.
+                self._read(item_size(self.items.get(item_key(key))), request.get("ConsistentRead"))
+        return response
+
+    def batch_write_item(self, **kwargs):
+        response = self._call("batch_write_item", kwargs, self.dynamodb)
+        for table_name, requests in kwargs["RequestItems"].items():
+            unprocessed = response.get("UnprocessedItems", {}).get(table_name, [])
+            for request in requests:
+                if request in unprocessed:
+                    continue
+                if "PutRequest" in request:
+                    self._write(item_key(request["PutRequest"]["Item"]), request["PutRequest"]["Item"])
+                else:
+                    self._write(item_key(request["DeleteRequest"]["Key"]))
+        return response
+
+    def batch_writer(self):
+        return MeteredBatchWriter(self)
+
+    def scan(self, **kwargs):
+        return self._call("scan", kwargs)
+
+
+class MeteredBatchWriter:
+    """
+    Stands in for Table.batch_writer(), sending the collected requests through MeteredTable.batch_write_item().
+    """
+
+    def __init__(self, table: MeteredTable):
+        self.table = table
+        self.requests = []
+
+    def put_item(self, Item):
+        self.requests.append({"PutRequest": {"Item": Item}})
+
+    def delete_item(self, Key):
+        self.requests.append({"DeleteRequest": {"Key": Key}})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        requests = self.requests
+        while requests:
+            chunk, requests = requests[:25], requests[25:]
+            response = self.table.batch_write_item(RequestItems={self.table.table.name: chunk})
+            requests = response.get("UnprocessedItems", {}).get(self.table.table.name, []) + requests
+
+
+class MeteredDynamoDB:
+    def __init__(self, table: MeteredTable):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+    def batch_get_item(self, **kwargs):
+        return self.table.batch_get_item(**kwargs)
+
+    def batch_write_item(self, **kwargs):
+        return self.table.batch_write_item(**kwargs)
+
+
+def legacy_update_marker(table, marker: LocationMarker):
+    """
+    The update as it was done before: read, delete and put the whole marker as one item.
+    """
+    marker_id = marker.get_marker_id()
+    if not table.get_item(Key={"markerId": marker_id}).get("Item"):
+        raise ValueError(f"Marker with ID {marker_id} does not exist")
+    table.delete_item(Key={"markerId": marker_id})
+    table.put_item(Item=marker.to_json())
+
+
+def index_observation(day: int) -> dict:
+    stats = {"mean": "0.4120", "p10": "0.1030", "p90": "0.6610", "valid": "0.981"}
+    return {"date": f"2024-06-{day:02d}T10:00:00Z", "indices": {"ndvi": stats, "ndbi": stats, "ndwi": stats},
+            "changes": []}
+
+
+def build_marker(index: int, index_observations: int = 0) -> LocationMarker:
+    def image(epoch: str) -> Image:
+        return Image("2024-06-01", "bucket", f"images/{index}/{epoch}.png",
+                     f"https://bucket.s3.amazonaws.com/images/{index}/{epoch}.png")
+
+    marker = LocationMarker(Coordinate("10.0000", "20.0000"), name=f"Marker {index}",
+                            subscribed_emails=["owner@example.com"], current_image=image("latest"),
+                            historical_images=[image(epoch) for epoch in ("6m", "1y", "2y", "5y")],
+                            detected_objects=[DetectedObjects("2024-06-01 00:00:00", ["Tree", "Road", "Building"])
+                                              for _ in range(3)],
+                            index_series=[index_observation(1) for _ in range(index_observations)])
+    marker.set_marker_id(f"marker-{index:06d}")
+    marker.set_version(0)
+    return marker
+
+
+def observe(marker: LocationMarker, day: int):
+    """
+    Apply the attribute changes of a daily observation.
+    """
+    marker.set_status(f"Observed on day {day}.")
+    marker.set_change_score(f"{day / 1000:.4f}")
+    marker.get_detected_objects().append(DetectedObjects(f"2024-06-{day:02d} 00:00:00", ["Tree", "Road"]))
+    marker.get_detected_objects().pop(0)
+    if marker.get_index_series():
+        marker.add_index_observation(index_observation(day), len(marker.get_index_series()))
+
+
+def report(name: str, metered: MeteredTable, count: int, elapsed: float, unit: str):
+    print(f"  {name:<24} {1000 * elapsed / count:>7.1f} ms/{unit} {metered.requests / count:>4.2f} requests "
+          f"{metered.request_bytes / count:>7.0f} bytes sent {metered.wcu / count:>4.1f} WCU "
+          f"{metered.rcu / count:>4.1f} RCU per {unit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--markers", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--write-concurrency", type=int, default=4)
+    parser.add_argument("--index-observations", type=int, default=0,
+                        help="spectral index observations per marker, up to 30 are kept")
+    args = parser.parse_args()
+
+    from moto import mock_dynamodb
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    with mock_dynamodb():
+        dynamodb = boto3.resource("dynamodb")
+        legacy_table = dynamodb.create_table(
+            TableName="LocationMarkers", BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "markerId", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "markerId", "AttributeType": "S"}],
+        )
+        dynamodb.create_table(
+            TableName="LocationMarkerItems", BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "markerId", "KeyType": "HASH"}, {"AttributeName": "sk", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "markerId", "AttributeType": "S"},
+                                  {"AttributeName": "sk", "AttributeType": "S"}],
+        )
+        for index in range(args.markers):
+            marker = build_marker(index, args.index_observations)
+            legacy_table.put_item(Item=marker.to_json())
+            DataService("LocationMarkerItems", dynamodb_resource=dynamodb).put_marker(marker)
+        legacy = MeteredTable(legacy_table, args.latency_ms / 1000, dynamodb)
+        metered = MeteredTable(dynamodb.Table("LocationMarkerItems"), args.latency_ms / 1000, dynamodb)
+        service = DataService("LocationMarkerItems", dynamodb_resource=MeteredDynamoDB(metered))
+        summary = metered.items[("marker-000000", SUMMARY_KEY)]
+        history = [item for key, item in metered.items.items() if key[0] == "marker-000000" and item is not summary]
+        print(f"{args.markers} markers of {item_size(build_marker(0, args.index_observations).to_json())} bytes as one item, or a "
+              f"{item_size(summary)} byte summary and {len(history)} history items of "
+              f"{sum(map(item_size, history)) // len(history)} bytes; {args.latency_ms:.0f} ms per request")
+
+        def batched(check_versions: bool):
+            def run(markers):
+                buffer = service.create_write_buffer(max_workers=args.write_concurrency,
+                                                     check_versions=check_versions)
+                for marker in markers:
+                    buffer.add(marker)
+                failed = [result for result in buffer.close() if not result.success]
+                if failed:
+                    raise RuntimeError(f"{len(failed)} markers were not written: {failed[0].error}")
+            return run
+
+        def one_by_one(update):
+            def run(markers):
+                for marker in markers:
+                    update(marker)
+            return run
+
+        print("update after an observation")
+        methods = [
+            ("get + delete + put", legacy, one_by_one(lambda marker: legacy_update_marker(legacy, marker))),
+            ("conditional UpdateItem", metered, one_by_one(service.update_marker)),
+            ("MarkerWriteBuffer", metered, batched(True)),
+            ("  without version check", metered, batched(False)),
+        ]
+        # Every method observes a new day, so that every marker has changes to write.
+        for day, (name, table, run) in enumerate(methods, start=2):
+            if table is legacy:
+                markers = [LocationMarker.from_json(item) for item in scan_all(legacy_table)]
+            else:
+                markers = list(service.iter_markers(history=True))
+            for marker in markers:
+                observe(marker, day)
+            table.reset()
+            started = time.perf_counter()
+            run(markers)
+            report(name, table, len(markers), time.perf_counter() - started, "update")
+
+        print("read one marker")
+        marker_ids = [f"marker-{index:06d}" for index in range(args.markers)]
+        reads = [
+            ("whole item", legacy, lambda marker_id: legacy.get_item(Key={"markerId": marker_id})),
+            ("summary", metered, service.get_marker),
+            ("summary + history", metered, lambda marker_id: service.get_marker(marker_id).get_detected_objects()),
+        ]
+        for name, table, read in reads:
+            table.reset()
+            started = time.perf_counter()
+            for marker_id in marker_ids:
+                read(marker_id)
+            report(name, table, len(marker_ids), time.perf_counter() - started, "read")
+
+
+if __name__ == "__main__":
+    main()
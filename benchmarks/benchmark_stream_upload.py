@@ -0,0 +1,143 @@
+"""
+Measure the memory one historical image takes on its way from Sentinel Hub to S3, streamed in
+parts or fetched into memory first.
+
+Sentinel Hub is replaced by a local stub that answers the token and Process API requests with a
+PNG of --sizes pixels per side. The PNGs hold noise, so they do not compress and their size grows
+with the square of the side. S3 is a local stand-in that counts the uploaded bytes and keeps
+nothing. Each image is measured on its own with tracemalloc: the peak of the memory allocated
+while it is fetched and uploaded, over what was allocated before, for
+
+- streamed: ImageService.stream_epoch_to_s3(), as used for the immutable historical epochs.
+- buffered: ImageService.store_epoch_image() over fetch_epoch_image(), which holds the whole PNG in
+  memory and also decodes it for its variants and perceptual hash.
+
+    python benchmarks/benchmark_stream_upload.py --sizes 512 2048 4096 --part-size-mib 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layers", "shared_classes_layer", "python"))
+
+import raster  # noqa: E402
+from coordinate import Coordinate  # noqa: E402
+from image_fetcher import ConnectionPool, ImageFetcher  # noqa: E402
+from image_service import HISTORICAL_EPOCHS, ImageService  # noqa: E402
+
+
+class SentinelHubStub(BaseHTTPRequestHandler):
+    """
+    Answers token requests, and Process API requests with the current `image`.
+    """
+    protocol_version = "HTTP/1.1"
+    image = b""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/oauth/token":
+            self._respond("application/json", json.dumps({"access_token": "benchmark", "expires_in": 3600}).encode())
+        else:
+            self._respond("image/png", self.image)
+
+    def _respond(self, content_type: str, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalS3:
+    """
+    Accepts the S3 calls of ImageService and only counts the bytes, so stored objects take no memory.
+    """
+
+    class meta:
+        region_name = "us-east-1"
+
+    def __init__(self):
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def _count(self, body: bytes):
+        with self._lock:
+            self.bytes += len(body)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._count(Body)
+        return {}
+
+    def head_object(self, Bucket, Key):
+        raise KeyError(Key)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        return {"UploadId": "benchmark"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._count(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, **kwargs):
+        return {}
+
+    def abort_multipart_upload(self, **kwargs):
+        return {}
+
+
+def measure(name: str, size: int, run):
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name:<10} {size / 2 ** 20:>8.1f} MiB image {elapsed:>8.2f} s  "
+          f"peak {(peak - baseline) / 2 ** 20:>8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 2048, 4096],
+                        help="Width and height in pixels of the served images.")
+    parser.add_argument("--part-size-mib", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SentinelHubStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool = ConnectionPool("127.0.0.1", port=server.server_address[1], use_https=False)
+    fetcher = ImageFetcher("benchmark", "benchmark", pool=pool)
+    s3 = LocalS3()
+    service = ImageService(s3, "benchmark", fetcher, part_size=int(args.part_size_mib * 2 ** 20))
+    coordinate = Coordinate("10.0", "50.0")
+    epoch = HISTORICAL_EPOCHS[0]
+
+    rng = np.random.default_rng(0)
+    for side in args.sizes:
+        SentinelHubStub.image = raster.encode_png(rng.integers(0, 256, (side, side, 3), dtype=np.uint8))
+        size = len(SentinelHubStub.image)
+        print(f"{side}x{side} px, part size {args.part_size_mib} MiB")
+        measure("streamed", size, lambda: service.stream_epoch_to_s3(coordinate, epoch))
+        measure("buffered", size, lambda: service.store_epoch_image(
+            coordinate, epoch, service.fetch_epoch_image(coordinate, epoch)
+        ))
+    print(f"stream stats: {service.get_stream_stats()}")
+
+    service.flush_uploads()
+    pool.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
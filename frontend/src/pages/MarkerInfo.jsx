@@ -43,7 +43,8 @@ const MarkerInfo = () => {
 
   const handleEditMarker = async (data) => {
     console.log("Form data:", data);
-    await editMarker({ markerId, data });
+    // Send the version the form was loaded with, so a concurrent update is rejected instead of overwritten.
+    await editMarker({ markerId, data: { ...data, version: marker.version } });
     setShowEditMarkerModal(false);
   };
 
@@ -12,6 +12,22 @@ logger.setLevel(logging.INFO)
 # Initialize outside the handler for connection reuse
 dynamodb_resource = boto3.resource('dynamodb')
 
+# Width in pixels the frontend displays marker images at, doubled for high-density screens.
+DEFAULT_IMAGE_SIZE = 256
+
+
+def get_image_size(event) -> int:
+    """
+    Read the requested image width from the imageSize query parameter. 0 requests the full-size images.
+
+    :param event: AWS Lambda event object.
+    :return: Minimum image width in pixels.
+    """
+    try:
+        return int((event.get("queryStringParameters") or {}).get("imageSize", DEFAULT_IMAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_IMAGE_SIZE
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler function to retrieve a location marker.
@@ -52,6 +68,9 @@ def lambda_handler(event, context):
     try:
         marker = data_service.get_marker(marker_id)
         logger.info(f"Successfully retrieved marker.")
+        image_size = get_image_size(event)
+        if image_size:
+            marker.select_image_variants(image_size)
     except Exception as e:
         logger.error(f"Error retrieving marker: {e}")
         return {
@@ -12,6 +12,22 @@ logger.setLevel(logging.INFO)
 # Initialize outside the handler for connection reuse
 dynamodb_resource = boto3.resource('dynamodb')
 
+# Width in pixels the frontend displays marker images at, doubled for high-density screens.
+DEFAULT_IMAGE_SIZE = 256
+
+
+def get_image_size(event) -> int:
+    """
+    Read the requested image width from the imageSize query parameter. 0 requests the full-size images.
+
+    :param event: AWS Lambda event object.
+    :return: Minimum image width in pixels.
+    """
+    try:
+        return int((event.get("queryStringParameters") or {}).get("imageSize", DEFAULT_IMAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_IMAGE_SIZE
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler function to retrieve location markers.
@@ -36,8 +52,15 @@ def lambda_handler(event, context):
     data_service = DataService(table_name=table_name, dynamodb_resource=dynamodb_resource)
     
     try:
-        markers = data_service.get_markers()
-        logger.info(f"Successfully retrieved {len(markers)} markers.")
+        # Serialize the markers page by page as they are streamed, instead of holding them all as objects.
+        # Only the summaries are listed; the history of a marker is returned by getMarkerRequest.
+        image_size = get_image_size(event)
+        markers_json = []
+        for marker in data_service.iter_markers():
+            if image_size:
+                marker.select_image_variants(image_size, include_history=False)
+            markers_json.append(marker.to_summary_json())
+        logger.info(f"Successfully retrieved {len(markers_json)} markers.")
     except Exception as e:
         logger.error(f"Error retrieving markers: {e}")
         return {
@@ -57,5 +80,5 @@ def lambda_handler(event, context):
             'Access-Control-Allow-Methods': 'GET,OPTIONS',  # Allowed methods
             'Access-Control-Allow-Headers': 'Content-Type',  # Allowed headers
         },
-        'body': json.dumps([marker.to_json() for marker in markers])
+        'body': json.dumps(markers_json)
     }
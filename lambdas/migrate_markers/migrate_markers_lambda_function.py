@@ -0,0 +1,87 @@
+import os
+import logging
+import boto3
+from data_service import DataService
+from location_marker import LocationMarker
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize outside the handler for connection reuse
+dynamodb_resource = boto3.resource('dynamodb')
+
+# Items per scan page of the old table.
+PAGE_SIZE = 100
+
+# Time left at which the copy stops and returns where to resume, in milliseconds.
+STOP_MARGIN_MS = 60 * 1000
+
+
+def lambda_handler(event, context):
+    """
+    One-off copy of the markers of the old LocationMarkers table, one item per marker, into the
+    LocationMarkerItems table, a summary item and one item per history entry.
+
+    Markers already in the new table are skipped, so the copy can be run again, e.g. after a failure.
+    If the invocation runs out of time, the response contains the `startKey` to invoke it with again.
+
+    :param event: AWS Lambda event object, optionally with the `startKey` to resume the copy at.
+    :param context: AWS Lambda context object.
+    :return: Response with status code and the numbers of copied, skipped and failed markers.
+    """
+    source_table_name = os.environ.get('SOURCE_TABLE_NAME')
+    table_name = os.environ.get('TABLE_NAME')
+    if not source_table_name or not table_name:
+        logger.error("SOURCE_TABLE_NAME or TABLE_NAME environment variable is not set.")
+        return {
+            "statusCode": 500,
+            "body": "SOURCE_TABLE_NAME or TABLE_NAME environment variable is not set."
+        }
+
+    source_table = dynamodb_resource.Table(source_table_name)
+    data_service = DataService(table_name=table_name, dynamodb_resource=dynamodb_resource)
+    counts = {"copied": 0, "skipped": 0, "failed": 0}
+    start_key = (event or {}).get('startKey')
+    while True:
+        scan_kwargs = {'Limit': PAGE_SIZE, 'ConsistentRead': True}
+        if start_key:
+            scan_kwargs['ExclusiveStartKey'] = start_key
+        try:
+            response = source_table.scan(**scan_kwargs)
+        except Exception as e:
+            logger.error(f"Error scanning {source_table_name}: {e}")
+            return {
+                "statusCode": 500,
+                "body": {"error": f"Error scanning {source_table_name}: {e}", "startKey": start_key, **counts}
+            }
+
+        for item in response.get('Items', []):
+            try:
+                marker = LocationMarker.from_json(item)
+                if marker.get_version() is None:
+                    # Versioned updates start at 0, see DataService.update_marker().
+                    marker.set_version(0)
+                if data_service.put_marker(marker, overwrite=False):
+                    counts["copied"] += 1
+                else:
+                    counts["skipped"] += 1
+            except Exception as e:
+                logger.error(f"Failed to copy marker with ID {item.get('markerId')}: {e}")
+                counts["failed"] += 1
+
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key:
+            break
+        if context and context.get_remaining_time_in_millis() < STOP_MARGIN_MS:
+            logger.info(f"Stopping before the timeout, resume with startKey {start_key}: {counts}.")
+            return {
+                "statusCode": 206,
+                "body": {"startKey": start_key, **counts}
+            }
+
+    logger.info(f"Copied the markers of {source_table_name} to {table_name}: {counts}.")
+    return {
+        "statusCode": 500 if counts["failed"] else 200,
+        "body": counts
+    }
@@ -1,11 +1,18 @@
+import itertools
 import os
+import time
 import boto3
 import logging
 from image_service import ImageService
 from data_service import DataService  
 from object_detection_service import ObjectDetectionService
-from detected_objects import DetectedObjects
 from notification_service import NotificationService 
+from observation_engine import ObservationEngine, MODE_ASYNC, MODE_SEQUENTIAL
+from observation_planner import ObservationPlanner
+from change_detection import ChangeDetector
+from spectral_indices import IndexChangeDetector
+from detection_cache import DetectionCache
+from detectors import create_detector, BACKEND_REKOGNITION
 
 # Configure logging
 logger = logging.getLogger()
@@ -44,65 +51,127 @@ def lambda_handler(event, context):
     # Initialize services
     data_service = DataService(table_name=table_name, dynamodb_resource=dynamodb_resource)
     image_service = ImageService(s3_client, bucket_name)
-    object_detecton_service = ObjectDetectionService()
-    notification_service = NotificationService(sns_topic_arn=sns_topic_arn)
-
     try:
-        # Retrieve markers
-        markers = data_service.get_markers()
-        logger.info(f"Successfully retrieved {len(markers)} markers.")
+        detector = create_detector(s3_client=s3_client)
     except Exception as e:
-        logger.error(f"Error retrieving markers: {e}")
-        return {
-            "statusCode": 500,
-            "body": f"Error retrieving markers: {e}"
-        }
+        logger.error(f"Failed to create the detector backend: {e}. Falling back to {BACKEND_REKOGNITION}.")
+        detector = create_detector(BACKEND_REKOGNITION)
+    object_detecton_service = ObjectDetectionService(cache=DetectionCache(s3_client, bucket_name), detector=detector)
+    notification_service = NotificationService(sns_topic_arn=sns_topic_arn)
+    pool_stats_before = image_service.image_fetcher.get_pool_stats()
 
     # observations
+    planner = ObservationPlanner(
+        image_service.image_fetcher,
+        max_distance=float(os.environ.get('SPATIAL_BATCH_DISTANCE', 0.005))
+    )
+    change_detector = ChangeDetector(score_threshold=float(os.environ.get('CHANGE_SCORE_THRESHOLD', 0.02)))
+    index_detector = IndexChangeDetector() if os.environ.get('SPECTRAL_INDICES', 'false').lower() == 'true' else None
+    # Observed markers are written behind the observation in BatchWriteItem batches.
+    write_buffer = None
+    if os.environ.get('BATCH_WRITES', 'true').lower() == 'true':
+        write_buffer = data_service.create_write_buffer(max_workers=int(os.environ.get('WRITE_CONCURRENCY', 4)))
+    engine = ObservationEngine(image_service, object_detecton_service, data_service, planner=planner,
+                               change_detector=change_detector,
+                               max_hash_distance=int(os.environ.get('MAX_HASH_DISTANCE', 4)),
+                               index_detector=index_detector, write_buffer=write_buffer)
+    mode = os.environ.get('OBSERVE_MODE', MODE_ASYNC)
+
+    # Markers are streamed from the table and observed in chunks, so memory does not grow with the table.
+    # Only markers of the same chunk can share a render.
+    chunk_size = int(os.environ.get('OBSERVE_CHUNK_SIZE', 500))
+    markers = data_service.iter_markers(page_size=chunk_size,
+                                        total_segments=int(os.environ.get('SCAN_SEGMENTS', 4)), history=True)
+    processed = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            try:
+                chunk = list(itertools.islice(markers, chunk_size))
+            except Exception as e:
+                logger.error(f"Error retrieving markers: {e}")
+                return {
+                    "statusCode": 500,
+                    "body": f"Error retrieving markers after {processed} markers: {e}"
+                }
+            if not chunk:
+                break
+            logger.info(f"Successfully retrieved {len(chunk)} markers.")
+
+            try:
+                report = engine.run(chunk, mode=mode)
+            except ValueError as e:
+                logger.error(f"{e}. Falling back to {MODE_SEQUENTIAL} mode.")
+                mode = MODE_SEQUENTIAL
+                report = engine.run(chunk, mode=mode)
+            logger.info(f"Observation report: {report.to_json()}")
+
+            processed += len(chunk)
+            if write_buffer:
+                # Notify only once the chunk is stored, and not about markers whose write failed.
+                unwritten = log_write_results(write_buffer.flush(), write_buffer)
+                chunk = [marker for marker in chunk if marker.get_marker_id() not in unwritten]
+            notify_subscribers(notification_service, chunk)
+    finally:
+        # Final flush, also when the scan or a chunk failed, so that every observed marker is written.
+        if write_buffer:
+            log_write_results(write_buffer.close(), write_buffer)
+    elapsed = time.perf_counter() - start
+
+    pool_stats_after = image_service.image_fetcher.get_pool_stats()
+    handshakes = pool_stats_after["connections_created"] - pool_stats_before["connections_created"]
+    requests = pool_stats_after["requests"] - pool_stats_before["requests"]
+    logger.info(f"Sentinel Hub connections: {handshakes} handshakes for {requests} requests ({pool_stats_after}).")
+    logger.info(f"Historical imagery cache: {image_service.get_cache_stats()}.")
+    logger.info(f"Streamed uploads: {image_service.get_stream_stats()}.")
+    logger.info(f"Background uploads: {image_service.get_upload_stats()}.")
+    logger.info(f"Deduplicated uploads: {image_service.get_dedup_stats()}.")
+    logger.info(f"Change detection: {change_detector.get_stats()}.")
+    if index_detector:
+        logger.info(f"Spectral indices: {index_detector.get_stats()}.")
+    logger.info(f"Detection cache: {object_detecton_service.get_cache_stats()}.")
+    logger.info(f"Sentinel Hub token cache: {image_service.image_fetcher.get_token_stats()}.")
+    logger.info(f"Sentinel Hub rate limiting: {image_service.image_fetcher.get_rate_limit_stats()}.")
+
+    return {
+        "statusCode": 200,
+        "body": f"Processed {processed} markers ({processed / elapsed if elapsed else 0.0:.2f} markers/sec)."
+    }
+
+
+def notify_subscribers(notification_service: NotificationService, markers):
+    """
+    Send the status of every observed marker to its subscribers.
+
+    :param notification_service: NotificationService publishing the notifications.
+    :param markers: The observed markers.
+    """
     for marker in markers:
-        try:
-            # Fetch the latest image for the marker
-            image = image_service.get_latest_image(marker.get_coordinate())
-            marker.set_current_image(image)
-
-            # Fetch historical images for the marker
-            if not marker.get_historical_images():
-                images = image_service.get_historical_images(marker.get_coordinate())
-                marker.set_historical_images(images)
-
-            # Run object detection on the image
-            detected_objects = object_detecton_service.detect_object(s3_bucket_name=image.get_s3_bucket_name(), s3_key=image.get_s3_key())
-            if not marker.get_detected_objects():
-                marker.add_detected_objects(detected_objects)
-                marker.set_status("First Observation Occured. Wait another day for more data.")
-            else:
-                change = marker.get_detected_objects()[-1].compare(detected_objects)
-                marker.set_status(change)
-                marker.add_detected_objects(detected_objects)
-
-            if len(marker.get_detected_objects()) > 3: # discard old obervations
-                marker.get_detected_objects().pop(0)
-
-            # Update the marker in DynamoDB
-            data_service.update_marker(marker)
-            logger.info(f"Successfully updated marker with ID {marker.get_marker_id()}.")
-
-        except Exception as e:
-            logger.error(f"Failed to update marker with ID {marker.get_marker_id()}: {e}")
-
-    # notifications
-    for marker in markers:
-        emails = marker.get('subscribedEmails', [])
+        emails = marker.get_subscription_emails()
         if emails:
             try:
                 notification = marker.get_name() + '\n' + marker.get_status()
+                index_series = marker.get_index_series()
+                if index_series and index_series[-1].get("changes"):
+                    notification += '\n' + '\n'.join(index_series[-1]["changes"])
                 notification_service.notify_subscribers(notification, emails)
                 logger.info(f"Notifications sent for marker {marker.get_marker_id()} to {emails}.")
             except Exception as e:
                 logger.error(f"Failed to notify subscribers for marker {marker.get_marker_id()}: {e}")
 
-    return {
-        "statusCode": 200,
-        "body": f"Processed {len(markers)} markers."
-    }
 
+
+def log_write_results(results, write_buffer):
+    """
+    Log the markers the write buffer failed to write and its flush timings.
+
+    :param results: MarkerWriteResults of a flush.
+    :param write_buffer: The flushed MarkerWriteBuffer.
+    :return: The IDs of the markers that failed to be written.
+    """
+    failed = [result for result in results if not result.success]
+    for result in failed:
+        logger.error(f"Failed to update marker with ID {result.marker_id}: {result.error}")
+    logger.info(f"Batched marker writes: {len(results) - len(failed)} succeeded, {len(failed)} failed "
+                f"({write_buffer.get_stats()}).")
+    return {result.marker_id for result in failed}
@@ -2,7 +2,7 @@ import json
 import os
 import logging
 import boto3
-from data_service import DataService
+from data_service import DataService, MarkerConflictError
 from location_marker import LocationMarker
 
 # Configure logging
@@ -12,6 +12,9 @@ logger.setLevel(logging.INFO)
 # Initialize outside the handler for connection reuse
 dynamodb_resource = boto3.resource('dynamodb')
 
+# Summary attributes a client may change. The others are maintained by the observe job.
+EDITABLE_ATTRIBUTES = ('name', 'coordinate', 'subscribedEmails')
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler function to update new location marker.
@@ -51,6 +54,19 @@ def lambda_handler(event, context):
         body = json.loads(event.get('body', '{}'))
         marker = LocationMarker.from_json(body)
         marker.set_marker_id(marker_id)
+        # Only write what the request sets; the attributes it leaves out keep their stored values.
+        attribute_names = [name for name in EDITABLE_ATTRIBUTES if name in body]
+        if not attribute_names:
+            logger.error("Request body sets none of the editable attributes.")
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',  # Allow all origins for testing
+                    'Access-Control-Allow-Methods': 'PUT,OPTIONS',  # Allowed methods
+                    'Access-Control-Allow-Headers': 'Content-Type',  # Allowed headers
+                },
+                'body': json.dumps({'error': f'Request body must set one of {", ".join(EDITABLE_ATTRIBUTES)}.'})
+            }
 
         # Validate the LocationMarker
         try:
@@ -93,7 +109,7 @@ def lambda_handler(event, context):
     data_service = DataService(table_name=table_name, dynamodb_resource=dynamodb_resource)
 
     try:
-        data_service.update_marker(marker)
+        data_service.update_marker(marker, attribute_names=attribute_names)
         logger.info(f"Successfully updated marker.")
         return {
             'statusCode': 201,
@@ -102,7 +118,19 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Methods': 'PUT,OPTIONS',  # Allowed methods
                 'Access-Control-Allow-Headers': 'Content-Type',  # Allowed headers
             },
-            'body': json.dumps({'message': 'Marker updated successfully'})
+            'body': json.dumps({'message': 'Marker updated successfully', 'version': marker.get_version()})
+        }
+    except MarkerConflictError as e:
+        logger.warning(f"Rejected conflicting update: {e}")
+        return {
+            'statusCode': 409,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',  # Allow all origins for testing
+                'Access-Control-Allow-Methods': 'PUT,OPTIONS',  # Allowed methods
+                'Access-Control-Allow-Headers': 'Content-Type',  # Allowed headers
+            },
+            'body': json.dumps({'error': 'Marker was modified concurrently. Reload it and try again.',
+                                'version': e.stored_version})
         }
     except Exception as e:
         logger.error(f"Failed to update marker and upload to DynamoDB: {e}")
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+
+class ChangeResult(NamedTuple):
+    """
+    The pixel difference between two images of the same area.
+    """
+    score: float
+    band_differences: List[float]
+    mask: np.ndarray
+    seconds: float
+
+
+class ChangeDetector:
+    """
+    Scores the change between two renders of the same area by comparing their pixels.
+
+    A pixel counts as changed when any band differs by more than `pixel_threshold` (as a fraction
+    of the full range). The score is the ratio of changed pixels, and the change is significant
+    when it exceeds `score_threshold`. Only significant changes are worth an object detection call.
+    """
+
+    def __init__(self, pixel_threshold: float = 0.1, score_threshold: float = 0.02):
+        """
+        Initialize the detector.
+
+        :param pixel_threshold: Minimum band difference, between 0 and 1, for a pixel to count as changed.
+        :param score_threshold: Minimum ratio of changed pixels for a change to be significant.
+        """
+        self.pixel_threshold = pixel_threshold
+        self.score_threshold = score_threshold
+        self._lock = threading.Lock()
+        self._stats = {"comparisons": 0, "significant": 0, "seconds": 0.0, "max_seconds": 0.0}
+
+    def compare(self, previous: np.ndarray, current: np.ndarray) -> ChangeResult:
+        """
+        Compare two images of the same area.
+
+        Images of different sizes cannot be aligned, so they are reported as fully changed.
+
+        :param previous: The earlier image, of shape (height, width, bands).
+        :param current: The later image, of shape (height, width, bands).
+        :return: The ChangeResult.
+        """
+        started = time.perf_counter()
+        if previous.shape != current.shape:
+            mask = np.ones(current.shape[:2], dtype=bool)
+            result = ChangeResult(1.0, [1.0] * current.shape[2], mask, time.perf_counter() - started)
+        else:
+            scale = np.float32(255 if previous.dtype == np.uint8 else 1)
+            difference = np.abs(current.astype(np.float32) - previous.astype(np.float32))
+            difference /= scale
+            mask = (difference > self.pixel_threshold).any(axis=2)
+            band_differences = difference.mean(axis=(0, 1))
+            result = ChangeResult(
+                float(mask.mean()), [float(value) for value in band_differences], mask, time.perf_counter() - started
+            )
+
+        with self._lock:
+            self._stats["comparisons"] += 1
+            self._stats["significant"] += int(self.is_significant(result))
+            self._stats["seconds"] += result.seconds
+            self._stats["max_seconds"] = max(self._stats["max_seconds"], result.seconds)
+        return result
+
+    def is_significant(self, result: ChangeResult) -> bool:
+        return result.score > self.score_threshold
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the number of comparisons, how many were significant and the compute time per image.
+
+        :return: Dictionary of counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mean_seconds"] = stats["seconds"] / stats["comparisons"] if stats["comparisons"] else 0.0
+        return stats
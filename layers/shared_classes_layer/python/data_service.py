@@ -1,8 +1,40 @@
 import boto3
-from typing import List
+import queue
+import threading
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
 from location_marker import LocationMarker
+from marker_items import (SUMMARY_KEY, apply_history, history_changes, history_items, mark_history_persisted,
+                          marker_from_items, summary_item, summary_key)
+from rate_limiter import RetryPolicy
 import uuid
 
+# Items per scan page. DynamoDB also ends a page at 1 MB of data.
+DEFAULT_PAGE_SIZE = 500
+
+# Queued by a parallel scan worker when its segment is exhausted.
+_SEGMENT_DONE = object()
+
+# Maximum number of put requests in one BatchWriteItem call.
+BATCH_WRITE_SIZE = 25
+
+# Error codes of a whole BatchWriteItem call that are worth retrying with backoff.
+RETRYABLE_ERROR_CODES = ("ProvisionedThroughputExceededException", "ThrottlingException",
+                         "RequestLimitExceeded", "InternalServerError")
+
+class MarkerConflictError(Exception):
+    """Raised when a marker was updated concurrently since it was read."""
+
+    def __init__(self, marker_id: str, expected_version: int, stored_version: int):
+        super().__init__(f"Marker with ID {marker_id} was updated concurrently "
+                         f"(expected version {expected_version}, found {stored_version})")
+        self.marker_id = marker_id
+        self.expected_version = expected_version
+        self.stored_version = stored_version
+
+
 class DataService:
     """A service class for interacting with the DynamoDB LocationMarkers table."""
 
@@ -14,22 +46,178 @@ class DataService:
         :param dynamodb_resource: Optional DynamoDB resource for dependency injection.
         """
         self.dynamodb = dynamodb_resource or boto3.resource('dynamodb')
+        self.table_name = table_name
         self.table = self.dynamodb.Table(table_name)
 
     def get_markers(self) -> List[LocationMarker]:
         """
         Retrieve all markers from the DynamoDB table.
 
+        Prefer iter_markers() for large tables, which does not hold all markers in memory at once.
+
         :return: A list of markers.
         :raises Exception: Raises an exception if there is an issue retrieving markers.
         """
-        try: 
-            response = self.table.scan()
-            markers_data = response.get('Items', [])
-            markers = [LocationMarker.from_json(marker_data) for marker_data in markers_data]
-            return markers
-        except Exception as e:
-            raise Exception("Failed to retrieve markers from DynamoDB") from e
+        return list(self.iter_markers())
+
+    def iter_markers(self, page_size: int = DEFAULT_PAGE_SIZE, projection: List[str] = None,
+                     total_segments: int = 1, segment: int = None, history: bool = False) -> Iterator[LocationMarker]:
+        """
+        Stream all markers from the DynamoDB table, one scan page at a time.
+
+        Pages are requested lazily as the markers are consumed, following LastEvaluatedKey until the
+        whole table was read, and each marker is built only when it is reached. With several segments
+        the table is read by a parallel scan: one worker per segment, merged into one stream in the
+        order the pages arrive. Passing `segment` reads only that segment, e.g. to hand the segments
+        out to separate workers or invocations.
+
+        By default only the summary items are returned and the history of each marker is loaded with
+        a query when it is first accessed. With `history` the history items are scanned as well, which
+        is cheaper when the history of every marker is needed.
+
+        :param page_size: Maximum number of items per scan request.
+        :param projection: Optional attribute paths to read, e.g. ["markerId", "coordinate"]. Markers are
+                           built from the projected attributes only, with defaults for the others.
+        :param total_segments: Number of segments the table is scanned in.
+        :param segment: Optional single segment to read, from 0 to total_segments - 1.
+        :param history: Read the history items in the same scan.
+        :return: Iterator over the markers.
+        :raises Exception: Raises an exception if there is an issue retrieving markers.
+        """
+        if segment is not None or total_segments <= 1:
+            pages = self._group_items(self.iter_marker_pages(page_size, projection, segment, total_segments, history))
+        else:
+            pages = self._iter_parallel_pages(page_size, projection, total_segments, history)
+        for page in pages:
+            for items in page:
+                marker = self._load_marker(items, history)
+                if marker:
+                    yield marker
+
+    def iter_marker_pages(self, page_size: int = DEFAULT_PAGE_SIZE, projection: List[str] = None,
+                          segment: int = None, total_segments: int = 1, history: bool = False) -> Iterator[List[Dict]]:
+        """
+        Stream the raw items of the DynamoDB table, or of one segment of it, one scan page at a time.
+
+        :param page_size: Maximum number of items read per scan request, including filtered out history items.
+        :param projection: Optional attribute paths to read.
+        :param segment: Optional segment to read, from 0 to total_segments - 1.
+        :param total_segments: Number of segments the table is divided into when `segment` is given.
+        :param history: Return the history items as well as the summary items.
+        :return: Iterator over the pages, each a list of items.
+        :raises Exception: Raises an exception if there is an issue retrieving markers.
+        """
+        # The keys are needed to group the items of each marker.
+        scan_kwargs = self._build_projection(list(dict.fromkeys(projection + ['markerId', 'sk'])) if projection else None)
+        if not history:
+            scan_kwargs['FilterExpression'] = '#sk = :summary'
+            scan_kwargs.setdefault('ExpressionAttributeNames', {})['#sk'] = 'sk'
+            scan_kwargs['ExpressionAttributeValues'] = {':summary': SUMMARY_KEY}
+        if page_size:
+            scan_kwargs['Limit'] = page_size
+        if segment is not None:
+            scan_kwargs['Segment'] = segment
+            scan_kwargs['TotalSegments'] = total_segments
+        while True:
+            try:
+                response = self.table.scan(**scan_kwargs)
+            except Exception as e:
+                raise Exception("Failed to retrieve markers from DynamoDB") from e
+            yield response.get('Items', [])
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            scan_kwargs['ExclusiveStartKey'] = last_key
+
+    @staticmethod
+    def _group_items(pages: Iterator[List[Dict]]) -> Iterator[List[List[Dict]]]:
+        """
+        Regroup scanned pages into the items of each marker.
+
+        A scan returns the items of a partition one after another, but a page can end inside a partition,
+        so the last group of a page is held back until the next page shows it is complete.
+
+        :param pages: Pages of one scan or one segment.
+        :return: Iterator over lists of groups, each group holding the items of one marker.
+        """
+        group = []
+        for page in pages:
+            groups = []
+            for item in page:
+                if group and item['markerId'] != group[0]['markerId']:
+                    groups.append(group)
+                    group = []
+                group.append(item)
+            if groups:
+                yield groups
+        if group:
+            yield [group]
+
+    def _iter_parallel_pages(self, page_size: int, projection: List[str], total_segments: int,
+                             history: bool = False) -> Iterator[List[List[Dict]]]:
+        """
+        Scan all segments concurrently and yield their grouped pages as they arrive.
+
+        A partition always lies in a single segment, so each worker groups the items of its own segment.
+        A bounded queue holds at most two pages per segment, so workers pause while the consumer is
+        busy and memory stays flat. Closing the iterator stops the workers after their current page.
+        """
+        pages = queue.Queue(maxsize=2 * total_segments)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scan_segment(segment: int):
+            try:
+                segment_pages = self.iter_marker_pages(page_size, projection, segment, total_segments, history)
+                for page in self._group_items(segment_pages):
+                    if not put(page):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(_SEGMENT_DONE)
+
+        with ThreadPoolExecutor(max_workers=total_segments, thread_name_prefix="scan") as executor:
+            for segment in range(total_segments):
+                executor.submit(scan_segment, segment)
+            try:
+                remaining = total_segments
+                while remaining:
+                    page = pages.get()
+                    if page is _SEGMENT_DONE:
+                        remaining -= 1
+                    elif isinstance(page, Exception):
+                        raise page
+                    else:
+                        yield page
+            finally:
+                stop.set()
+
+    @staticmethod
+    def _build_projection(projection: List[str] = None) -> Dict:
+        """
+        Build the ProjectionExpression for attribute paths, with placeholders so reserved words like "name" work.
+
+        :param projection: Attribute paths, nested ones separated by dots.
+        :return: Scan keyword arguments, empty without a projection.
+        """
+        if not projection:
+            return {}
+        placeholders = {}
+        paths = []
+        for path in projection:
+            parts = [placeholders.setdefault(part, f"#p{len(placeholders)}") for part in path.split('.')]
+            paths.append('.'.join(parts))
+        names = {placeholder: part for part, placeholder in placeholders.items()}
+        return {'ProjectionExpression': ', '.join(paths), 'ExpressionAttributeNames': names}
 
     def add_marker(self, marker: LocationMarker) -> str:
         """
@@ -41,13 +229,50 @@ class DataService:
         try:
             unique_id = str(uuid.uuid4()) #generate id
             marker.set_marker_id(unique_id)
+            marker.set_version(0)
            
-            self.table.put_item(Item=marker.to_json())
+            self.put_marker(marker)
 
             return unique_id
         except Exception as e:
             raise Exception("Failed to add marker to DynamoDB") from e        
 
+    def put_marker(self, marker: LocationMarker, overwrite: bool = True) -> bool:
+        """
+        Write a marker with its ID as it is: its summary item and one item per history entry, e.g. to copy
+        markers from another table.
+
+        Without `overwrite`, a stored marker with the same ID is kept and nothing is written. The history
+        items then go first and the summary last, so a copy interrupted in between is completed by the next
+        attempt instead of being skipped without its history.
+
+        :param marker: A LocationMarker with an ID.
+        :param overwrite: Replace a stored marker with the same ID.
+        :return: Whether the marker was written.
+        """
+        items = history_items(marker)
+        if overwrite:
+            self.table.put_item(Item=summary_item(marker))
+            self._put_items(items.values())
+        else:
+            if self._get_item(marker.get_marker_id(), consistent=True):
+                return False
+            self._put_items(items.values())
+            try:
+                self.table.put_item(Item=summary_item(marker), ConditionExpression='attribute_not_exists(markerId)')
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+                return False
+        marker.mark_persisted()
+        mark_history_persisted(marker, items)
+        return True
+
+    def _put_items(self, items: Iterable[Dict]):
+        with self.table.batch_writer() as writer:
+            for item in items:
+                writer.put_item(Item=item)
+
     def delete_marker(self, markerId):
         """
         Delete a marker from the DynamoDB table.
@@ -56,65 +281,528 @@ class DataService:
         :return: The response from DynamoDB.
         """
         try:
+            # The summary goes first, so the marker disappears from scans at once.
             response = self.table.delete_item(
-                Key={
-                    'markerId': str(markerId)  #dynamoDB schema requires string here
-                }
+                Key=summary_key(markerId)  #dynamoDB schema requires string here
             )
+            with self.table.batch_writer() as writer:
+                for item in self._query_partition(markerId, projection='#markerId, sk'):
+                    writer.delete_item(Key={'markerId': item['markerId'], 'sk': item['sk']})
             return response
         except Exception as e:
             return None
         
-    def update_marker(self, marker: LocationMarker):
+    def update_marker(self, marker: LocationMarker, merge_on_conflict: bool = False, max_attempts: int = 3,
+                      attribute_names: Optional[Iterable[str]] = None):
         """
-        Update an existing marker in DynamoDB
-        :param marker: A LocationMarker with updated information. Replaces marker with identical ID
-        :return: The updated LocationMarker.
+        Update an existing marker in DynamoDB with a single conditional UpdateItem.
+
+        Only the attributes changed since the marker was read are written, and the stored `version` is
+        incremented. If the marker has a version, the write only succeeds while the stored version is
+        unchanged, so concurrent updates cannot overwrite each other. A marker without a version, e.g.
+        from a client that does not send one, is written unconditionally.
+
+        A marker built from a request rather than read from the table counts every attribute as
+        changed; pass `attribute_names` to write only the attributes the request set, so the others
+        keep their stored values.
+
+        History entries added or changed since the marker was read are then put as their own items and
+        removed entries deleted. The history of markers not read from the table is not written.
+
+        :param marker: A LocationMarker with updated information.
+        :param merge_on_conflict: On a version conflict, retry if the concurrent update changed none of
+                                  the attributes written here, instead of raising MarkerConflictError.
+        :param max_attempts: Maximum number of writes when merging conflicts.
+        :param attribute_names: Optional summary attributes to restrict the write to.
+        :raises MarkerConflictError: If the marker was updated concurrently.
         :raises Exception: Raises an exception if there is an issue updating the marker.
         """
+        marker_id = marker.get_marker_id()
+        if not marker_id:
+            raise Exception("Failed to update marker in DynamoDB: Marker must have an ID")
+
+        attributes = marker.get_changed_attributes()
+        attributes.pop('markerId', None)
+        attributes.pop('version', None)
+        if attribute_names is not None:
+            attributes = {name: value for name, value in attributes.items() if name in attribute_names}
+        if not attributes:
+            self._write_history(marker)
+            return
+
+        expected_version = marker.get_version()
+        for attempt in range(max_attempts):
+            try:
+                response = self.table.update_item(**self._build_update(marker_id, attributes, expected_version))
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise Exception(f"Failed to update marker in DynamoDB: {e}")
+                stored = self._get_item(marker_id, consistent=True)
+                if not stored:
+                    raise Exception(f"Failed to update marker in DynamoDB: Marker with ID {marker_id} does not exist")
+                stored_version = int(stored.get('version') or 0)
+                if not merge_on_conflict or attempt == max_attempts - 1 \
+                        or not self._can_merge(marker, stored, attributes):
+                    raise MarkerConflictError(marker_id, expected_version, stored_version)
+                expected_version = stored_version
+                continue
+            except Exception as e:
+                raise Exception(f"Failed to update marker in DynamoDB: {e}")
+
+            marker.set_version(int(response['Attributes']['version']))
+            marker.mark_persisted()
+            self._write_history(marker)
+            return
+
+    def _write_history(self, marker: LocationMarker):
+        """
+        Put the new and changed history items of a marker and delete the removed ones.
+        """
+        puts, deletes = history_changes(marker)
+        if not puts and not deletes:
+            return
         try:
-            marker_id = marker.get_marker_id()
-            if not marker_id:
-                raise ValueError("Marker must have an ID")
+            with self.table.batch_writer() as writer:
+                for item in puts:
+                    writer.put_item(Item=item)
+                for key in deletes:
+                    writer.delete_item(Key={'markerId': marker.get_marker_id(), 'sk': key})
+        except Exception as e:
+            raise Exception(f"Failed to update the history of marker {marker.get_marker_id()} in DynamoDB: {e}")
+        mark_history_persisted(marker)
 
-            #get original marker data
-            original_marker_data = self.table.get_item(
-                Key={'markerId': str(marker_id)}
-            ).get('Item')
+    def create_write_buffer(self, batch_size: int = BATCH_WRITE_SIZE, max_workers: int = 4,
+                            retry_policy: RetryPolicy = None, check_versions: bool = True) -> 'MarkerWriteBuffer':
+        """
+        Create a write-behind buffer that persists updated markers in batches, see MarkerWriteBuffer.
 
-            if not original_marker_data:
-                raise ValueError(f"Marker with ID {marker_id} does not exist")
+        :param batch_size: Maximum markers per BatchWriteItem call, at most 25.
+        :param max_workers: Maximum number of batches written at once.
+        :param retry_policy: Backoff for unprocessed items and throttled calls.
+        :param check_versions: Check the stored versions before every batch.
+        :return: The MarkerWriteBuffer.
+        """
+        return MarkerWriteBuffer(self, batch_size, max_workers, retry_policy, check_versions)
 
-            #remove old entry
-            self.delete_marker(marker_id)
+    @staticmethod
+    def _build_update(marker_id: str, attributes: Dict, expected_version: int = None) -> Dict:
+        """
+        Build the UpdateItem arguments that set `attributes` and increment the version.
 
-            #replace with updated entry
-            self.table.put_item(Item=marker.to_json())
-        
+        :param marker_id: The ID of the marker.
+        :param attributes: The JSON attributes to set.
+        :param expected_version: The version the stored marker must have, or None to write unconditionally.
+        :return: Keyword arguments for Table.update_item().
+        """
+        names = {'#markerId': 'markerId', '#version': 'version'}
+        values = {':one': 1}
+        assignments = []
+        for index, (name, value) in enumerate(attributes.items()):
+            names[f"#a{index}"] = name
+            values[f":a{index}"] = value
+            assignments.append(f"#a{index} = :a{index}")
+
+        condition = "attribute_exists(#markerId)"
+        if expected_version is not None:
+            values[':expected'] = expected_version
+            version_condition = "#version = :expected"
+            if expected_version == 0:
+                # Markers stored before versioning have no version attribute yet.
+                version_condition = f"(attribute_not_exists(#version) OR {version_condition})"
+            condition = f"{condition} AND {version_condition}"
+
+        return {
+            'Key': summary_key(marker_id),
+            'UpdateExpression': f"SET {', '.join(assignments)} ADD #version :one",
+            'ConditionExpression': condition,
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+            'ReturnValues': 'UPDATED_NEW',
+        }
+
+    @staticmethod
+    def _can_merge(marker: LocationMarker, stored: Dict, attributes: Dict) -> bool:
+        """
+        Decide whether a write can be retried on top of a concurrent update: the concurrent update must
+        not have changed any of the attributes written here.
+        """
+        concurrent = LocationMarker.from_json(stored).to_summary_json()
+        return all(marker.is_persisted_value(name, concurrent.get(name)) for name in attributes)
+
+    def _get_item(self, marker_id: str, consistent: bool = False) -> Optional[Dict]:
+        return self.table.get_item(Key=summary_key(marker_id), ConsistentRead=consistent).get('Item')
+
+    def _query_partition(self, marker_id: str, projection: str = None) -> Iterator[Dict]:
+        """
+        Read all items of a marker's partition, the summary and the history items.
+        """
+        query_kwargs = {'KeyConditionExpression': '#markerId = :markerId',
+                        'ExpressionAttributeNames': {'#markerId': 'markerId'},
+                        'ExpressionAttributeValues': {':markerId': str(marker_id)}}
+        if projection:
+            query_kwargs['ProjectionExpression'] = projection
+        while True:
+            response = self.table.query(**query_kwargs)
+            yield from response.get('Items', [])
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            query_kwargs['ExclusiveStartKey'] = last_key
+
+    def _load_history(self, marker: LocationMarker):
+        """
+        Load the history items of a marker on first access.
+        """
+        try:
+            apply_history(marker, self._query_partition(marker.get_marker_id()))
         except Exception as e:
-            raise Exception(f"Failed to update marker in DynamoDB: {e}")
-        
+            raise Exception(f"Failed to retrieve the history of marker {marker.get_marker_id()} from DynamoDB") from e
+
+    def _load_marker(self, items: List[Dict], history: bool = True) -> Optional[LocationMarker]:
+        """
+        Build a marker from the items of its partition and remember its attributes, so that updates only
+        write changes. Without `history` the history is loaded when first accessed.
+
+        :param items: The summary item, and with `history` the history items of the marker.
+        :param history: Whether `items` holds the history items.
+        :return: The marker, or None if there is no summary item.
+        """
+        if history:
+            marker = marker_from_items(items)
+            if marker is None:
+                return None
+        else:
+            marker = LocationMarker.from_json(items[0])
+            marker.set_history_loader(self._load_history)
+        if marker.get_version() is None:
+            marker.set_version(0)
+        marker.mark_persisted()
+        return marker
+
     def get_marker(self, marker_id: str) -> LocationMarker:
         """
         Retrieve a specific marker from DynamoDB by marker_id.
         
+        Only the summary item is read; the history is loaded with a query when it is first accessed.
+
         :param marker_id: Unique identifier for the marker.
         :return: The corresponding LocationMarker instance, or raises an exception if not found.
         :raises Exception: Raises an exception if there is an issue retrieving the marker.
         """
         try:
             #get the marker data from
-            marker_data = self.table.get_item(
-                Key={'markerId': str(marker_id)}
-            ).get('Item')
+            marker_data = self._get_item(marker_id)
 
             #check if marker exists
             if not marker_data:
                 raise ValueError(f"Marker with ID {marker_id} does not exist")
 
             #return marker object
-            marker = LocationMarker.from_json(marker_data)
+            marker = self._load_marker([marker_data], history=False)
             return marker
 
         except Exception as e:
             raise Exception("Failed to retrieve marker from DynamoDB") from e
+
+
+class MarkerWriteResult(NamedTuple):
+    """
+    The outcome of persisting one marker through a MarkerWriteBuffer.
+    """
+    marker_id: str
+    success: bool
+    error: Optional[str] = None
+
+
+class MarkerWriteBuffer:
+    """
+    Collects updated markers and persists them in batches with BatchWriteItem.
+
+    Markers are added as they are observed and written in groups of up to 25 by a bounded pool, so
+    thousands of updates cost a few hundred round trips that overlap with the observation. Unprocessed
+    items are retried with backoff. flush() writes the rest and returns the result of every marker.
+
+    A marker's summary item is put whole, together with its new and changed history items in the same
+    BatchWriteItem call.
+
+    BatchWriteItem only puts whole items and cannot be conditional. To keep the versioning of
+    update_marker(), the stored versions of a batch are read first with one consistent BatchGetItem.
+    Markers whose version moved or that were deleted meanwhile are not put but go through the
+    conditional update_marker() with merging, so concurrent API updates are neither overwritten nor
+    deleted markers recreated. The remaining window is the time between the check and the write.
+    Markers must not be modified after they were added until the buffer was flushed.
+    """
+
+    def __init__(self, data_service: DataService, batch_size: int = BATCH_WRITE_SIZE, max_workers: int = 4,
+                 retry_policy: RetryPolicy = None, check_versions: bool = True):
+        """
+        Initialize the buffer and its worker pool.
+
+        :param data_service: DataService of the markers table.
+        :param batch_size: Maximum markers per batch, at most 25. The requests of a batch are sent 25 at a time.
+        :param max_workers: Maximum number of batches written at once. add() blocks while all are busy.
+        :param retry_policy: Backoff for unprocessed items and throttled calls.
+        :param check_versions: Check the stored versions before every batch. Without the check, markers
+                               updated concurrently are overwritten.
+        """
+        if not 0 < batch_size <= BATCH_WRITE_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {BATCH_WRITE_SIZE}")
+        self.data_service = data_service
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=8, base_delay=0.05, max_delay=2.0)
+        self.check_versions = check_versions
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="write")
+        self._slots = threading.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._futures: List[Future] = []
+        self._results: List[MarkerWriteResult] = []
+        self._batch_seconds: List[float] = []
+        self._stats = {"batches": 0, "requests": 0, "version_checks": 0, "retries": 0, "written": 0,
+                       "unchanged": 0, "conflicts": 0, "failed": 0, "flushes": 0, "flush_seconds": 0.0}
+
+    def add(self, marker: LocationMarker):
+        """
+        Queue an updated marker for writing. A full batch is handed to the pool right away.
+
+        :param marker: A LocationMarker loaded from the table, with updated information.
+        """
+        marker_id = marker.get_marker_id()
+        changed = marker.get_changed_attributes()
+        changed.pop('markerId', None)
+        changed.pop('version', None)
+        puts, deletes = history_changes(marker)
+        if not changed and not puts and not deletes:
+            self._record([MarkerWriteResult(marker_id, True)], "unchanged")
+            return
+
+        # The summary is put whole with the next version, the history items that changed along with it.
+        # It goes last, so a marker too large for one call only gets its new version once the rest is written.
+        requests = [{'PutRequest': {'Item': item}} for item in puts]
+        requests += [{'DeleteRequest': {'Key': {'markerId': marker_id, 'sk': key}}} for key in deletes]
+        requests.append({'PutRequest': {'Item': dict(summary_item(marker), version=(marker.get_version() or 0) + 1)}})
+        with self._lock:
+            self._pending.append((marker, requests))
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._submit(batch)
+
+    def _submit(self, batch: List[tuple]):
+        # Wait for a free worker, so that the buffer holds at most max_workers batches in flight.
+        self._slots.acquire()
+        future = self._executor.submit(self._write_batch, batch)
+        with self._lock:
+            self._futures.append(future)
+
+    def flush(self) -> List[MarkerWriteResult]:
+        """
+        Write the queued markers and wait for all batches in flight.
+
+        :return: The result of every marker added since the last flush, in completion order.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._submit(batch)
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+        with self._lock:
+            results, self._results = self._results, []
+            self._stats["flushes"] += 1
+            self._stats["flush_seconds"] += time.perf_counter() - started
+        return results
+
+    def close(self) -> List[MarkerWriteResult]:
+        """
+        Flush the buffer and stop the workers.
+
+        :return: The result of every marker added since the last flush.
+        """
+        results = self.flush()
+        self._executor.shutdown(wait=True)
+        return results
+
+    def _write_batch(self, batch: List[tuple]):
+        started = time.perf_counter()
+        try:
+            try:
+                puts, conflicts = self._check_versions(batch) if self.check_versions else (batch, [])
+            except Exception as e:
+                self._record([MarkerWriteResult(marker.get_marker_id(), False, str(e)) for marker, _ in batch],
+                             "failed")
+                return
+            self._put_batch(puts)
+            for marker in conflicts:
+                self._update_conflicting(marker)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._stats["batches"] += 1
+                self._batch_seconds.append(time.perf_counter() - started)
+
+    def _check_versions(self, batch: List[tuple]):
+        """
+        Split a batch into the markers whose stored version is the one they were loaded with and the others.
+        """
+        keys = [summary_key(marker.get_marker_id()) for marker, _ in batch]
+        request = {'Keys': keys, 'ConsistentRead': True, 'ProjectionExpression': '#markerId, #version',
+                   'ExpressionAttributeNames': {'#markerId': 'markerId', '#version': 'version'}}
+        stored = {}
+        for attempt in range(self.retry_policy.max_attempts):
+            response = self._call('version_checks', self.data_service.dynamodb.batch_get_item,
+                                  RequestItems={self.data_service.table_name: request})
+            for item in response.get('Responses', {}).get(self.data_service.table_name, []):
+                stored[item['markerId']] = int(item.get('version') or 0)
+            unprocessed = response.get('UnprocessedKeys', {}).get(self.data_service.table_name)
+            if not unprocessed:
+                break
+            request = unprocessed
+            self._backoff(attempt)
+        else:
+            raise Exception("Failed to check marker versions in DynamoDB: keys left unprocessed")
+
+        puts, conflicts = [], []
+        for marker, requests in batch:
+            if marker.get_version() is not None and stored.get(marker.get_marker_id()) == marker.get_version():
+                puts.append((marker, requests))
+            else:
+                conflicts.append(marker)
+        return puts, conflicts
+
+    def _put_batch(self, batch: List[tuple]):
+        """
+        Write the requests of a batch with BatchWriteItem, 25 at a time, retrying unprocessed requests with backoff.
+
+        A call only carries the requests of whole markers, so a failed call leaves no marker half written.
+        Only a marker with more than 25 requests is spread over calls of its own. A marker is written once
+        all of its requests were processed.
+        """
+        outstanding = {}
+        groups = []
+        for marker, marker_requests in batch:
+            outstanding[marker.get_marker_id()] = [marker, len(marker_requests)]
+            groups.append(list(marker_requests))
+
+        attempt = 0
+        while groups:
+            chunk = self._next_chunk(groups)
+            try:
+                response = self._call('requests', self.data_service.dynamodb.batch_write_item,
+                                      RequestItems={self.data_service.table_name: chunk})
+            except Exception as e:
+                failed = {self._get_request_marker_id(request) for request in chunk}
+                self._record([MarkerWriteResult(marker_id, False, f"Failed to write marker to DynamoDB: {e}")
+                              for marker_id in failed], "failed")
+                for marker_id in failed:
+                    del outstanding[marker_id]
+                # The rest of a marker spread over several calls is not written either.
+                groups = [group for group in groups if self._get_request_marker_id(group[0]) not in failed]
+                continue
+            unprocessed = response.get('UnprocessedItems', {}).get(self.data_service.table_name, [])
+            written = []
+            for request in chunk:
+                if request in unprocessed:
+                    continue
+                marker_id = self._get_request_marker_id(request)
+                outstanding[marker_id][1] -= 1
+                if not outstanding[marker_id][1]:
+                    marker = outstanding.pop(marker_id)[0]
+                    marker.set_version((marker.get_version() or 0) + 1)
+                    marker.mark_persisted()
+                    mark_history_persisted(marker)
+                    written.append(MarkerWriteResult(marker_id, True))
+            self._record(written, "written")
+            if unprocessed:
+                if attempt == self.retry_policy.max_attempts - 1:
+                    break
+                self._backoff(attempt)
+                attempt += 1
+                groups = self._group_by_marker(unprocessed) + groups
+
+        self._record([MarkerWriteResult(marker_id, False, "Left unprocessed by BatchWriteItem")
+                      for marker_id in outstanding], "failed")
+
+    @staticmethod
+    def _next_chunk(groups: List[List[Dict]]) -> List[Dict]:
+        """
+        Take the requests of as many whole markers as fit into one BatchWriteItem call off the front of
+        `groups`, or the first 25 requests of a marker that does not fit into one call on its own.
+        """
+        chunk = []
+        while groups and len(chunk) + len(groups[0]) <= BATCH_WRITE_SIZE:
+            chunk += groups.pop(0)
+        if not chunk:
+            chunk, groups[0] = groups[0][:BATCH_WRITE_SIZE], groups[0][BATCH_WRITE_SIZE:]
+        return chunk
+
+    @classmethod
+    def _group_by_marker(cls, requests: List[Dict]) -> List[List[Dict]]:
+        groups = {}
+        for request in requests:
+            groups.setdefault(cls._get_request_marker_id(request), []).append(request)
+        return list(groups.values())
+
+    @staticmethod
+    def _get_request_marker_id(request: Dict) -> str:
+        if 'PutRequest' in request:
+            return request['PutRequest']['Item']['markerId']
+        return request['DeleteRequest']['Key']['markerId']
+
+    def _update_conflicting(self, marker: LocationMarker):
+        """
+        Write a marker whose stored version moved, or that is missing, with the conditional update_marker().
+        """
+        with self._lock:
+            self._stats["conflicts"] += 1
+        try:
+            self.data_service.update_marker(marker, merge_on_conflict=True)
+        except Exception as e:
+            self._record([MarkerWriteResult(marker.get_marker_id(), False, str(e))], "failed")
+            return
+        self._record([MarkerWriteResult(marker.get_marker_id(), True)], "written")
+
+    def _call(self, counter: str, method, **kwargs) -> Dict:
+        """
+        Call a batch operation, retrying the whole call with backoff while it is throttled.
+        """
+        for attempt in range(self.retry_policy.max_attempts):
+            with self._lock:
+                self._stats[counter] += 1
+            try:
+                return method(**kwargs)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in RETRYABLE_ERROR_CODES \
+                        or attempt == self.retry_policy.max_attempts - 1:
+                    raise
+            self._backoff(attempt)
+
+    def _backoff(self, attempt: int):
+        with self._lock:
+            self._stats["retries"] += 1
+        time.sleep(self.retry_policy.get_delay(attempt))
+
+    def _record(self, results: List[MarkerWriteResult], counter: str):
+        with self._lock:
+            self._results.extend(results)
+            self._stats[counter] += len(results)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the numbers of batches, requests, retries and of written, unchanged, conflicting and failed
+        markers, and the batch and flush times in seconds.
+
+        :return: Dictionary of counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            timings = sorted(self._batch_seconds)
+        stats["p50_batch_seconds"] = timings[len(timings) // 2] if timings else 0.0
+        stats["max_batch_seconds"] = timings[-1] if timings else 0.0
+        stats["total_batch_seconds"] = sum(timings)
+        return stats
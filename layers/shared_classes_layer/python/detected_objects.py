@@ -1,22 +1,35 @@
 from typing import List, Dict
 
+from label_vocabulary import LabelVocabulary, default_vocabulary
+
 class DetectedObjects:
-    def __init__(self, date_detected: str, detected_objects: List[str]):
+    """
+    The labels detected in one observation.
+
+    Label names are interned in a LabelVocabulary and the label set is kept as a bitset, so
+    comparisons are integer operations.
+    Replace the labels with set_detected_objects() rather than mutating the returned list.
+    """
+    def __init__(self, date_detected: str, detected_objects: List[str],
+                 vocabulary: LabelVocabulary = default_vocabulary):
         """
         Constructor for the DetectedObjects class.
         
         :param date_detected: Date when the objects were detected, as a string.
         :param detected_objects: List of detected objects, each as a string.
+        :param vocabulary: LabelVocabulary interning the label names. Compared instances must share it.
         """
+        self._vocabulary = vocabulary
         self._date_detected = date_detected
-        self._detected_objects = detected_objects
+        self.set_detected_objects(detected_objects)
 
     # Setters
     def set_date_detected(self, date: str):
         self._date_detected = date
 
     def set_detected_objects(self, detected_objects: List[str]):
-        self._detected_objects = detected_objects
+        self._detected_objects = self._vocabulary.canonical(detected_objects)
+        self._label_bits = self._vocabulary.encode(self._detected_objects)
 
     # Getters
     def get_date_detected(self) -> str:
@@ -25,6 +38,9 @@ class DetectedObjects:
     def get_detected_objects(self) -> List[str]:
         return self._detected_objects
 
+    def get_label_bits(self) -> int:
+        return self._label_bits
+
     # JSON Serialization
     def to_json(self) -> Dict[str, any]:
         """
@@ -66,18 +82,17 @@ class DetectedObjects:
         :param other: Another DetectedObjects instance to compare against.
         :return: A string message indicating the differences.
         """
-        differences = []
+        new_bits = other._label_bits & ~self._label_bits
+        missing_bits = self._label_bits & ~other._label_bits
+        return self._describe_changes(self._vocabulary.decode(new_bits), self._vocabulary.decode(missing_bits))
 
-        set_self_objects = set(self._detected_objects)
-        set_other_objects = set(other._detected_objects)
-
-        missing_in_other = set_self_objects - set_other_objects
-        new_in_other = set_other_objects - set_self_objects
-
-        if new_in_other:
-            differences.append(f"New objects: {sorted(new_in_other)}")
-        if missing_in_other:
-            differences.append(f"Objects no longer detected: {sorted(missing_in_other)}")
+    @staticmethod
+    def _describe_changes(new_objects: List[str], missing_objects: List[str]) -> str:
+        differences = []
+        if new_objects:
+            differences.append(f"New objects: {new_objects}")
+        if missing_objects:
+            differences.append(f"Objects no longer detected: {missing_objects}")
 
         if not differences:
             return "No object changes."
@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the persisted detection results in the bucket. The stack expires objects under it.
+DETECTIONS_PREFIX = "detections/"
+
+# Detection results are reused for at most this long, so model updates eventually show up.
+DETECTION_TTL_SECONDS = 30 * 24 * 60 * 60
+
+
+class DetectionCache:
+    """
+    Remembers object detection results by image content and detector parameters.
+
+    Results are kept in an in-memory LRU of at most `max_entries` entries, backed by JSON objects
+    in S3 so that they survive across invocations. Entries older than `ttl_seconds` are ignored
+    and dropped.
+    """
+
+    def __init__(self, s3_client, bucket_name: str, max_entries: int = 1024,
+                 ttl_seconds: int = DETECTION_TTL_SECONDS):
+        """
+        Initialize the cache.
+
+        :param s3_client: A boto3 S3 client for the persisted results and content hashes.
+        :param bucket_name: The name of the S3 bucket holding the images and the results.
+        :param max_entries: Maximum number of results kept in memory.
+        :param ttl_seconds: Maximum age of a result before it is detected again.
+        """
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def build_key(self, s3_bucket_name: str, s3_key: str, **parameters) -> Optional[str]:
+        """
+        Build the cache key of an image from its content hash and the detector parameters.
+
+        The content hash is the object's ETag, which is the MD5 of the content for single-part uploads.
+        Multipart ETags also identify the content for a given part size.
+
+        :param s3_bucket_name: The name of the S3 bucket holding the image.
+        :param s3_key: The key of the image in the S3 bucket.
+        :param parameters: Detector parameters the result depends on, e.g. MaxLabels and MinConfidence.
+        :return: The cache key, or None if the object cannot be inspected.
+        """
+        try:
+            etag = self.s3_client.head_object(Bucket=s3_bucket_name, Key=s3_key)["ETag"].strip('"')
+        except Exception:
+            return None
+        suffix = "_".join(f"{name}-{value}" for name, value in sorted(parameters.items()))
+        return f"{etag}_{suffix}"
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """
+        Look up the labels detected for a key, first in memory and then in S3.
+
+        :param key: Key built by build_key().
+        :return: The detected labels, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return list(entry[1])
+                del self._entries[key]
+                self._stats["expired"] += 1
+
+        try:
+            body = self.s3_client.get_object(Bucket=self.bucket_name, Key=self._object_key(key))["Body"].read()
+            data = json.loads(body)
+        except Exception:
+            self._count("misses")
+            return None
+
+        if now - data.get("cachedAt", 0) > self.ttl_seconds:
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        self._remember(key, data["cachedAt"], data["labels"])
+        self._count("store_hits")
+        return list(data["labels"])
+
+    def put(self, key: str, labels: List[str]):
+        """
+        Store the labels detected for a key in memory and in S3. Failing to persist is not an error.
+
+        :param key: Key built by build_key().
+        :param labels: The detected labels.
+        """
+        cached_at = time.time()
+        self._remember(key, cached_at, labels)
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self._object_key(key),
+                Body=json.dumps({"labels": labels, "cachedAt": cached_at}).encode(),
+                ContentType="application/json",
+            )
+        except Exception as e:
+            logger.warning(f"Error persisting detection result: {e}")
+
+    def _remember(self, key: str, cached_at: float, labels: List[str]):
+        with self._lock:
+            self._entries[key] = (cached_at, list(labels))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _object_key(key: str) -> str:
+        return f"{DETECTIONS_PREFIX}{key}.json"
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the cache counters and the hit rate over all lookups.
+
+        :return: Dictionary of counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["store_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from object_detection_service import ObjectDetectionService
+
+# Closes the collector queue.
+_CLOSE = object()
+
+
+class DetectionStage:
+    """
+    Collects detection requests from many markers and runs them in batches on a bounded pool.
+
+    A collector thread groups queued requests into batches of up to `batch_size` images, waiting at
+    most `max_wait` seconds for a batch to fill. At most `max_workers` batches run at once, so a
+    remote backend with a batch size of one gets bounded concurrency and a local backend gets true
+    batches. Every request gets its own Future, so results map back to the submitter.
+    """
+
+    def __init__(self, detection_service: ObjectDetectionService, batch_size: int = None, max_workers: int = 4,
+                 max_wait: float = 0.05):
+        """
+        Initialize the stage and start its collector thread.
+
+        :param detection_service: ObjectDetectionService running the batches.
+        :param batch_size: Maximum images per batch. Defaults to the detector's preferred batch size.
+        :param max_workers: Maximum number of batches running at once.
+        :param max_wait: Maximum seconds a request waits for its batch to fill.
+        """
+        self.detection_service = detection_service
+        self.batch_size = batch_size or detection_service.get_batch_size()
+        self.max_workers = max_workers
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="detect")
+        self._slots = threading.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._batch_seconds: List[float] = []
+        self._stats = {"batches": 0, "images": 0, "queue_seconds": 0.0}
+        self._collector = threading.Thread(target=self._collect, name="detect-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, s3_bucket_name: str, s3_key: str) -> Future:
+        """
+        Queue the detection of an image.
+
+        :param s3_bucket_name: The name of the S3 bucket.
+        :param s3_key: The key of the image in the S3 bucket.
+        :return: A Future resolving to the DetectedObjects of the image.
+        """
+        future = Future()
+        self._queue.put((s3_bucket_name, s3_key, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        closing = False
+        while not closing:
+            request = self._queue.get()
+            if request is _CLOSE:
+                break
+            batch = [request]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.batch_size:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if request is _CLOSE:
+                    closing = True
+                    break
+                batch.append(request)
+            # Wait for a free worker here, so that requests keep filling the next batch meanwhile.
+            self._slots.acquire()
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: list):
+        started = time.perf_counter()
+        try:
+            results = self.detection_service.detect_objects([(bucket, key) for bucket, key, _, _ in batch])
+        except Exception as e:
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for (_, _, future, _), result in zip(batch, results):
+                future.set_result(result)
+        finally:
+            self._slots.release()
+
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["images"] += len(batch)
+            self._stats["queue_seconds"] += sum(started - queued for _, _, _, queued in batch)
+            self._batch_seconds.append(seconds)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the number of batches and images, the mean batch size and the batch and queueing times in seconds.
+
+        :return: Dictionary of counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            timings = sorted(self._batch_seconds)
+        stats["mean_batch_size"] = stats["images"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_queue_seconds"] = stats["queue_seconds"] / stats["images"] if stats["images"] else 0.0
+        stats["p50_batch_seconds"] = timings[len(timings) // 2] if timings else 0.0
+        stats["max_batch_seconds"] = timings[-1] if timings else 0.0
+        stats["total_batch_seconds"] = sum(timings)
+        return stats
+
+    def close(self):
+        """
+        Run the queued requests and stop the collector and the workers.
+        """
+        self._queue.put(_CLOSE)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,198 @@
+import hashlib
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import boto3
+import numpy as np
+
+import raster
+
+BACKEND_REKOGNITION = "rekognition"
+BACKEND_ONNX = "onnx"
+
+# An image to run detection on, as (s3_bucket_name, s3_key).
+ImageLocation = Tuple[str, str]
+
+
+class Detector:
+    """
+    Interface of the object detection backends used by ObjectDetectionService.
+
+    `batch_size` is the number of images the backend prefers per detect_batch() call. Remote
+    backends process one image per call and scale by running calls concurrently.
+    """
+    name = ""
+    batch_size = 1
+
+    def detect_labels(self, s3_bucket_name: str, s3_key: str) -> List[str]:
+        """
+        Detect the labels of an image stored in S3.
+
+        :param s3_bucket_name: The name of the S3 bucket.
+        :param s3_key: The key of the image in the S3 bucket.
+        :return: Label names, most confident first.
+        """
+        raise NotImplementedError
+
+    def detect_batch(self, images: Sequence[ImageLocation]) -> List[List[str]]:
+        """
+        Detect the labels of several images. Backends that can run true batches override this.
+
+        :param images: The images as (s3_bucket_name, s3_key) pairs.
+        :return: One list of label names per image, in the same order.
+        """
+        return [self.detect_labels(s3_bucket_name, s3_key) for s3_bucket_name, s3_key in images]
+
+    def get_parameters(self) -> Dict[str, object]:
+        """
+        Return the parameters the labels depend on, e.g. to key cached results.
+
+        :return: Dictionary of parameter names and values.
+        """
+        raise NotImplementedError
+
+
+class RekognitionDetector(Detector):
+    """
+    Detects labels with Amazon Rekognition DetectLabels, which reads the image from S3 itself.
+    """
+    name = BACKEND_REKOGNITION
+
+    def __init__(self, rekognition_client=None, max_labels: int = 10, min_confidence: int = 50,
+                 endpoint_url: Optional[str] = None):
+        """
+        Initialize the detector.
+
+        :param rekognition_client: Optional Rekognition client for dependency injection.
+        :param max_labels: Maximum number of labels returned per image.
+        :param min_confidence: Minimum confidence of the returned labels, in percent.
+        :param endpoint_url: Optional endpoint of a Rekognition compatible service, e.g. a local stub.
+        """
+        self.reko = rekognition_client or boto3.client("rekognition", endpoint_url=endpoint_url)
+        self.max_labels = max_labels
+        self.min_confidence = min_confidence
+
+    def detect_labels(self, s3_bucket_name: str, s3_key: str) -> List[str]:
+        response = self.reko.detect_labels(
+            Image={"S3Object": {"Bucket": s3_bucket_name, "Name": s3_key}},
+            MaxLabels=self.max_labels, MinConfidence=self.min_confidence
+        )
+        return [label["Name"] for label in response.get("Labels", [])]
+
+    def get_parameters(self) -> Dict[str, object]:
+        # Kept identical to the keys cached before backends were introduced.
+        return {"MaxLabels": self.max_labels, "MinConfidence": self.min_confidence}
+
+
+class OnnxDetector(Detector):
+    """
+    Detects labels on the CPU with an image classification model run by ONNX Runtime.
+
+    The model takes a float32 NCHW batch of `input_size` x `input_size` RGB images normalized with
+    the ImageNet mean and standard deviation, and returns one score per label. Labels scoring at
+    least `min_confidence` percent after the activation are returned, at most `max_labels` of them.
+    Images are downloaded from S3 and run in batches of up to `batch_size`.
+    """
+    name = BACKEND_ONNX
+
+    MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+    def __init__(self, model_path: str, labels: List[str], s3_client=None, max_labels: int = 10,
+                 min_confidence: int = 50, input_size: int = 224, batch_size: int = 16,
+                 activation: str = "softmax"):
+        """
+        Initialize the detector and load the model.
+
+        :param model_path: Path of the .onnx model file.
+        :param labels: Label name of every model output, in output order.
+        :param s3_client: Optional boto3 S3 client used to download the images.
+        :param max_labels: Maximum number of labels returned per image.
+        :param min_confidence: Minimum confidence of the returned labels, in percent.
+        :param input_size: Width and height of the model input.
+        :param batch_size: Maximum number of images per inference call.
+        :param activation: "softmax" for single-label models or "sigmoid" for multi-label models.
+        :raises RuntimeError: If ONNX Runtime is not installed.
+        """
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("The onnx detector backend requires the onnxruntime package.")
+
+        self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.labels = labels
+        self.s3_client = s3_client or boto3.client("s3")
+        self.max_labels = max_labels
+        self.min_confidence = min_confidence
+        self.input_size = input_size
+        self.batch_size = batch_size
+        self.activation = activation
+        with open(model_path, "rb") as model_file:
+            self.model_hash = hashlib.sha256(model_file.read()).hexdigest()[:16]
+
+    def detect_labels(self, s3_bucket_name: str, s3_key: str) -> List[str]:
+        return self.detect_batch([(s3_bucket_name, s3_key)])[0]
+
+    def detect_batch(self, images: Sequence[ImageLocation]) -> List[List[str]]:
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            batch = np.stack([self._load_tensor(*image) for image in images[start:start + self.batch_size]])
+            scores = self.session.run(None, {self.input_name: batch})[0]
+            results.extend(self._to_labels(scores))
+        return results
+
+    def get_parameters(self) -> Dict[str, object]:
+        return {"Model": self.model_hash, "MaxLabels": self.max_labels, "MinConfidence": self.min_confidence}
+
+    def _load_tensor(self, s3_bucket_name: str, s3_key: str) -> np.ndarray:
+        """
+        Download an image and turn it into a normalized CHW float32 tensor of the model input size.
+        """
+        image_data = self.s3_client.get_object(Bucket=s3_bucket_name, Key=s3_key)["Body"].read()
+        pixels = raster.decode_png(image_data)[..., :3]
+        rows = np.arange(self.input_size) * pixels.shape[0] // self.input_size
+        cols = np.arange(self.input_size) * pixels.shape[1] // self.input_size
+        resized = pixels[rows[:, None], cols].astype(np.float32) / 255
+        return ((resized - self.MEAN) / self.STD).transpose(2, 0, 1)
+
+    def _to_labels(self, scores: np.ndarray) -> List[List[str]]:
+        """
+        Turn a batch of raw model scores into label names.
+        """
+        if self.activation == "sigmoid":
+            confidences = 1 / (1 + np.exp(-scores))
+        else:
+            exponents = np.exp(scores - scores.max(axis=1, keepdims=True))
+            confidences = exponents / exponents.sum(axis=1, keepdims=True)
+        top = np.argsort(-confidences, axis=1)[:, :self.max_labels]
+        return [
+            [self.labels[index] for index in row if confidences[i, index] * 100 >= self.min_confidence]
+            for i, row in enumerate(top)
+        ]
+
+
+def create_detector(backend: str = None, s3_client=None, max_labels: int = 10, min_confidence: int = 50) -> Detector:
+    """
+    Create the detector backend selected by the DETECTOR_BACKEND environment variable.
+
+    The Rekognition backend honors REKOGNITION_ENDPOINT_URL. The ONNX backend reads the model from
+    ONNX_MODEL_PATH and the label names, one per line, from ONNX_LABELS_PATH.
+
+    :param backend: BACKEND_REKOGNITION or BACKEND_ONNX, overriding the environment variable.
+    :param s3_client: Optional boto3 S3 client used by backends that download the images.
+    :param max_labels: Maximum number of labels returned per image.
+    :param min_confidence: Minimum confidence of the returned labels, in percent.
+    :return: The Detector.
+    :raises ValueError: If the backend is unknown.
+    """
+    backend = backend or os.environ.get("DETECTOR_BACKEND", BACKEND_REKOGNITION)
+    if backend == BACKEND_REKOGNITION:
+        return RekognitionDetector(max_labels=max_labels, min_confidence=min_confidence,
+                                   endpoint_url=os.environ.get("REKOGNITION_ENDPOINT_URL"))
+    if backend == BACKEND_ONNX:
+        with open(os.environ["ONNX_LABELS_PATH"]) as labels_file:
+            labels = [line.strip() for line in labels_file if line.strip()]
+        return OnnxDetector(os.environ["ONNX_MODEL_PATH"], labels, s3_client=s3_client,
+                            max_labels=max_labels, min_confidence=min_confidence)
+    raise ValueError(f"Unknown detector backend: {backend}")
@@ -1,7 +1,9 @@
 import json
+from typing import Dict, Optional
 
 class Image:
-    def __init__(self, description: str, image_url: str, s3_key: str, s3_bucket_name: str):
+    def __init__(self, description: str, image_url: str, s3_key: str, s3_bucket_name: str,
+                 variants: Dict[str, str] = None, perceptual_hash: Optional[str] = None):
         """
         Constructor for the Image class.
         
@@ -9,11 +11,15 @@ class Image:
         :param image_url: URL of the image.
         :param s3_key: S3 key for the image in the bucket.
         :param s3_bucket_name: S3 bucket name where the image is stored.
+        :param variants: URLs of the image at several sizes, keyed by the width in pixels as a string.
+        :param perceptual_hash: Difference hash of the pixels as a hexadecimal string, if computed.
         """
         self._description = description
         self._image_url = image_url
         self._s3_key = s3_key
         self._s3_bucket_name = s3_bucket_name
+        self._variants = variants or {}
+        self._perceptual_hash = perceptual_hash
 
     # Setters
     def set_description(self, description: str):
@@ -28,6 +34,12 @@ class Image:
     def set_s3_bucket_name(self, name: str):
         self._s3_bucket_name = name
 
+    def set_variants(self, variants: Dict[str, str]):
+        self._variants = variants
+
+    def set_perceptual_hash(self, perceptual_hash: str):
+        self._perceptual_hash = perceptual_hash
+
     # Getters
     def get_description(self) -> str:
         return self._description
@@ -41,6 +53,32 @@ class Image:
     def get_s3_bucket_name(self) -> str:
         return self._s3_bucket_name
 
+    def get_variants(self) -> Dict[str, str]:
+        return self._variants
+
+    def get_perceptual_hash(self) -> Optional[str]:
+        return self._perceptual_hash
+
+    def get_variant_url(self, min_size: int) -> str:
+        """
+        Returns the URL of the smallest variant at least `min_size` pixels wide.
+
+        :param min_size: Minimum width in pixels the variant is displayed at.
+        :return: The variant URL, or the image URL if no variant is large enough.
+        """
+        adequate = [int(size) for size in self._variants if int(size) >= min_size]
+        if not adequate:
+            return self._image_url
+        return self._variants[str(min(adequate))]
+
+    def select_variant(self, min_size: int):
+        """
+        Points the image URL at the smallest adequate variant, e.g. before handing the image to the frontend.
+
+        :param min_size: Minimum width in pixels the image is displayed at.
+        """
+        self._image_url = self.get_variant_url(min_size)
+
     # JSON Serialization
     def to_json(self) -> dict:
         """
@@ -52,7 +90,9 @@ class Image:
             "description": self._description,
             "imageURL": self._image_url,
             "s3_key": self._s3_key,
-            "s3_bucket_name": self._s3_bucket_name
+            "s3_bucket_name": self._s3_bucket_name,
+            "variants": self._variants,
+            "perceptualHash": self._perceptual_hash
         }
 
     @classmethod
@@ -67,7 +107,9 @@ class Image:
             description=data.get("description", ""),
             image_url=data.get("imageURL", ""),
             s3_key=data.get("s3_key", ""),
-            s3_bucket_name=data.get("s3_bucket_name", "")
+            s3_bucket_name=data.get("s3_bucket_name", ""),
+            variants=data.get("variants", {}),
+            perceptual_hash=data.get("perceptualHash")
         )
 
     def __repr__(self) -> str:
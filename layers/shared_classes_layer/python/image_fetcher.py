@@ -1,20 +1,386 @@
+import hashlib
 import http.client
 import json
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from base64 import b64encode
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import raster
+from rate_limiter import RateLimiter, RetryPolicy, RETRYABLE_STATUSES, THROTTLE_STATUSES
+
+SENTINEL_HUB_HOST = "services.sentinel-hub.com"
+
+# Output sample types for raw (TIFF) renders. The default PNG output is display-ready RGB.
+SAMPLE_TYPE_UINT8 = "UINT8"
+SAMPLE_TYPE_FLOAT32 = "FLOAT32"
+
+# Display bands of the default renders, in output (R, G, B) order.
+RGB_BANDS = ["B04", "B03", "B02"]
+# RGB plus the near infrared and shortwave infrared bands needed for spectral indices. The first
+# three bands stay R, G, B, so a multiband render also gives the display image.
+SPECTRAL_BANDS = RGB_BANDS + ["B08", "B11"]
+
+# Network errors worth retrying with backoff once the pool's own stale-connection retry has failed.
+_RETRYABLE_ERRORS = (OSError, http.client.HTTPException)
+
+# Errors raised when a kept-alive socket was closed by the server between requests.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class SentinelHubError(Exception):
+    """
+    Raised when Sentinel Hub answers with a non-success status after all retries.
+    """
+
+    def __init__(self, message: str, status: int = None):
+        """
+        Constructor for the SentinelHubError class.
+
+        :param message: Error message.
+        :param status: HTTP status code of the last response.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class PooledResponse:
+    """
+    A fully read HTTP response returned by the ConnectionPool.
+    """
+
+    def __init__(self, status: int, reason: str, headers: List[Tuple[str, str]], body: bytes):
+        """
+        Constructor for the PooledResponse class.
+
+        :param status: HTTP status code.
+        :param reason: HTTP reason phrase.
+        :param headers: Response headers as (name, value) pairs.
+        :param body: Response body as bytes.
+        """
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def getheader(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Return the value of a response header, matched case-insensitively.
+
+        :param name: Header name.
+        :param default: Value returned when the header is absent.
+        :return: Header value or the default.
+        """
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def read(self) -> bytes:
+        return self.body
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of keep-alive HTTP(S) connections to a single host.
+
+    Connections are reused across requests, so only the first request on each connection pays
+    for the TCP and TLS handshake. A request sent on a reused connection that the server has
+    already closed is transparently retried once on a fresh connection.
+    """
+
+    def __init__(self, host: str, port: int = None, use_https: bool = True, max_size: int = 8,
+                 timeout: float = 60, ssl_context=None):
+        """
+        Initialize the pool.
+
+        :param host: Host name to connect to.
+        :param port: Optional port, defaults to the scheme default.
+        :param use_https: Use HTTPS when True, plain HTTP otherwise (e.g. for a local stand-in server).
+        :param max_size: Maximum number of idle connections kept open.
+        :param timeout: Socket timeout in seconds.
+        :param ssl_context: Optional ssl.SSLContext for HTTPS connections.
+        """
+        self.host = host
+        self.port = port
+        self.use_https = use_https
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stats = {
+            "connections_created": 0,
+            "requests": 0,
+            "reused": 0,
+            "reconnects": 0,
+            "discarded": 0,
+        }
+
+    def _increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        """
+        Open a new connection. The handshake happens on the first request sent over it.
+        """
+        self._increment("connections_created")
+        if self.use_https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _checkout(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Take an idle connection from the pool, or open a new one.
+
+        :return: The connection and whether it was reused.
+        """
+        with self._lock:
+            if self._idle:
+                self._stats["reused"] += 1
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _checkin(self, conn: http.client.HTTPConnection):
+        """
+        Return a connection to the pool, closing it if the pool is full.
+        """
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
+            self._stats["discarded"] += 1
+        conn.close()
+
+    def _send(self, method: str, path: str, body, headers: Dict[str, str]) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """
+        Send a request over a pooled connection and return the connection with the unread response.
+        """
+        while True:
+            conn, reused = self._checkout()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                return conn, conn.getresponse()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive socket; retry on a fresh connection.
+                self._increment("reconnects")
+            except Exception:
+                conn.close()
+                raise
+
+    def _release(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+        """
+        Return a connection to the pool once its response has been fully read, otherwise close it.
+        """
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self._checkin(conn)
+
+    def request(self, method: str, path: str, body=None, headers: Dict[str, str] = None) -> PooledResponse:
+        """
+        Send a request over a pooled connection and read the full response.
+
+        :param method: HTTP method.
+        :param path: Request path.
+        :param body: Optional request body.
+        :param headers: Optional request headers.
+        :return: A PooledResponse.
+        """
+        self._increment("requests")
+        conn, response = self._send(method, path, body, headers)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn, response)
+        return PooledResponse(response.status, response.reason, response.getheaders(), data)
+
+    @contextmanager
+    def stream(self, method: str, path: str, body=None, headers: Dict[str, str] = None):
+        """
+        Send a request over a pooled connection and yield the unread response so its body can be consumed in chunks.
+
+        The connection goes back to the pool only if the body was read to the end, even if the caller raised.
+
+        :param method: HTTP method.
+        :param path: Request path.
+        :param body: Optional request body.
+        :param headers: Optional request headers.
+        :return: Context manager yielding an http.client.HTTPResponse.
+        """
+        self._increment("requests")
+        conn, response = self._send(method, path, body, headers)
+        try:
+            yield response
+        finally:
+            self._release(conn, response)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return a snapshot of the pool counters. `connections_created` equals the number of handshakes.
+
+        :return: Dictionary of counters, including the current number of idle connections.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        return stats
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+# Pools live at module level so warm Lambda invocations reuse open connections.
+_pools: Dict[Tuple[str, Optional[int], bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(host: str = SENTINEL_HUB_HOST, port: int = None, use_https: bool = True) -> ConnectionPool:
+    """
+    Return the shared connection pool for a host, creating it on first use.
+
+    :param host: Host name.
+    :param port: Optional port.
+    :param use_https: Whether to use HTTPS.
+    :return: The shared ConnectionPool.
+    """
+    key = (host, port, use_https)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(host, port=port, use_https=use_https)
+            _pools[key] = pool
+        return pool
+
+
+class TokenCache:
+    """
+    A thread-safe cache of OAuth access tokens that tracks their expiry.
+
+    Tokens are refreshed proactively once they are within `refresh_margin` seconds of expiring.
+    Only one thread fetches a token per key at a time; concurrent callers wait for it and reuse
+    the result instead of stampeding the token endpoint.
+    """
+
+    def __init__(self, refresh_margin: float = 60):
+        """
+        Initialize the cache.
+
+        :param refresh_margin: Seconds before expiry at which a token is considered stale.
+        """
+        self.refresh_margin = refresh_margin
+        self._entries: Dict[tuple, Tuple[str, float]] = {}
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "refreshes": 0, "invalidations": 0}
+
+    def _valid_token(self, key: tuple) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry and time.monotonic() < entry[1] - self.refresh_margin:
+            return entry[0]
+        return None
+
+    def get(self, key: tuple, fetch) -> str:
+        """
+        Return a valid token for the key, fetching a new one when missing or about to expire.
+
+        :param key: Cache key identifying the credentials.
+        :param fetch: Callable returning a (token, expires_in seconds) tuple.
+        :return: Access token as a string.
+        """
+        with self._lock:
+            token = self._valid_token(key)
+            if token:
+                self._stats["hits"] += 1
+                return token
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have refreshed the token while we waited.
+            with self._lock:
+                token = self._valid_token(key)
+                if token:
+                    self._stats["hits"] += 1
+                    return token
+            token, expires_in = fetch()
+            with self._lock:
+                self._entries[key] = (token, time.monotonic() + expires_in)
+                self._stats["refreshes"] += 1
+            return token
+
+    def invalidate(self, key: tuple, token: str = None):
+        """
+        Drop the cached token for a key, e.g. after the API rejected it with a 401.
+
+        :param key: Cache key identifying the credentials.
+        :param token: If given, only drop the entry when it still holds this token, so a token
+                      another thread just refreshed is kept.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (token is None or entry[0] == token):
+                del self._entries[key]
+                self._stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return a snapshot of the cache counters.
+
+        :return: Dictionary of counters.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+
+# Shared across ImageFetcher instances so warm Lambda invocations reuse still-valid tokens.
+_token_cache = TokenCache()
+
+# Shared by all fetches so concurrent workers back off together when Sentinel Hub throttles.
+_rate_limiter = RateLimiter()
+
 
 class ImageFetcher:
     """
     A lightweight class to fetch satellite images from Sentinel Hub using http.client.
     """
 
-    def __init__(self, client_id: str, client_secret: str, buffer: float = 0.005):
+    def __init__(self, client_id: str, client_secret: str, buffer: float = 0.005,
+                 host: str = SENTINEL_HUB_HOST, port: int = None, use_https: bool = True,
+                 pool: ConnectionPool = None, rate_limiter: RateLimiter = None, retry_policy: RetryPolicy = None):
         """
         Initialize the fetcher with Sentinel Hub credentials and optional buffer size.
         :param client_id: Sentinel Hub Client ID.
         :param client_secret: Sentinel Hub Client Secret.
         :param buffer: Buffer distance in degrees to create the bounding box.
+        :param host: Sentinel Hub host, overridable to point at a local stand-in server.
+        :param port: Optional port for the host.
+        :param use_https: Whether to connect over HTTPS.
+        :param pool: Optional ConnectionPool for dependency injection. Defaults to the shared pool for the host.
+        :param rate_limiter: Optional RateLimiter for dependency injection. Defaults to the shared limiter.
+        :param retry_policy: Optional RetryPolicy for throttled or failed requests.
         """
         if not client_id or not client_secret:
             raise ValueError("Client ID and Client Secret are required.")
@@ -22,15 +388,31 @@ class ImageFetcher:
         self.client_id = client_id
         self.client_secret = client_secret
         self.buffer = buffer
-        self.token = self._get_access_token()
+        self.pool = pool or get_connection_pool(host, port, use_https)
+        self._token_key = (self.pool.host, self.pool.port, client_id)
+        self.rate_limiter = rate_limiter or _rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
         self.aoi = None  # Area of Interest
 
+    @property
+    def token(self) -> str:
+        """
+        The current access token, served from the shared token cache.
+        """
+        return self._get_access_token()
+
     def _get_access_token(self) -> str:
         """
-        Obtain an access token from Sentinel Hub using http.client.
+        Return a valid access token, requesting a new one only when the cached token is missing or expiring.
         :return: Access token as a string.
         """
-        conn = http.client.HTTPSConnection("services.sentinel-hub.com")
+        return _token_cache.get(self._token_key, self._request_access_token)
+
+    def _request_access_token(self) -> Tuple[str, float]:
+        """
+        Obtain an access token from Sentinel Hub using http.client.
+        :return: Access token and its lifetime in seconds.
+        """
         credentials = f"{self.client_id}:{self.client_secret}"
         headers = {
             "Authorization": f"Basic {b64encode(credentials.encode()).decode()}",
@@ -38,18 +420,128 @@ class ImageFetcher:
         }
         payload = "grant_type=client_credentials"
         
-        conn.request("POST", "/oauth/token", body=payload, headers=headers)
-        response = conn.getresponse()
+        response = self.pool.request("POST", "/oauth/token", body=payload, headers=headers)
         if response.status != 200:
             raise Exception(f"Failed to fetch access token: {response.status} {response.reason}")
         data = json.loads(response.read())
-        return data["access_token"]
+        return data["access_token"], float(data.get("expires_in", 3600))
 
-    def set_coordinates(self, lon: str, lat: str):
+    @staticmethod
+    def _json_headers(token: str) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+
+    def _authorized_request(self, method: str, path: str, payload: str) -> PooledResponse:
         """
-        Set the latitude and longitude of the center point for the Area of Interest (AOI).
+        Send a JSON request with a bearer token through the rate limiter.
+
+        On a 401 the token is refreshed once and the request retried. Throttling, transient server
+        errors and network errors are retried with backoff according to the retry policy.
+        :param method: HTTP method.
+        :param path: Request path.
+        :param payload: JSON request body.
+        :return: The last PooledResponse.
+        """
+        attempt = 0
+        refreshed = False
+        while True:
+            token = self._get_access_token()
+            try:
+                with self.rate_limiter.slot() as slot:
+                    response = self.pool.request(method, path, body=payload, headers=self._json_headers(token))
+                    if response.status in THROTTLE_STATUSES:
+                        slot.throttled()
+            except _RETRYABLE_ERRORS:
+                if attempt + 1 >= self.retry_policy.max_attempts:
+                    raise
+                delay = self.retry_policy.get_delay(attempt)
+            else:
+                if response.status == 401 and not refreshed:
+                    _token_cache.invalidate(self._token_key, token)
+                    refreshed = True
+                    continue
+                if response.status not in RETRYABLE_STATUSES or attempt + 1 >= self.retry_policy.max_attempts:
+                    return response
+                delay = self.retry_policy.get_delay(attempt, response.getheader("Retry-After"))
+            self.rate_limiter.record_retry()
+            time.sleep(delay)
+            attempt += 1
+
+    @contextmanager
+    def _authorized_stream(self, method: str, path: str, payload: str):
+        """
+        Streaming counterpart of _authorized_request(), yielding the unread http.client.HTTPResponse.
+        Only responses that are not retried are yielded; errors raised by the caller are never retried.
+
+        The rate limiter slot is released as soon as the status and headers are in. The token bucket
+        already paced the request, and the caller may take a while to consume the body, e.g. while
+        uploading it to S3, which must not keep other Sentinel Hub requests waiting.
+        """
+        attempt = 0
+        refreshed = False
+        while True:
+            token = self._get_access_token()
+            yielded = False
+            self.rate_limiter.acquire()
+            holding_slot = True
+            try:
+                with self.pool.stream(method, path, body=payload, headers=self._json_headers(token)) as response:
+                    self.rate_limiter.release(throttled=response.status in THROTTLE_STATUSES)
+                    holding_slot = False
+                    if response.status == 401 and not refreshed:
+                        response.read()
+                        _token_cache.invalidate(self._token_key, token)
+                        refreshed = True
+                        continue
+                    if response.status not in RETRYABLE_STATUSES or attempt + 1 >= self.retry_policy.max_attempts:
+                        yielded = True
+                        yield response
+                        return
+                    response.read()
+                    delay = self.retry_policy.get_delay(attempt, response.getheader("Retry-After"))
+            except _RETRYABLE_ERRORS:
+                if yielded or attempt + 1 >= self.retry_policy.max_attempts:
+                    raise
+                delay = self.retry_policy.get_delay(attempt)
+            finally:
+                if holding_slot:
+                    self.rate_limiter.release()
+            self.rate_limiter.record_retry()
+            time.sleep(delay)
+            attempt += 1
+
+    def get_rate_limit_stats(self) -> Dict[str, float]:
+        """
+        Return the rate limiter counters: requests, retries, throttled responses and the current concurrency window.
+
+        :return: Dictionary of rate limiter counters.
+        """
+        return self.rate_limiter.get_stats()
+
+    def get_token_stats(self) -> Dict[str, int]:
+        """
+        Return the shared token cache counters.
+
+        :return: Dictionary of token cache counters.
+        """
+        return _token_cache.get_stats()
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        """
+        Return the connection pool counters, e.g. to measure handshakes per observe run.
+
+        :return: Dictionary of pool counters.
+        """
+        return self.pool.get_stats()
+
+    def build_aoi(self, lon: str, lat: str) -> List[float]:
+        """
+        Build the Area of Interest (AOI) bounding box around a center point without storing it.
         :param lon: Longitude as a string (-180 to 180).
         :param lat: Latitude as a string (-90 to 90).
+        :return: Bounding box as [min_lon, min_lat, max_lon, max_lat].
         :raises ValueError: If the input strings cannot be converted to floats or are out of bounds.
         """
         try:
@@ -65,25 +557,41 @@ class ImageFetcher:
         min_lat = lat - self.buffer
         max_lon = lon + self.buffer
         max_lat = lat + self.buffer
-        self.aoi = [min_lon, min_lat, max_lon, max_lat]
+        return [min_lon, min_lat, max_lon, max_lat]
 
-    def get_images_by_date(self, start_date: str, end_date: str) -> bytes:
+    def set_coordinates(self, lon: str, lat: str):
         """
-        Fetch images from a specific date range.
-        
+        Set the latitude and longitude of the center point for the Area of Interest (AOI).
+        :param lon: Longitude as a string (-180 to 180).
+        :param lat: Latitude as a string (-90 to 90).
+        :raises ValueError: If the input strings cannot be converted to floats or are out of bounds.
+        """
+        self.aoi = self.build_aoi(lon, lat)
+
+    def build_process_request(self, start_date: str, end_date: str, aoi: List[float] = None,
+                              width: int = 512, height: int = 512, sample_type: str = None,
+                              bands: List[str] = None) -> dict:
+        """
+        Build the Process API request body for a date range.
+
         :param start_date: Start date in "YYYY-MM-DD" format.
         :param end_date: End date in "YYYY-MM-DD" format.
-        :return: Image data as bytes.
+        :param aoi: Optional bounding box. Defaults to the AOI from set_coordinates().
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :param sample_type: None for a display-ready PNG, or SAMPLE_TYPE_UINT8 / SAMPLE_TYPE_FLOAT32 for
+                            an uncompressed TIFF with raw samples (display-scaled for UINT8, reflectance for FLOAT32).
+        :param bands: Bands of a raw render, in output order. Defaults to RGB_BANDS. Other bands require
+                      a sample type, e.g. SPECTRAL_BANDS with SAMPLE_TYPE_FLOAT32.
+        :return: The request body as a dictionary.
+        :raises ValueError: If no coordinates are set, or bands are requested for a PNG render.
         """
-        if not self.aoi:
+        aoi = aoi or self.aoi
+        if not aoi:
             raise ValueError("Coordinates not set. Use set_coordinates() first.")
+        if bands and not sample_type:
+            raise ValueError("Bands other than RGB require a raw sample type.")
 
-        conn = http.client.HTTPSConnection("services.sentinel-hub.com")
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json",
-        }
-        
         evalscript = """
         //VERSION=3
         function setup() {
@@ -97,10 +605,28 @@ class ImageFetcher:
             return [2.5 * sample.B04, 2.5 * sample.B03, 2.5 * sample.B02];
         }
         """
-        payload = json.dumps({
+        output_format = "image/png"
+        if sample_type:
+            bands = bands or RGB_BANDS
+            scale = "255 * 2.5 * " if sample_type == SAMPLE_TYPE_UINT8 else ""
+            evalscript = f"""
+        //VERSION=3
+        function setup() {{
+            return {{
+                input: {json.dumps(sorted(bands))},
+                output: {{ bands: {len(bands)}, sampleType: "{sample_type}" }}
+            }};
+        }}
+
+        function evaluatePixel(sample) {{
+            return [{", ".join(scale + "sample." + band for band in bands)}];
+        }}
+        """
+            output_format = "image/tiff"
+        return {
             "input": {
                 "bounds": {
-                    "bbox": self.aoi
+                    "bbox": aoi
                 },
                 "data": [
                     {
@@ -115,31 +641,219 @@ class ImageFetcher:
                 ]
             },
             "output": {
-                "width": 512,
-                "height": 512,
+                "width": width,
+                "height": height,
                 "responses": [
-                    {"identifier": "default", "format": {"type": "image/png"}}
+                    {"identifier": "default", "format": {"type": output_format}}
                 ]
             },
             "evalscript": evalscript.strip()
-        })
+        }
+
+    @staticmethod
+    def request_hash(request: dict) -> str:
+        """
+        Hash a Process API request body. Identical bbox, time range, evalscript, output and collection
+        give an identical hash, so the hash can address the rendered image.
+
+        :param request: The request body from build_process_request().
+        :return: Hex encoded SHA-256 digest.
+        """
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get_images_by_date(self, start_date: str, end_date: str, aoi: List[float] = None,
+                           width: int = 512, height: int = 512) -> bytes:
+        """
+        Fetch images from a specific date range.
         
-        conn.request("POST", "/api/v1/process", body=payload, headers=headers)
-        response = conn.getresponse()
+        :param start_date: Start date in "YYYY-MM-DD" format.
+        :param end_date: End date in "YYYY-MM-DD" format.
+        :param aoi: Optional bounding box. Defaults to the AOI from set_coordinates(). Passing it
+                    explicitly makes the call independent of fetcher state, so it is safe to run concurrently.
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :return: Image data as bytes.
+        """
+        payload = json.dumps(self.build_process_request(start_date, end_date, aoi, width, height))
+        
+        response = self._authorized_request("POST", "/api/v1/process", payload)
         if response.status != 200:
-            raise Exception(f"Failed to fetch image: {response.status} {response.reason}")
+            raise SentinelHubError(f"Failed to fetch image: {response.status} {response.reason}", response.status)
         
         return response.read()
 
+    def get_latest_acquisition(self, start_date: str, end_date: str, aoi: List[float] = None) -> Optional[str]:
+        """
+        Query the Catalog API for the most recent Sentinel-2 acquisition intersecting the AOI.
+
+        This is a cheap metadata search. It lets callers skip a render when nothing was acquired
+        since the last observation.
+
+        :param start_date: Start date in "YYYY-MM-DD" format.
+        :param end_date: End date in "YYYY-MM-DD" format.
+        :param aoi: Optional bounding box. Defaults to the AOI from set_coordinates().
+        :return: ISO 8601 timestamp of the latest acquisition, or None if there is none in the range.
+        """
+        aoi = aoi or self.aoi
+        if not aoi:
+            raise ValueError("Coordinates not set. Use set_coordinates() first.")
+
+        request = {
+            "bbox": aoi,
+            "datetime": f"{start_date}T00:00:00Z/{end_date}T23:59:59Z",
+            "collections": ["sentinel-2-l1c"],
+            "limit": 100,
+            "fields": {"include": ["properties.datetime"], "exclude": ["assets", "links", "geometry"]},
+        }
+        latest = None
+        while True:
+            response = self._authorized_request("POST", "/api/v1/catalog/1.0.0/search", json.dumps(request))
+            if response.status != 200:
+                raise SentinelHubError(f"Failed to search catalog: {response.status} {response.reason}", response.status)
+            data = json.loads(response.read())
+            for feature in data.get("features", []):
+                acquired = feature.get("properties", {}).get("datetime")
+                if acquired and (latest is None or acquired > latest):
+                    latest = acquired
+            next_page = data.get("context", {}).get("next")
+            if next_page is None:
+                return latest
+            request["next"] = next_page
+
+    @contextmanager
+    def stream_images_by_date(self, start_date: str, end_date: str, aoi: List[float] = None,
+                              width: int = 512, height: int = 512):
+        """
+        Fetch images from a specific date range without buffering the body in memory.
+
+        Usage: `with fetcher.stream_images_by_date(...) as body: body.read(chunk_size)`.
+
+        :param start_date: Start date in "YYYY-MM-DD" format.
+        :param end_date: End date in "YYYY-MM-DD" format.
+        :param aoi: Optional bounding box, see get_images_by_date().
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :return: Context manager yielding a file-like object over the PNG data.
+        """
+        payload = json.dumps(self.build_process_request(start_date, end_date, aoi, width, height))
+
+        with self._authorized_stream("POST", "/api/v1/process", payload) as response:
+            if response.status != 200:
+                response.read()
+                raise SentinelHubError(f"Failed to fetch image: {response.status} {response.reason}", response.status)
+            yield response
+
+    def stream_image_days_ago(self, days_ago: int, window_days: int = 30, aoi: List[float] = None,
+                              width: int = 512, height: int = 512):
+        """
+        Streaming counterpart of get_image_days_ago(), see stream_images_by_date().
+
+        :param days_ago: Number of days between today and the end of the window.
+        :param window_days: Length of the window in days.
+        :param aoi: Optional bounding box, see get_images_by_date().
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :return: Context manager yielding a file-like object over the PNG data.
+        """
+        start_date, end_date = self.date_range_days_ago(days_ago, window_days)
+        return self.stream_images_by_date(start_date, end_date, aoi=aoi, width=width, height=height)
+
+    def get_array_by_date(self, start_date: str, end_date: str, aoi: List[float] = None, width: int = 512,
+                          height: int = 512, sample_type: str = SAMPLE_TYPE_UINT8,
+                          bands: List[str] = None) -> np.ndarray:
+        """
+        Fetch raw samples for a date range as a NumPy array, skipping the PNG encode/decode round trip.
+
+        The array is a read-only view over the response body, so no extra copy is made.
+
+        :param start_date: Start date in "YYYY-MM-DD" format.
+        :param end_date: End date in "YYYY-MM-DD" format.
+        :param aoi: Optional bounding box, see get_images_by_date().
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :param sample_type: SAMPLE_TYPE_UINT8 or SAMPLE_TYPE_FLOAT32.
+        :param bands: Bands to fetch, in output order. Defaults to RGB_BANDS.
+        :return: Array of shape (height, width, bands), by default in R, G, B order.
+        """
+        payload = json.dumps(self.build_process_request(start_date, end_date, aoi, width, height, sample_type,
+                                                        bands))
+
+        response = self._authorized_request("POST", "/api/v1/process", payload)
+        if response.status != 200:
+            raise SentinelHubError(f"Failed to fetch image: {response.status} {response.reason}", response.status)
+
+        return raster.decode_tiff(response.read())
+
+    def get_array_days_ago(self, days_ago: int, window_days: int = 30, aoi: List[float] = None, width: int = 512,
+                           height: int = 512, sample_type: str = SAMPLE_TYPE_UINT8,
+                           bands: List[str] = None) -> np.ndarray:
+        """
+        Fetch raw samples for the window of `window_days` days ending `days_ago` days before today.
+
+        :param days_ago: Number of days between today and the end of the window.
+        :param window_days: Length of the window in days.
+        :param aoi: Optional bounding box, see get_images_by_date().
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :param sample_type: SAMPLE_TYPE_UINT8 or SAMPLE_TYPE_FLOAT32.
+        :param bands: Bands to fetch, in output order. Defaults to RGB_BANDS.
+        :return: Array of shape (height, width, bands), by default in R, G, B order.
+        """
+        start_date, end_date = self.date_range_days_ago(days_ago, window_days)
+        return self.get_array_by_date(start_date, end_date, aoi=aoi, width=width, height=height,
+                                      sample_type=sample_type, bands=bands)
+
+    @staticmethod
+    def date_range_days_ago(days_ago: int, window_days: int = 30) -> Tuple[str, str]:
+        """
+        Compute the window of `window_days` days ending `days_ago` days before today.
+
+        :param days_ago: Number of days between today and the end of the window.
+        :param window_days: Length of the window in days.
+        :return: Start and end dates in "YYYY-MM-DD" format.
+        """
+        end_date = datetime.utcnow() - timedelta(days=days_ago)
+        start_date = end_date - timedelta(days=window_days)
+        return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+
+    @staticmethod
+    def month_range_days_ago(days_ago: int) -> Tuple[str, str]:
+        """
+        Compute the calendar month containing the day `days_ago` days before today.
+
+        Unlike date_range_days_ago(), the window only moves at the turn of a month, so requests for it
+        stay identical for the whole month.
+
+        :param days_ago: Number of days between today and a day within the month.
+        :return: The first and last day of the month in "YYYY-MM-DD" format.
+        """
+        start_date = (datetime.utcnow() - timedelta(days=days_ago)).replace(day=1)
+        end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+
+    def get_image_days_ago(self, days_ago: int, window_days: int = 30, aoi: List[float] = None,
+                           width: int = 512, height: int = 512) -> bytes:
+        """
+        Fetch the mosaic for the window of `window_days` days ending `days_ago` days before today.
+
+        :param days_ago: Number of days between today and the end of the window.
+        :param window_days: Length of the window in days.
+        :param aoi: Optional bounding box, see get_images_by_date().
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :return: Image data as bytes.
+        """
+        start_date, end_date = self.date_range_days_ago(days_ago, window_days)
+        return self.get_images_by_date(start_date, end_date, aoi=aoi, width=width, height=height)
+
     def get_latest_image(self) -> bytes:
         """
         Fetch the latest available satellite image.
         
         :return: Image data as bytes.
         """
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
-        return self.get_images_by_date(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        return self.get_image_days_ago(0)
 
     def get_image_6_months_ago(self) -> bytes:
         """
@@ -147,9 +861,7 @@ class ImageFetcher:
         
         :return: Image data as bytes.
         """
-        end_date = datetime.utcnow() - timedelta(days=30 * 6)
-        start_date = end_date - timedelta(days=30)
-        return self.get_images_by_date(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        return self.get_image_days_ago(30 * 6)
 
     def get_image_1_year_ago(self) -> bytes:
         """
@@ -157,9 +869,7 @@ class ImageFetcher:
         
         :return: Image data as bytes.
         """
-        end_date = datetime.utcnow() - timedelta(days=365)
-        start_date = end_date - timedelta(days=30)
-        return self.get_images_by_date(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        return self.get_image_days_ago(365)
 
     def get_image_2_years_ago(self) -> bytes:
         """
@@ -167,9 +877,7 @@ class ImageFetcher:
         
         :return: Image data as bytes.
         """
-        end_date = datetime.utcnow() - timedelta(days=365 * 2)
-        start_date = end_date - timedelta(days=30)
-        return self.get_images_by_date(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        return self.get_image_days_ago(365 * 2)
 
     def get_image_5_years_ago(self) -> bytes:
         """
@@ -177,6 +885,4 @@ class ImageFetcher:
         
         :return: Image data as bytes.
         """
-        end_date = datetime.utcnow() - timedelta(days=365 * 5)
-        start_date = end_date - timedelta(days=30)
-        return self.get_images_by_date(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        return self.get_image_days_ago(365 * 5)
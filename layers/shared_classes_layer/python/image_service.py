@@ -1,25 +1,97 @@
-from image_fetcher import ImageFetcher
+from image_fetcher import ImageFetcher, SAMPLE_TYPE_UINT8
 from coordinate import Coordinate
 from image import Image
-from datetime import datetime
-from typing import List
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import perceptual_hash
+import raster
+from upload_stage import UploadResult, UploadStage, MAX_PENDING_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class Epoch(NamedTuple):
+    """
+    A time window to fetch imagery for.
+
+    The latest epoch is the `window_days` days up to today. Historical epochs are the calendar month
+    containing the day `days_ago` days before today, so their window, and with it the cache key of their
+    render, only changes at the turn of a month instead of every day.
+    """
+    description: str
+    days_ago: int
+    window_days: int = 30
+
+    @property
+    def is_immutable(self) -> bool:
+        """
+        Whether the rendered imagery can be cached. Windows that ended in the past never change.
+        """
+        return self.days_ago > 0
+
+
+class EpochResult(NamedTuple):
+    """
+    The outcome of fetching and uploading a single epoch. Exactly one of image and error is set.
+    """
+    epoch: Epoch
+    image: Optional[Image]
+    error: Optional[str]
+
+
+LATEST_EPOCH = Epoch("Latest available image", 0)
+
+# Widths of the downscaled copies stored next to every image, largest first. The frontend shows
+# images at 128 CSS pixels, so 256 covers high-density screens.
+VARIANT_SIZES = (256, 128)
+
+# S3 multipart parts must be at least 5 MiB, except for the last one.
+MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+HISTORICAL_EPOCHS = [
+    Epoch("Image from 6 months ago", 30 * 6),
+    Epoch("Image from 1 year ago", 365),
+    Epoch("Image from 2 years ago", 365 * 2),
+    Epoch("Image from 5 years ago", 365 * 5),
+]
+
 
 class ImageService:
     """
     A service class for fetching and uploading images, and creating image objects for further processing.
     """
 
-    def __init__(self, s3_client, bucket_name: str, image_fetcher: ImageFetcher = None):
+    def __init__(self, s3_client, bucket_name: str, image_fetcher: ImageFetcher = None, max_workers: int = 5,
+                 part_size: int = MULTIPART_PART_SIZE, upload_workers: int = 4,
+                 max_pending_upload_bytes: int = MAX_PENDING_BYTES):
         """
         Initialize the ImageService with dependencies.
 
         :param s3_client: A boto3 S3 client for uploading images.
         :param bucket_name: The name of the S3 bucket.
         :param image_fetcher: An instance of ImageFetcher to handle image fetching.
+        :param max_workers: Maximum number of epochs fetched concurrently by fetch_epochs().
+        :param part_size: Chunk size used when streaming images into S3, which bounds memory per image.
+        :param upload_workers: Maximum number of concurrent background uploads of in-memory images.
+        :param max_pending_upload_bytes: Maximum image bytes waiting for a background upload.
         """
         self.s3_client = s3_client
         self.bucket_name = bucket_name
         self.image_fetcher = image_fetcher or ImageFetcher('358ae742-66b9-4560-8834-2da11bc1dbb9', 'ycDjUjtUAI5qcSAPxCnyd7WlFynKdqcu')
+        self.max_workers = max_workers
+        self._cache_stats = {"hits": 0, "misses": 0}
+        self._cache_lock = threading.Lock()
+        self.part_size = part_size
+        self._stream_stats = {"images": 0, "bytes": 0, "multipart_uploads": 0,
+                              "peak_buffered_bytes": 0}
+        self._dedup_stats = {"uploads_skipped": 0, "bytes_skipped": 0}
+        self.upload_stage = UploadStage(self._upload_if_missing, upload_workers, max_pending_upload_bytes)
 
     def get_latest_image(self, coordinate: Coordinate) -> Image:
         """
@@ -27,74 +99,456 @@ class ImageService:
 
         :param coordinate: A Coordinate object representing the location.
         :return: An Image object containing the uploaded image metadata.
-        :raises ValueError: If the image fetching or uploading fails.
+        :raises RuntimeError: If the image fetching or uploading fails.
+        """
+        result = self.fetch_epochs(coordinate, [LATEST_EPOCH])[0]
+        if result.error:
+            raise RuntimeError(result.error)
+        return result.image
+
+    def get_historical_images(self, coordinate: Coordinate) -> List[Image]:
+        """
+        Fetch historical images for a coordinate, upload them to S3, and return a list of Image objects.
+
+        :param coordinate: A Coordinate object representing the location.
+        :return: A list of Image objects containing the uploaded image metadata.
+        :raises RuntimeError: If the image fetching or uploading fails.
+        """
+        results = self.fetch_epochs(coordinate, HISTORICAL_EPOCHS)
+        for result in results:
+            if result.error:
+                raise RuntimeError(result.error)
+        return [result.image for result in results]
+
+    def fetch_epochs(self, coordinate: Coordinate, epochs: List[Epoch], aoi: List[float] = None) -> List[EpochResult]:
+        """
+        Fetch the images for several epochs concurrently and upload each one as soon as it arrives.
+
+        Work is spread over a pool of at most `max_workers` threads, so the total latency is close to
+        that of the slowest single render rather than the sum of all of them.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epochs: The epochs to fetch.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :return: One EpochResult per epoch, in the same order as `epochs`.
+        :raises RuntimeError: If the coordinate is invalid.
         """
-        # Fetch the latest image
         try:
-            self.image_fetcher.set_coordinates(
+            aoi = aoi or self.image_fetcher.build_aoi(
                 coordinate.get_longitude(), coordinate.get_latitude()
             )
-            png_image = self.image_fetcher.get_latest_image()
+        except Exception as e:
+            raise RuntimeError(f"Error setting coordinates: {e}")
+
+        if not epochs:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(epochs))) as executor:
+            futures = [
+                executor.submit(self._fetch_and_upload_epoch, coordinate, aoi, epoch)
+                for epoch in epochs
+            ]
+            return [future.result() for future in futures]
+
+    def fetch_epoch_image(self, coordinate: Coordinate, epoch: Epoch, aoi: List[float] = None) -> bytes:
+        """
+        Fetch the image data for a single epoch without uploading it.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch to fetch.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :return: The image data as bytes.
+        :raises RuntimeError: If the image fetching fails.
+        """
+        try:
+            aoi = aoi or self.image_fetcher.build_aoi(
+                coordinate.get_longitude(), coordinate.get_latitude()
+            )
+            start_date, end_date = self._get_date_range(epoch)
+            png_image = self.image_fetcher.get_images_by_date(start_date, end_date, aoi=aoi)
             if not png_image:
-                raise ValueError("Failed to fetch image: No data returned.")
+                raise ValueError("No data returned.")
+            return png_image
         except Exception as e:
-            raise RuntimeError(f"Error fetching the latest image: {e}")
+            raise RuntimeError(f"Error fetching {epoch.description}: {e}")
+
+    def get_latest_acquisition(self, coordinate: Coordinate, epoch: Epoch = LATEST_EPOCH) -> Optional[str]:
+        """
+        Return the timestamp of the most recent scene acquired over a coordinate within an epoch window.
 
-        # Upload image to S3
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch window to search, defaults to the latest image window.
+        :return: ISO 8601 timestamp, or None if no scene was acquired in the window.
+        :raises RuntimeError: If the catalog search fails.
+        """
         try:
-            s3_key = f"images/{coordinate.get_latitude()}_{coordinate.get_longitude()}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.png"
-            image_url = self.upload_image_to_s3(png_image, s3_key)
+            aoi = self.image_fetcher.build_aoi(coordinate.get_longitude(), coordinate.get_latitude())
+            start_date, end_date = self._get_date_range(epoch)
+            return self.image_fetcher.get_latest_acquisition(start_date, end_date, aoi)
         except Exception as e:
-            raise RuntimeError(f"Error uploading image to S3: {e}")
+            raise RuntimeError(f"Error searching the catalog: {e}")
 
-        # Create an Image object
-        image = self.create_image(image_url, s3_key, "Latest available image")
+    def get_cached_epoch_image(self, coordinate: Coordinate, epoch: Epoch, aoi: List[float] = None) -> Optional[Image]:
+        """
+        Look up a previously rendered image for an immutable epoch in S3.
+
+        Cached objects are addressed by the hash of the Process API request, so a hit means the exact
+        same render was done before and the API call can be skipped.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch to look up.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :return: An Image object for the cached object, or None on a miss or for mutable epochs.
+        """
+        if not epoch.is_immutable:
+            return None
+
+        s3_key = self._build_cache_key(coordinate, epoch, aoi)
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+        except Exception:
+            self._count_cache("misses")
+            return None
+
+        self._count_cache("hits")
+        image = self.create_image(self.get_image_url(s3_key), s3_key, epoch.description)
+        image.set_variants(self._find_variants(s3_key))
         return image
 
-    def get_historical_images(self, coordinate: Coordinate) -> List[Image]:
+    def get_cache_stats(self) -> Dict[str, int]:
         """
-        Fetch historical images for a coordinate, upload them to S3, and return a list of Image objects.
+        Return the historical imagery cache counters. Every hit is one Process API request saved.
+
+        :return: Dictionary with hits and misses.
+        """
+        with self._cache_lock:
+            return dict(self._cache_stats)
+
+    def _count_cache(self, name: str):
+        with self._cache_lock:
+            self._cache_stats[name] += 1
+
+    def stream_epoch_to_s3(self, coordinate: Coordinate, epoch: Epoch, aoi: List[float] = None) -> Image:
+        """
+        Fetch an epoch and pipe the response body straight into S3, without holding the whole image in memory.
+
+        Only immutable epochs can be streamed, because their key is known before the first byte arrives.
+        Other epochs, i.e. the latest image, are stored under a key derived from their content and need
+        their pixels for the variants and change detection, so they are fetched as an array and uploaded
+        with store_epoch_array().
 
         :param coordinate: A Coordinate object representing the location.
-        :return: A list of Image objects containing the uploaded image metadata.
-        :raises ValueError: If the image fetching or uploading fails.
+        :param epoch: The epoch to fetch.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :return: An Image object containing the uploaded image metadata.
+        :raises RuntimeError: If fetching or uploading fails.
         """
-        images = []
+        if not epoch.is_immutable:
+            return self.store_epoch_array(coordinate, epoch, self.fetch_epoch_array(coordinate, epoch, aoi), aoi)
 
-        # Set the coordinates for the area of interest
         try:
-            self.image_fetcher.set_coordinates(
+            aoi = aoi or self.image_fetcher.build_aoi(
                 coordinate.get_longitude(), coordinate.get_latitude()
             )
+            s3_key = self._build_cache_key(coordinate, epoch, aoi)
+            start_date, end_date = self._get_date_range(epoch)
+            with self.image_fetcher.stream_images_by_date(start_date, end_date, aoi=aoi) as body:
+                image_url, image_data = self._upload_stream(body, s3_key)
         except Exception as e:
-            raise RuntimeError(f"Error setting coordinates: {e}")
+            raise RuntimeError(f"Error streaming {epoch.description} to S3: {e}")
+        image = self.create_image(image_url, s3_key, epoch.description)
+        if image_data is not None:
+            # The image fit into a single part, so it is in memory anyway.
+            variant_futures, image_hash = self._submit_derivatives(s3_key, image_data)
+            image.set_variants(self._wait_for_variants(variant_futures))
+            image.set_perceptual_hash(image_hash)
+        return image
 
-        # Define the historical image fetchers and their descriptions
-        historical_image_fetchers = [
-            (self.image_fetcher.get_image_6_months_ago, "Image from 6 months ago"),
-            (self.image_fetcher.get_image_1_year_ago, "Image from 1 year ago"),
-            (self.image_fetcher.get_image_2_years_ago, "Image from 2 years ago"),
-            (self.image_fetcher.get_image_5_years_ago, "Image from 5 years ago"),
-        ]
+    def fetch_epoch_array(self, coordinate: Coordinate, epoch: Epoch, aoi: List[float] = None,
+                          sample_type: str = SAMPLE_TYPE_UINT8, bands: List[str] = None) -> np.ndarray:
+        """
+        Fetch the raw samples of a single epoch as a NumPy array, for pixel work before any PNG encoding.
 
-        # Fetch, upload, and create Image objects for each historical image
-        for fetcher, description in historical_image_fetchers:
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch to fetch.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :param sample_type: SAMPLE_TYPE_UINT8 or SAMPLE_TYPE_FLOAT32.
+        :param bands: Bands to fetch, in output order. Defaults to R, G, B.
+        :return: Array of shape (height, width, bands).
+        :raises RuntimeError: If the image fetching fails.
+        """
+        try:
+            aoi = aoi or self.image_fetcher.build_aoi(
+                coordinate.get_longitude(), coordinate.get_latitude()
+            )
+            start_date, end_date = self._get_date_range(epoch)
+            return self.image_fetcher.get_array_by_date(start_date, end_date, aoi=aoi, sample_type=sample_type,
+                                                        bands=bands)
+        except Exception as e:
+            raise RuntimeError(f"Error fetching {epoch.description}: {e}")
+
+    def fetch_area_array(self, bbox: List[float], epoch: Epoch, width: int, height: int,
+                         sample_type: str = SAMPLE_TYPE_UINT8, bands: List[str] = None) -> np.ndarray:
+        """
+        Fetch the raw samples for an arbitrary bounding box and pixel size, e.g. a render shared by several markers.
+
+        :param bbox: Bounding box to render.
+        :param epoch: The epoch to fetch.
+        :param width: Output width in pixels.
+        :param height: Output height in pixels.
+        :param sample_type: SAMPLE_TYPE_UINT8 or SAMPLE_TYPE_FLOAT32.
+        :param bands: Bands to fetch, in output order. Defaults to R, G, B.
+        :return: Array of shape (height, width, bands).
+        :raises RuntimeError: If the image fetching fails.
+        """
+        try:
+            start_date, end_date = self._get_date_range(epoch)
+            return self.image_fetcher.get_array_by_date(start_date, end_date, aoi=bbox, width=width, height=height,
+                                                        sample_type=sample_type, bands=bands)
+        except Exception as e:
+            raise RuntimeError(f"Error fetching {epoch.description} for area {bbox}: {e}")
+
+    def store_epoch_array(self, coordinate: Coordinate, epoch: Epoch, pixels: np.ndarray,
+                          aoi: List[float] = None) -> Image:
+        """
+        Encode raw samples as a PNG for the frontend and upload them like store_epoch_image().
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch the image belongs to.
+        :param pixels: Array of shape (height, width, 3), uint8 or reflectance floats.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :return: An Image object containing the uploaded image metadata.
+        :raises RuntimeError: If the encoding or upload fails.
+        """
+        try:
+            pixels = raster.to_display_uint8(pixels)
+            image_data = raster.encode_png(pixels)
+        except Exception as e:
+            raise RuntimeError(f"Error encoding {epoch.description}: {e}")
+        return self.store_epoch_image(coordinate, epoch, image_data, aoi, pixels)
+
+    def store_epoch_image(self, coordinate: Coordinate, epoch: Epoch, image_data: bytes,
+                          aoi: List[float] = None, pixels: np.ndarray = None) -> Image:
+        """
+        Upload the image data for an epoch to S3 and return an Image object.
+
+        Images of immutable epochs are stored under their request-addressed cache key, all others under
+        a key derived from their AOI, window and content. Uploads of identical bytes to an existing
+        key are skipped. Downscaled variants are stored next to the image.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch the image belongs to.
+        :param image_data: The image data as bytes.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :param pixels: Optional uint8 pixels of the image, saving a PNG decode for the variants.
+        :return: An Image object containing the uploaded image metadata.
+        :raises RuntimeError: If the upload fails.
+        """
+        return self.submit_epoch_image(coordinate, epoch, image_data, aoi, pixels).result()
+
+    def submit_epoch_image(self, coordinate: Coordinate, epoch: Epoch, image_data: bytes,
+                           aoi: List[float] = None, pixels: np.ndarray = None) -> Future:
+        """
+        Queue the upload of the image data for an epoch and its downscaled variants on the upload stage
+        and return without waiting for it.
+
+        Blocks only while the bytes queued for upload exceed the stage's budget.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch the image belongs to.
+        :param image_data: The image data as bytes.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :param pixels: Optional uint8 pixels of the image, saving a PNG decode for the variants.
+        :return: A Future resolving to the same Image object store_epoch_image() returns, or raising RuntimeError.
+        """
+        image_future = Future()
+        try:
+            if epoch.is_immutable:
+                s3_key = self._build_cache_key(coordinate, epoch, aoi)
+            else:
+                s3_key = self._build_s3_key(coordinate, epoch, image_data, aoi)
+            upload_future = self.upload_stage.submit(image_data, s3_key)
+        except Exception as e:
+            image_future.set_exception(RuntimeError(f"Error uploading {epoch.description} to S3: {e}"))
+            return image_future
+        variant_futures, image_hash = self._submit_derivatives(s3_key, image_data, pixels)
+        remaining = [1 + len(variant_futures)]
+        lock = threading.Lock()
+
+        def on_uploaded(_):
+            # Runs on an upload worker, so it must not block on the other uploads.
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
             try:
-                png_image = fetcher()
-                if not png_image:
-                    raise ValueError(f"Failed to fetch image: No data returned for {description}")
+                image_url = upload_future.result()
+            except Exception as e:
+                image_future.set_exception(RuntimeError(f"Error uploading {epoch.description} to S3: {e}"))
+                return
+            image = self.create_image(image_url, s3_key, epoch.description)
+            image.set_variants(self._wait_for_variants(variant_futures))
+            image.set_perceptual_hash(image_hash)
+            image_future.set_result(image)
+
+        for future in [upload_future] + list(variant_futures.values()):
+            future.add_done_callback(on_uploaded)
+        return image_future
+
+    def _submit_derivatives(self, s3_key: str, image_data: bytes,
+                            pixels: np.ndarray = None) -> Tuple[Dict[str, Future], Optional[str]]:
+        """
+        Queue the uploads of the downscaled variants of an image and compute its perceptual hash.
+        Both are optional, so errors are only logged.
+
+        :param s3_key: The S3 key of the full-size image.
+        :param image_data: The PNG data of the full-size image.
+        :param pixels: Optional uint8 pixels of the image.
+        :return: Upload futures keyed by variant width, and the perceptual hash or None.
+        """
+        futures = {}
+        try:
+            if pixels is None:
+                pixels = raster.decode_png(image_data)
+            for size in VARIANT_SIZES:
+                factor = pixels.shape[1] // size
+                if factor < 2:
+                    continue
+                variant_data = raster.encode_png(raster.downscale(pixels, factor))
+                futures[str(size)] = self.upload_stage.submit(variant_data, self._build_variant_key(s3_key, size))
+            return futures, perceptual_hash.dhash(pixels)
+        except Exception as e:
+            logger.warning(f"Failed to create the variants and hash of {s3_key}: {e}")
+        return futures, None
 
-                # Generate a unique S3 key for each image
-                s3_key = f"images/{coordinate.get_latitude()}_{coordinate.get_longitude()}_{description.replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.png"
-                image_url = self.upload_image_to_s3(png_image, s3_key)
+    def load_image_pixels(self, image: Image, size: int = VARIANT_SIZES[0]) -> np.ndarray:
+        """
+        Download a stored image and decode it, preferring the variant of the requested width.
 
-                # Create an Image object with a description
-                image = self.create_image(image_url, s3_key, description)
-                images.append(image)
+        Images wider than `size`, e.g. ones stored without variants, are downscaled so that images
+        loaded with the same size can be compared pixel by pixel.
+
+        :param image: The stored Image.
+        :param size: Width in pixels to load the image at.
+        :return: Array of shape (height, width, channels).
+        :raises RuntimeError: If the download or decoding fails.
+        """
+        s3_key = image.get_s3_key()
+        if str(size) in image.get_variants():
+            s3_key = self._build_variant_key(s3_key, size)
+        try:
+            image_data = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)["Body"].read()
+            pixels = raster.decode_png(image_data)
+        except Exception as e:
+            raise RuntimeError(f"Error loading {s3_key}: {e}")
+        return raster.downscale(pixels, pixels.shape[1] // size)
+
+    @staticmethod
+    def _wait_for_variants(futures: Dict[str, Future]) -> Dict[str, str]:
+        variants = {}
+        for size, future in futures.items():
+            try:
+                variants[size] = future.result()
             except Exception as e:
-                raise RuntimeError(f"Error processing {description}: {e}")
+                logger.warning(f"Failed to upload the {size}px variant: {e}")
+        return variants
 
-        return images
+    def _find_variants(self, s3_key: str) -> Dict[str, str]:
+        """
+        Look up the variants of a stored image. They are uploaded together, so checking the smallest one suffices.
+
+        :param s3_key: The S3 key of the full-size image.
+        :return: Variant URLs keyed by width, or an empty dictionary if the image has none.
+        """
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=self._build_variant_key(s3_key, VARIANT_SIZES[-1]))
+        except Exception:
+            return {}
+        return {str(size): self.get_image_url(self._build_variant_key(s3_key, size)) for size in VARIANT_SIZES}
+
+    @staticmethod
+    def _build_variant_key(s3_key: str, size: int) -> str:
+        base, _, extension = s3_key.rpartition(".")
+        return f"{base}_{size}.{extension}"
+
+    def flush_uploads(self) -> List[UploadResult]:
+        """
+        Wait for all background uploads to finish.
+
+        :return: The UploadResults of the uploads that failed since the last flush.
+        """
+        return [result for result in self.upload_stage.drain() if result.error]
+
+    def get_upload_stats(self) -> Dict[str, float]:
+        """
+        Return the background upload counters and per-upload timings.
+
+        :return: Dictionary of counters.
+        """
+        return self.upload_stage.get_stats()
+
+    def _fetch_and_upload_epoch(self, coordinate: Coordinate, aoi: List[float], epoch: Epoch) -> EpochResult:
+        """
+        Fetch a single epoch, upload it to S3 and wrap the outcome in an EpochResult.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param aoi: Bounding box of the area of interest.
+        :param epoch: The epoch to fetch.
+        :return: The EpochResult for the epoch.
+        """
+        cached_image = self.get_cached_epoch_image(coordinate, epoch, aoi)
+        if cached_image:
+            return EpochResult(epoch, cached_image, None)
+
+        try:
+            image = self.stream_epoch_to_s3(coordinate, epoch, aoi)
+        except RuntimeError as e:
+            return EpochResult(epoch, None, str(e))
+        return EpochResult(epoch, image, None)
+
+    def _get_date_range(self, epoch: Epoch) -> Tuple[str, str]:
+        """
+        Compute the start and end dates of an epoch window, see Epoch.
+
+        :param epoch: The epoch.
+        :return: Start and end dates in "YYYY-MM-DD" format.
+        """
+        if epoch.is_immutable:
+            return self.image_fetcher.month_range_days_ago(epoch.days_ago)
+        return self.image_fetcher.date_range_days_ago(epoch.days_ago, epoch.window_days)
+
+    def _build_s3_key(self, coordinate: Coordinate, epoch: Epoch, image_data: bytes, aoi: List[float] = None) -> str:
+        """
+        Generate a deterministic S3 key for an epoch image from its AOI, window and content hash.
+
+        Re-running an observation within the same epoch window reproduces the key, so the upload can be
+        skipped: on the same day for the latest image, in the same month for historical ones.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch the image belongs to.
+        :param image_data: The image data as bytes.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :return: The S3 key.
+        """
+        aoi = aoi or self.image_fetcher.build_aoi(coordinate.get_longitude(), coordinate.get_latitude())
+        start_date, end_date = self._get_date_range(epoch)
+        area = "_".join(f"{value:.6f}" for value in aoi)
+        content_hash = hashlib.sha256(image_data).hexdigest()[:32]
+        return f"images/{area}/{start_date}_{end_date}/{content_hash}.png"
+
+    def _build_cache_key(self, coordinate: Coordinate, epoch: Epoch, aoi: List[float] = None) -> str:
+        """
+        Generate the content-addressed S3 key of an epoch render from the hash of its Process API request.
+
+        :param coordinate: A Coordinate object representing the location.
+        :param epoch: The epoch the image belongs to.
+        :param aoi: Optional precomputed bounding box for the coordinate.
+        :return: The S3 key.
+        """
+        aoi = aoi or self.image_fetcher.build_aoi(coordinate.get_longitude(), coordinate.get_latitude())
+        start_date, end_date = self._get_date_range(epoch)
+        request = self.image_fetcher.build_process_request(start_date, end_date, aoi)
+        return f"cache/{self.image_fetcher.request_hash(request)}.png"
 
     def upload_image_to_s3(self, image_data: bytes, object_key: str) -> str:
         """
@@ -111,7 +565,123 @@ class ImageService:
             ContentType="image/png",
         )
 
-        # Construct the public URL
+        return self.get_image_url(object_key)
+
+    def _upload_if_missing(self, image_data: bytes, object_key: str) -> str:
+        """
+        Upload image data unless the object already holds the same bytes, and return the public URL.
+
+        A single-part object's ETag is the MD5 of its content, so one head_object decides.
+
+        :param image_data: The image data as bytes.
+        :param object_key: The key (filename) to use for the uploaded image in S3.
+        :return: The public URL of the image.
+        """
+        try:
+            etag = self.s3_client.head_object(Bucket=self.bucket_name, Key=object_key)["ETag"].strip('"')
+        except Exception:
+            etag = None
+        if etag and etag == hashlib.md5(image_data).hexdigest():
+            with self._cache_lock:
+                self._dedup_stats["uploads_skipped"] += 1
+                self._dedup_stats["bytes_skipped"] += len(image_data)
+            return self.get_image_url(object_key)
+        return self.upload_image_to_s3(image_data, object_key)
+
+    def get_dedup_stats(self) -> Dict[str, int]:
+        """
+        Return the number of uploads and bytes skipped because the object already existed.
+
+        :return: Dictionary of counters.
+        """
+        with self._cache_lock:
+            return dict(self._dedup_stats)
+
+    def upload_stream_to_s3(self, stream, object_key: str) -> str:
+        """
+        Upload data read from a file-like object to S3 in chunks of `part_size` bytes and return the public URL.
+
+        Data that fits in one chunk is uploaded with a single put_object. Larger data goes through a
+        multipart upload, which is aborted if any part fails.
+
+        :param stream: File-like object with a read(size) method.
+        :param object_key: The key (filename) to use for the uploaded image in S3.
+        :return: The public URL of the uploaded image.
+        :raises ValueError: If the stream is empty.
+        """
+        return self._upload_stream(stream, object_key)[0]
+
+    def _upload_stream(self, stream, object_key: str) -> Tuple[str, Optional[bytes]]:
+        """
+        Implementation of upload_stream_to_s3() that also returns the data if it fit into a single part.
+        """
+        part = _read_part(stream, self.part_size)
+        if not part:
+            raise ValueError("No data returned.")
+        if len(part) < self.part_size:
+            url = self.upload_image_to_s3(part, object_key)
+            self._record_stream(len(part), multipart=False, buffered=len(part))
+            return url, part
+
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name, Key=object_key, ContentType="image/png"
+        )["UploadId"]
+        parts = []
+        total = 0
+        buffered = 0
+        try:
+            while part:
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket_name, Key=object_key, UploadId=upload_id,
+                    PartNumber=len(parts) + 1, Body=part,
+                )
+                parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+                total += len(part)
+                buffered = max(buffered, len(part))
+                part = None  # release the uploaded chunk before reading the next one
+                part = _read_part(stream, self.part_size)
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=object_key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=object_key, UploadId=upload_id)
+            raise
+
+        self._record_stream(total, multipart=True, buffered=buffered)
+        return self.get_image_url(object_key), None
+
+    def _record_stream(self, size: int, multipart: bool, buffered: int):
+        """
+        Count a streamed image.
+
+        :param size: Bytes uploaded.
+        :param multipart: Whether it went through a multipart upload.
+        :param buffered: The most bytes of the image held in memory at once, i.e. its largest part.
+        """
+        with self._cache_lock:
+            self._stream_stats["images"] += 1
+            self._stream_stats["bytes"] += size
+            self._stream_stats["multipart_uploads"] += int(multipart)
+            self._stream_stats["peak_buffered_bytes"] = max(self._stream_stats["peak_buffered_bytes"], buffered)
+
+    def get_stream_stats(self) -> Dict[str, int]:
+        """
+        Return the streaming upload counters, including the most bytes a single image held in memory at once.
+        benchmarks/benchmark_stream_upload.py measures the allocations per image.
+
+        :return: Dictionary of counters.
+        """
+        with self._cache_lock:
+            return dict(self._stream_stats)
+
+    def get_image_url(self, object_key: str) -> str:
+        """
+        Construct the public URL of an object in the bucket.
+
+        :param object_key: The key of the object in S3.
+        :return: The public URL.
+        """
         region = self.s3_client.meta.region_name
         return f"https://{self.bucket_name}.s3.{region}.amazonaws.com/{object_key}"
 
@@ -131,3 +701,18 @@ class ImageService:
             s3_key=s3_key,
             s3_bucket_name=self.bucket_name
         )
+
+
+def _read_part(stream, size: int) -> bytes:
+    """
+    Read up to `size` bytes, looping over short reads. Returns fewer bytes only at the end of the stream.
+    """
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
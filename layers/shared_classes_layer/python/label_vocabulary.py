@@ -0,0 +1,86 @@
+import threading
+from typing import Dict, Iterable, List
+
+
+class LabelVocabulary:
+    """
+    Interns label names and encodes label sets as bitsets.
+
+    Every distinct label name gets the next free bit index. A label set is a Python int with the
+    bits of its labels set, so that set differences are two integer operations.
+    Indices only live as long as the process and are never persisted; the JSON wire format keeps
+    the label names.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indices: Dict[str, int] = {}
+        self._labels: List[str] = []
+
+    def intern(self, label: str) -> int:
+        """
+        Return the bit index of a label name, assigning the next free index to unseen names.
+
+        :param label: The label name.
+        :return: The bit index.
+        """
+        index = self._indices.get(label)
+        if index is None:
+            with self._lock:
+                index = self._indices.get(label)
+                if index is None:
+                    index = len(self._labels)
+                    self._labels.append(label)
+                    self._indices[label] = index
+        return index
+
+    def get_label(self, index: int) -> str:
+        """
+        Return the interned label name of a bit index.
+
+        :param index: The bit index.
+        :return: The label name.
+        """
+        return self._labels[index]
+
+    def canonical(self, labels: Iterable[str]) -> List[str]:
+        """
+        Replace the label names by their interned instances, so that repeated names share one string.
+
+        :param labels: Label names.
+        :return: The interned label names, in the same order.
+        """
+        return [self._labels[self.intern(label)] for label in labels]
+
+    def encode(self, labels: Iterable[str]) -> int:
+        """
+        Encode a label set as a bitset.
+
+        :param labels: Label names. Duplicates are ignored.
+        :return: The bitset as an int.
+        """
+        bits = 0
+        for label in labels:
+            bits |= 1 << self.intern(label)
+        return bits
+
+    def decode(self, bits: int) -> List[str]:
+        """
+        Decode a bitset into its label names.
+
+        :param bits: The bitset as an int.
+        :return: The label names, sorted.
+        """
+        labels = []
+        while bits:
+            lowest = bits & -bits
+            labels.append(self._labels[lowest.bit_length() - 1])
+            bits ^= lowest
+        return sorted(labels)
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+
+# Shared by all DetectedObjects of the process, so their bitsets are comparable.
+default_vocabulary = LabelVocabulary()
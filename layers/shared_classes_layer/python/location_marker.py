@@ -1,15 +1,21 @@
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
+import json
 import re
 
 from coordinate import Coordinate
 from image import Image
 from detected_objects import DetectedObjects
 
+# JSON attributes holding the marker's history. They are stored as separate items, not in the marker's own item.
+HISTORY_ATTRIBUTES = ("historicalImages", "detectedObjects", "indexSeries")
+
 class LocationMarker:
     def __init__(self, coordinate: Coordinate, name: str = "name me", status: str = "created",
                  subscribed_emails: List[str] = None, current_image: Image = None,
-                 historical_images: List[Image] = None, detected_objects: List[DetectedObjects] = None):
+                 historical_images: List[Image] = None, detected_objects: List[DetectedObjects] = None,
+                 last_acquisition: Optional[str] = None, change_score: Optional[str] = None,
+                 index_series: List[Dict[str, any]] = None, version: Optional[int] = None):
         """
         Constructor for the LocationMarker class.
         
@@ -19,6 +25,11 @@ class LocationMarker:
         :param current_image: Current Image instance.
         :param historical_images: List of historical Image instances.
         :param detected_objects: List of DetectedObjects instances.
+        :param last_acquisition: Timestamp of the satellite acquisition behind the current image.
+        :param change_score: Ratio of pixels changed since the previous image, as a string like the coordinates.
+        :param index_series: Spectral index observations, oldest first. Each has a "date", the "indices"
+                             statistics by index name and the "changes" found against the observation before.
+        :param version: Number of updates stored for the marker, used for optimistic locking. None if unknown.
         """
         self._marker_id = None  # Initially set to None, to be assigned later by Data Service
         self._coordinate = coordinate
@@ -29,6 +40,13 @@ class LocationMarker:
         self._current_image = current_image
         self._historical_images = historical_images or []
         self._detected_objects = detected_objects or []
+        self._last_acquisition = last_acquisition
+        self._change_score = change_score
+        self._index_series = index_series or []
+        self._version = version
+        self._persisted: Optional[Dict[str, str]] = None
+        self._history_loader: Optional[Callable[['LocationMarker'], None]] = None
+        self._persisted_history: Optional[Dict[str, str]] = None
 
     # Getters and Setters
     def get_name(self):
@@ -62,20 +80,121 @@ class LocationMarker:
         return self._current_image
 
     def get_historical_images(self) -> List[Image]:
+        self._load_history()
         return self._historical_images
 
     def set_historical_images(self, images: List[Image]):
+        self._load_history()
         self._historical_images = images
 
     def add_image_to_history(self, image: Image):
+        self._load_history()
         self._historical_images.append(image)
 
     def add_detected_objects(self, detected_objects: DetectedObjects):
+        self._load_history()
         self._detected_objects.append(detected_objects)
 
     def get_detected_objects(self) -> List[DetectedObjects]:
+        self._load_history()
         return self._detected_objects
 
+    def set_detected_objects(self, detected_objects: List[DetectedObjects]):
+        self._load_history()
+        self._detected_objects = detected_objects
+
+    def get_last_acquisition(self) -> Optional[str]:
+        return self._last_acquisition
+
+    def set_last_acquisition(self, last_acquisition: str):
+        self._last_acquisition = last_acquisition
+
+    def get_change_score(self) -> Optional[str]:
+        return self._change_score
+
+    def set_change_score(self, change_score: str):
+        self._change_score = change_score
+
+    def get_index_series(self) -> List[Dict[str, any]]:
+        self._load_history()
+        return self._index_series
+
+    def set_index_series(self, index_series: List[Dict[str, any]]):
+        self._load_history()
+        self._index_series = index_series
+
+    def add_index_observation(self, observation: Dict[str, any], max_observations: int = None):
+        """
+        Appends a spectral index observation, discarding the oldest ones beyond `max_observations`.
+
+        :param observation: Dictionary with "date", "indices" and "changes".
+        :param max_observations: Optional maximum length of the series.
+        """
+        self._load_history()
+        self._index_series.append(observation)
+        if max_observations is not None and len(self._index_series) > max_observations:
+            del self._index_series[:len(self._index_series) - max_observations]
+
+    def set_history_loader(self, loader: Callable[['LocationMarker'], None]):
+        """
+        Defers loading the history until it is first accessed.
+
+        :param loader: Called once with the marker; sets its historical images, detected objects and index series.
+        """
+        self._history_loader = loader
+
+    def is_history_loaded(self) -> bool:
+        return self._history_loader is None
+
+    def _load_history(self):
+        if self._history_loader is not None:
+            loader, self._history_loader = self._history_loader, None
+            loader(self)
+
+    def get_persisted_history(self) -> Optional[Dict[str, str]]:
+        """
+        Returns fingerprints of the stored history items by their key, or None if the stored history is unknown.
+        """
+        return self._persisted_history
+
+    def set_persisted_history(self, persisted_history: Optional[Dict[str, str]]):
+        self._persisted_history = persisted_history
+
+    def get_version(self) -> Optional[int]:
+        return self._version
+
+    def set_version(self, version: int):
+        self._version = version
+
+    def mark_persisted(self):
+        """
+        Remembers the current summary attributes as the stored ones, so that get_changed_attributes() reports
+        only the attributes changed afterwards.
+        """
+        self._persisted = {key: self._fingerprint(value) for key, value in self.to_summary_json().items()}
+
+    def get_changed_attributes(self) -> Dict[str, any]:
+        """
+        Returns the summary attributes changed since mark_persisted(), or all of them if it was never called.
+
+        :return: Dictionary of changed attribute names and their new JSON values.
+        """
+        attributes = self.to_summary_json()
+        if self._persisted is None:
+            return attributes
+        return {key: value for key, value in attributes.items()
+                if self._persisted.get(key) != self._fingerprint(value)}
+
+    def is_persisted_value(self, name: str, value) -> bool:
+        """
+        Returns whether a JSON attribute had `value` when mark_persisted() was called. False if it never was.
+        """
+        return self._persisted is not None and self._persisted.get(name) == self._fingerprint(value)
+
+    @staticmethod
+    def _fingerprint(value) -> str:
+        return json.dumps(value, sort_keys=True, default=str)
+
     def get_date_created(self) -> datetime:
         return self._date_created
     
@@ -88,6 +207,19 @@ class LocationMarker:
     def set_current_image(self, image: Image):
         self._current_image = image
 
+    def select_image_variants(self, min_size: int, include_history: bool = True):
+        """
+        Points the current and historical image URLs at their smallest variants at least `min_size` pixels wide.
+
+        :param min_size: Minimum width in pixels the images are displayed at.
+        :param include_history: Also select the variants of the historical images, loading them if needed.
+        """
+        images = [self._current_image] if self._current_image else []
+        if include_history:
+            images += self.get_historical_images()
+        for image in images:
+            image.select_variant(min_size)
+
     # JSON Serialization
     def to_json(self) -> Dict[str, any]:
         """
@@ -95,6 +227,19 @@ class LocationMarker:
         
         :return: Dictionary with LocationMarker details.
         """
+        data = self.to_summary_json()
+        data["historicalImages"] = [image.to_json() for image in self.get_historical_images()]
+        data["detectedObjects"] = [obj.to_json() for obj in self.get_detected_objects()]
+        data["indexSeries"] = self.get_index_series()
+        return data
+
+    def to_summary_json(self) -> Dict[str, any]:
+        """
+        Converts the LocationMarker instance to a JSON-compatible dictionary without the HISTORY_ATTRIBUTES.
+        Does not load the history.
+
+        :return: Dictionary with the LocationMarker summary.
+        """
         return {
             "markerId": self._marker_id,
             "name": self._name,
@@ -103,8 +248,9 @@ class LocationMarker:
             "status": self._status,
             "dateCreated": self._date_created.isoformat(),
             "currentImage": self._current_image.to_json() if self._current_image else None,
-            "historicalImages": [image.to_json() for image in self._historical_images],
-            "detectedObjects": [obj.to_json() for obj in self._detected_objects]
+            "lastAcquisition": self._last_acquisition,
+            "changeScore": self._change_score,
+            "version": self._version
         }
 
     @classmethod
@@ -123,7 +269,11 @@ class LocationMarker:
             subscribed_emails=data.get("subscribedEmails", []),
             current_image=Image.from_json(data.get("currentImage")) if data.get("currentImage") else None,
             historical_images=[Image.from_json(img) for img in data.get("historicalImages", [])],
-            detected_objects=[DetectedObjects.from_json(obj) for obj in data.get("detectedObjects", [])]
+            detected_objects=[DetectedObjects.from_json(obj) for obj in data.get("detectedObjects", [])],
+            last_acquisition=data.get("lastAcquisition"),
+            change_score=data.get("changeScore"),
+            index_series=data.get("indexSeries", []),
+            version=int(data["version"]) if data.get("version") is not None else None
         )
         # Set the marker ID and creation date
         instance.set_marker_id(data.get("markerId"))
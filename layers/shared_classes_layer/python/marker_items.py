@@ -0,0 +1,153 @@
+import json
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from detected_objects import DetectedObjects
+from image import Image
+from location_marker import LocationMarker
+
+# Sort key of the item holding a marker's summary, i.e. everything but its HISTORY_ATTRIBUTES.
+SUMMARY_KEY = "MARKER"
+
+# Sort key prefixes of the history items in the marker's partition, one item per entry.
+IMAGE_PREFIX = "IMAGE#"
+DETECTION_PREFIX = "DETECTION#"
+INDICES_PREFIX = "INDICES#"
+
+
+def summary_key(marker_id: str) -> Dict[str, str]:
+    """
+    Return the primary key of a marker's summary item.
+
+    :param marker_id: The ID of the marker.
+    :return: The key as a dictionary.
+    """
+    return {"markerId": str(marker_id), "sk": SUMMARY_KEY}
+
+
+def summary_item(marker: LocationMarker) -> Dict[str, any]:
+    """
+    Build the summary item of a marker. Does not load the history.
+
+    :param marker: The marker.
+    :return: The item.
+    """
+    item = marker.to_summary_json()
+    item["sk"] = SUMMARY_KEY
+    return item
+
+
+def history_items(marker: LocationMarker) -> Dict[str, Dict[str, any]]:
+    """
+    Build the history items of a marker, loading its history if needed.
+
+    Historical images are keyed by their position, detections and index observations by their date,
+    so an observation appended to the history is one new item and the older items keep their keys.
+
+    :param marker: The marker.
+    :return: The items by their sort key.
+    """
+    marker_id = marker.get_marker_id()
+    items = {}
+    for position, image in enumerate(marker.get_historical_images()):
+        items[f"{IMAGE_PREFIX}{position:02d}"] = {"image": image.to_json()}
+    for key, detected_objects in _dated_keys(DETECTION_PREFIX, marker.get_detected_objects(),
+                                             DetectedObjects.get_date_detected):
+        items[key] = {"detection": detected_objects.to_json()}
+    for key, observation in _dated_keys(INDICES_PREFIX, marker.get_index_series(),
+                                        lambda observation: observation.get("date", "")):
+        items[key] = {"observation": observation}
+
+    for key, item in items.items():
+        item["markerId"] = marker_id
+        item["sk"] = key
+    return items
+
+
+def _dated_keys(prefix: str, entries: Iterable, get_date: Callable) -> List[Tuple[str, any]]:
+    """
+    Key entries by their date, numbering entries of the same date in order.
+    """
+    seen = {}
+    keyed = []
+    for entry in entries:
+        date = get_date(entry) or ""
+        occurrence = seen.get(date, 0)
+        seen[date] = occurrence + 1
+        keyed.append((f"{prefix}{date}#{occurrence:02d}", entry))
+    return keyed
+
+
+def fingerprint(item: Dict[str, any]) -> str:
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def history_changes(marker: LocationMarker) -> Tuple[List[Dict[str, any]], List[str]]:
+    """
+    Compare the history of a marker with its stored history items.
+
+    Markers whose history was not loaded, or whose stored history is unknown because the marker was
+    not read from the table, have no changes.
+
+    :param marker: The marker.
+    :return: The items to put, and the sort keys of the items to delete.
+    """
+    persisted = marker.get_persisted_history()
+    if persisted is None or not marker.is_history_loaded():
+        return [], []
+    items = history_items(marker)
+    puts = [item for key, item in items.items() if persisted.get(key) != fingerprint(item)]
+    deletes = [key for key in persisted if key not in items]
+    return puts, deletes
+
+
+def mark_history_persisted(marker: LocationMarker, items: Dict[str, Dict[str, any]] = None):
+    """
+    Remember the history items of a marker as stored, unless its history was not loaded.
+
+    :param marker: The marker.
+    :param items: The stored history items by sort key. Defaults to the marker's current history.
+    """
+    if marker.is_history_loaded():
+        items = history_items(marker) if items is None else items
+        marker.set_persisted_history({key: fingerprint(item) for key, item in items.items()})
+
+
+def apply_history(marker: LocationMarker, items: Iterable[Dict[str, any]]):
+    """
+    Set the history of a marker from its stored history items and remember them as stored.
+
+    :param marker: The marker.
+    :param items: The history items of the marker's partition, in any order. Other items are ignored.
+    """
+    images, detections, series = [], [], []
+    stored = {}
+    for item in sorted(items, key=lambda item: item["sk"]):
+        key = item["sk"]
+        if key.startswith(IMAGE_PREFIX):
+            images.append(Image.from_json(item["image"]))
+        elif key.startswith(DETECTION_PREFIX):
+            detections.append(DetectedObjects.from_json(item["detection"]))
+        elif key.startswith(INDICES_PREFIX):
+            series.append(item["observation"])
+        else:
+            continue
+        stored[key] = item
+    marker.set_historical_images(images)
+    marker.set_detected_objects(detections)
+    marker.set_index_series(series)
+    mark_history_persisted(marker, stored)
+
+
+def marker_from_items(items: List[Dict[str, any]]) -> Optional[LocationMarker]:
+    """
+    Build a marker from the items of its partition.
+
+    :param items: The summary item and any history items of one marker.
+    :return: The marker with the history found in `items`, or None without a summary item.
+    """
+    summary = next((item for item in items if item.get("sk") == SUMMARY_KEY), None)
+    if summary is None:
+        return None
+    marker = LocationMarker.from_json(summary)
+    apply_history(marker, items)
+    return marker
@@ -1,37 +1,106 @@
-import boto3
-from typing import List
+import logging
+import threading
+from typing import Dict, List
 from datetime import datetime
 from detected_objects import DetectedObjects
+from detection_cache import DetectionCache
+from detectors import BACKEND_REKOGNITION, Detector, ImageLocation, RekognitionDetector
+
+logger = logging.getLogger(__name__)
 
 class ObjectDetectionService:
     """
-    A service class to interact with AWS Rekognition for object detection.
+    A service class for object detection, backed by AWS Rekognition or another Detector.
     """
-    def __init__(self, rekognition_resource=None):
+    def __init__(self, rekognition_resource=None, cache: DetectionCache = None, max_labels: int = 10,
+                 min_confidence: int = 50, detector: Detector = None):
         """
-        Initialize the Rekognition client.
+        Initialize the detection backend.
 
         :param rekognition_resource: Optional Rekognitionn resource for dependency injection.
-        """        
-        self.reko = rekognition_resource or boto3.client("rekognition")
+        :param cache: Optional DetectionCache remembering results by image content.
+        :param max_labels: Maximum number of labels returned per image by the default Rekognition backend.
+        :param min_confidence: Minimum confidence of the labels returned by the default Rekognition backend.
+        :param detector: Optional Detector backend, see detectors.create_detector(). Defaults to Rekognition.
+        """
+        self.detector = detector or RekognitionDetector(rekognition_resource, max_labels, min_confidence)
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "images": 0}
 
     def detect_object(self, s3_bucket_name: str, s3_key: str) -> DetectedObjects:
         """
         Detects objects in an image stored in an S3 bucket.
 
+        If a cache is configured, images whose content was labeled before with the same parameters
+        are not run through the detector again.
+
         :param s3_bucket_name: The name of the S3 bucket.
         :param s3_key: The key of the image in the S3 bucket.
         :return: DetectedObjects instance containing detection details.
+        :raises RuntimeError: If detection fails.
+        """
+        return self.detect_objects([(s3_bucket_name, s3_key)])[0]
+
+    def detect_objects(self, images: List[ImageLocation]) -> List[DetectedObjects]:
+        """
+        Detects objects in several images stored in S3, passing all cache misses to the detector as one batch.
+
+        :param images: The images as (s3_bucket_name, s3_key) pairs.
+        :return: One DetectedObjects instance per image, in the same order.
+        :raises RuntimeError: If detection fails. An empty result would read as every label disappearing,
+                              so callers must not record anything for these images.
         """
         try:
-            response = self.reko.detect_labels(
-                    Image={"S3Object": {"Bucket": s3_bucket_name, "Name": s3_key}},
-                    MaxLabels=10, MinConfidence=50
-            )
-            names = [label["Name"] for label in response.get("Labels",[])]
+            cache_keys = [None] * len(images)
+            if self.cache:
+                parameters = self.detector.get_parameters()
+                cache_keys = [self.cache.build_key(bucket, key, **parameters) for bucket, key in images]
+            names = [self.cache.get(cache_key) if cache_key else None for cache_key in cache_keys]
+
+            misses = [i for i, found in enumerate(names) if found is None]
+            if misses:
+                detected = self.detector.detect_batch([images[i] for i in misses])
+                with self._lock:
+                    self._stats["batches"] += 1
+                    self._stats["images"] += len(misses)
+                for i, labels in zip(misses, detected):
+                    names[i] = labels
+                    if cache_keys[i]:
+                        self.cache.put(cache_keys[i], labels)
             date_taken = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-            return DetectedObjects(date_detected=date_taken, detected_objects=names)
+            return [DetectedObjects(date_detected=date_taken, detected_objects=labels) for labels in names]
 
         except Exception as e:
-            print(f"Error detecting objects: {e}")
-            return DetectedObjects(date_detected="", detected_objects=[])
+            logger.error(f"Error detecting objects in {len(images)} images: {e}")
+            raise RuntimeError(f"Error detecting objects: {e}") from e
+
+    def get_batch_size(self) -> int:
+        """
+        Return the number of images the detector prefers to process per call.
+        """
+        return self.detector.batch_size
+
+    def get_detector_stats(self) -> Dict[str, int]:
+        """
+        Return the number of batches and images the detector actually ran, i.e. without cache hits.
+
+        :return: Dictionary of counters.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def get_rekognition_calls(self) -> int:
+        """
+        Return the number of Rekognition DetectLabels calls made so far, one per image the Rekognition
+        backend ran. Cache hits and other backends make none.
+        """
+        return self.get_detector_stats()["images"] if self.detector.name == BACKEND_REKOGNITION else 0
+
+    def get_cache_stats(self) -> Dict[str, float]:
+        """
+        Return the detection cache counters, or an empty dictionary without a cache.
+
+        :return: Dictionary of counters.
+        """
+        return self.cache.get_stats() if self.cache else {}
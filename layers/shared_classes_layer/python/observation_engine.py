@@ -0,0 +1,723 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from change_detection import ChangeDetector
+from image_fetcher import SAMPLE_TYPE_FLOAT32
+from image_service import ImageService, LATEST_EPOCH, HISTORICAL_EPOCHS
+import perceptual_hash
+from data_service import DataService, MarkerWriteBuffer
+from detection_stage import DetectionStage
+from object_detection_service import ObjectDetectionService
+from detected_objects import DetectedObjects
+from image import Image
+from location_marker import LocationMarker
+from observation_planner import ObservationGroup, ObservationPlanner, ObservationSite
+import raster
+from spectral_indices import IndexChangeDetector, IndexStats
+from upload_stage import UploadResult
+
+logger = logging.getLogger(__name__)
+
+MODE_ASYNC = "async"
+MODE_SEQUENTIAL = "sequential"
+
+# Sentinel returned by the acquisition check when a marker has nothing new to observe.
+_UP_TO_DATE = object()
+
+# How the detection result of an observed marker was obtained.
+DETECTION_RUN = "run"
+DETECTION_REUSED = "reused"
+DETECTION_UNCHANGED = "unchanged"
+
+
+class ObservationReport:
+    """
+    Summary of an observe run: which markers succeeded or failed and the achieved throughput.
+    """
+
+    def __init__(self, mode: str):
+        """
+        Constructor for the ObservationReport class.
+
+        :param mode: The mode the run was executed in.
+        """
+        self.mode = mode
+        self.succeeded: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.failed_uploads: Dict[str, str] = {}
+        self.render_groups = 0
+        self.rekognition_calls = 0
+        self.detection_batches: Dict[str, float] = {}
+        self.detections = {DETECTION_RUN: 0, DETECTION_REUSED: 0, DETECTION_UNCHANGED: 0}
+        self.elapsed_seconds = 0.0
+
+    def record_success(self, marker: LocationMarker):
+        self.succeeded.append(marker.get_marker_id())
+
+    def record_skip(self, marker: LocationMarker):
+        self.skipped.append(marker.get_marker_id())
+
+    def record_failure(self, marker: LocationMarker, error: Exception):
+        self.failed[marker.get_marker_id()] = str(error)
+
+    def record_upload_failures(self, results: List[UploadResult]):
+        """
+        Record and log the background uploads that failed, e.g. variants whose image was stored.
+
+        :param results: The failed UploadResults returned by ImageService.flush_uploads().
+        """
+        for result in results:
+            logger.error(f"Background upload of {result.object_key} failed: {result.error}")
+            self.failed_uploads[result.object_key] = result.error
+
+    def record(self, marker: LocationMarker, observed: bool):
+        if observed:
+            self.record_success(marker)
+        else:
+            self.record_skip(marker)
+
+    def record_detection(self, decision: str):
+        self.detections[decision] += 1
+
+    def get_rekognition_calls_saved(self) -> int:
+        """
+        Returns the number of observed markers that did not cost a Rekognition call of their own, e.g.
+        because their result was reused, came from the detection cache or another backend ran them.
+        """
+        return sum(self.detections.values()) - self.rekognition_calls
+
+    def get_detection_skip_rate(self) -> float:
+        """
+        Returns the ratio of observed markers whose detection result was reused or not needed.
+        """
+        observed = sum(self.detections.values())
+        if not observed:
+            return 0.0
+        return (self.detections[DETECTION_REUSED] + self.detections[DETECTION_UNCHANGED]) / observed
+
+    def get_total(self) -> int:
+        return len(self.succeeded) + len(self.skipped) + len(self.failed)
+
+    def get_markers_per_second(self) -> float:
+        """
+        Returns the number of markers processed per second of wall time.
+
+        :return: Throughput in markers/sec.
+        """
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.get_total() / self.elapsed_seconds
+
+    def to_json(self) -> dict:
+        """
+        Converts the report to a JSON-compatible dictionary.
+
+        :return: Dictionary with the report details.
+        """
+        return {
+            "mode": self.mode,
+            "processed": self.get_total(),
+            "succeeded": len(self.succeeded),
+            "skipped": len(self.skipped),
+            "failed": self.failed,
+            "failedUploads": self.failed_uploads,
+            "renderGroups": self.render_groups,
+            "detections": self.detections,
+            "rekognitionCalls": self.rekognition_calls,
+            "rekognitionCallsSaved": self.get_rekognition_calls_saved(),
+            "detectionSkipRate": round(self.get_detection_skip_rate(), 3),
+            "detectionBatches": self.detection_batches,
+            "elapsedSeconds": round(self.elapsed_seconds, 3),
+            "markersPerSecond": round(self.get_markers_per_second(), 3),
+        }
+
+
+class ObservationEngine:
+    """
+    Runs the daily observation (fetch, upload, detect, update) for a set of markers.
+
+    The async mode overlaps the blocking I/O of many markers. Each external service has its own
+    concurrency bound, so a burst of markers cannot overload Sentinel Hub or exhaust the Lambda.
+    The sequential mode processes one marker at a time and is kept as a fallback.
+    """
+
+    def __init__(self, image_service: ImageService, object_detection_service: ObjectDetectionService,
+                 data_service: DataService, sentinel_concurrency: int = 4, s3_concurrency: int = 8,
+                 rekognition_concurrency: int = 4, dynamodb_concurrency: int = 4, max_observations: int = 3,
+                 check_acquisitions: bool = True, planner: ObservationPlanner = None,
+                 change_detector: ChangeDetector = None, max_hash_distance: int = 4,
+                 index_detector: IndexChangeDetector = None, max_index_observations: int = 30,
+                 write_buffer: MarkerWriteBuffer = None):
+        """
+        Initialize the engine with its services and per-stage concurrency limits.
+
+        :param image_service: ImageService used to fetch and upload images.
+        :param object_detection_service: ObjectDetectionService used to detect objects.
+        :param data_service: DataService used to persist markers.
+        :param sentinel_concurrency: Maximum concurrent Sentinel Hub requests.
+        :param s3_concurrency: Maximum concurrent S3 uploads.
+        :param rekognition_concurrency: Maximum concurrent detection batches, i.e. Rekognition calls.
+        :param dynamodb_concurrency: Maximum concurrent DynamoDB writes.
+        :param max_observations: Number of DetectedObjects kept per marker.
+        :param check_acquisitions: Query the catalog first and skip markers without a new acquisition.
+        :param planner: ObservationPlanner grouping nearby markers into shared renders in async mode.
+        :param change_detector: ChangeDetector deciding from the pixels whether object detection is needed.
+        :param max_hash_distance: Maximum Hamming distance between the perceptual hashes of two images
+                                  for the previous detection result to be reused.
+        :param index_detector: Optional IndexChangeDetector enabling the spectral mode. Latest images are
+                               then fetched as reflectances of its bands, their index statistics are added
+                               to the markers' index series and index deltas decide about object detection.
+        :param max_index_observations: Number of index observations kept per marker.
+        :param write_buffer: Optional MarkerWriteBuffer. Observed markers are then added to it and written
+                             in batches; the caller flushes it and reports the write results.
+        """
+        self.image_service = image_service
+        self.object_detection_service = object_detection_service
+        self.data_service = data_service
+        self.sentinel_concurrency = sentinel_concurrency
+        self.s3_concurrency = s3_concurrency
+        self.rekognition_concurrency = rekognition_concurrency
+        self.dynamodb_concurrency = dynamodb_concurrency
+        self.max_observations = max_observations
+        self.check_acquisitions = check_acquisitions
+        self.planner = planner or ObservationPlanner(image_service.image_fetcher)
+        self.change_detector = change_detector or ChangeDetector()
+        self.max_hash_distance = max_hash_distance
+        self.index_detector = index_detector
+        self.max_index_observations = max_index_observations
+        self.write_buffer = write_buffer
+
+    def run(self, markers: Iterable[LocationMarker], mode: str = MODE_ASYNC) -> ObservationReport:
+        """
+        Observe all markers.
+
+        :param markers: The markers to observe.
+        :param mode: MODE_ASYNC or MODE_SEQUENTIAL.
+        :return: An ObservationReport for the run.
+        :raises ValueError: If the mode is unknown.
+        """
+        if mode == MODE_SEQUENTIAL:
+            return self.run_sequential(markers)
+        if mode == MODE_ASYNC:
+            return asyncio.run(self.run_async(markers))
+        raise ValueError(f"Unknown observation mode: {mode}")
+
+    def run_sequential(self, markers: Iterable[LocationMarker]) -> ObservationReport:
+        """
+        Observe markers one after another.
+
+        The upload of a marker's latest image runs on the image service's upload stage while the
+        next marker's image is fetched, so S3 latency overlaps with Sentinel Hub latency.
+
+        :param markers: The markers to observe.
+        :return: An ObservationReport for the run.
+        """
+        report = ObservationReport(MODE_SEQUENTIAL)
+        start = time.perf_counter()
+        rekognition_calls = self.object_detection_service.get_rekognition_calls()
+        pending = None
+        for marker in markers:
+            try:
+                image_future = self._start_marker(marker)
+            except Exception as e:
+                self._record_failure(report, marker, e)
+                continue
+            if image_future is None:
+                report.record_skip(marker)
+                continue
+            if pending:
+                self._finish_pending(pending, report)
+            pending = (marker, image_future)
+        if pending:
+            self._finish_pending(pending, report)
+        report.record_upload_failures(self.image_service.flush_uploads())
+        report.rekognition_calls = self.object_detection_service.get_rekognition_calls() - rekognition_calls
+        report.elapsed_seconds = time.perf_counter() - start
+        return report
+
+    def _finish_pending(self, pending: Tuple[LocationMarker, Future], report: ObservationReport):
+        marker, image_future = pending
+        try:
+            self._finish_marker(marker, image_future.result(), report)
+        except Exception as e:
+            self._record_failure(report, marker, e)
+            return
+        report.record_success(marker)
+
+    def observe_marker(self, marker: LocationMarker) -> bool:
+        """
+        Run the full observation for a single marker on the calling thread.
+
+        :param marker: The marker to observe.
+        :return: True if the marker was observed, False if it was skipped because nothing new was acquired.
+        :raises RuntimeError: If fetching, uploading or updating fails.
+        """
+        image_future = self._start_marker(marker)
+        if image_future is None:
+            return False
+        self._finish_marker(marker, image_future.result())
+        return True
+
+    def _start_marker(self, marker: LocationMarker) -> Optional[Future]:
+        """
+        Fetch the images of a marker and queue the upload of its latest image.
+
+        :param marker: The marker to observe.
+        :return: A Future resolving to the latest Image, or None if nothing new was acquired.
+        :raises RuntimeError: If fetching fails.
+        """
+        coordinate = marker.get_coordinate()
+        if self._should_check_acquisition(marker):
+            acquisition = self._search_acquisition(marker, self.image_service.get_latest_acquisition)
+            if acquisition is _UP_TO_DATE:
+                return None
+            marker.set_last_acquisition(acquisition)
+
+        aoi = self._get_aoi(marker)
+        if marker.get_historical_images():
+            return self._submit_latest_image(marker, aoi)
+
+        # New marker: fetch the latest and all historical images concurrently
+        epochs = HISTORICAL_EPOCHS if self.index_detector else [LATEST_EPOCH] + HISTORICAL_EPOCHS
+        results = self.image_service.fetch_epochs(coordinate, epochs, aoi)
+        errors = [result.error for result in results if result.error]
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        marker.set_historical_images([result.image for result in results[-len(HISTORICAL_EPOCHS):]])
+        if self.index_detector:
+            return self._submit_latest_image(marker, aoi)
+        image_future = Future()
+        image_future.set_result(results[0].image)
+        return image_future
+
+    def _get_aoi(self, marker: LocationMarker) -> Optional[List[float]]:
+        """
+        The AOI a marker is rendered with: its site's AOI from the planner, as in async mode.
+
+        :return: The AOI, or None for an invalid coordinate, whose error the image service then reports.
+        """
+        try:
+            return self.planner.get_aoi(marker.get_coordinate())
+        except ValueError:
+            return None
+
+    def _submit_latest_image(self, marker: LocationMarker, aoi: List[float] = None) -> Future:
+        """
+        Fetch a marker's latest image as an array and queue the upload of its PNG, so the variants and hash
+        are computed from the fetched pixels rather than from a decoded PNG. In spectral mode the spectral
+        bands are fetched, their indices recorded and the RGB bands uploaded.
+
+        :param marker: The marker to observe.
+        :param aoi: The AOI of the marker's site.
+        :return: A Future resolving to the latest Image.
+        """
+        coordinate = marker.get_coordinate()
+        pixels = self.image_service.fetch_epoch_array(coordinate, LATEST_EPOCH, aoi, **self._render_options())
+        pixels = self._prepare_render([marker], pixels)
+        return self.image_service.submit_epoch_image(coordinate, LATEST_EPOCH, raster.encode_png(pixels), aoi, pixels)
+
+    def _render_options(self) -> Dict[str, object]:
+        """
+        Keyword arguments for fetching latest renders: reflectances of the index bands in spectral mode.
+        """
+        if not self.index_detector:
+            return {}
+        return {"sample_type": SAMPLE_TYPE_FLOAT32, "bands": self.index_detector.bands}
+
+    def _prepare_render(self, markers: List[LocationMarker], pixels: np.ndarray) -> np.ndarray:
+        """
+        In spectral mode, add the index statistics of a latest render to its markers' index series and
+        reduce the render to display-ready RGB. Other renders are returned unchanged.
+
+        :param markers: The markers the render shows.
+        :param pixels: The render fetched with _render_options().
+        :return: The pixels to encode and upload.
+        """
+        if not self.index_detector:
+            return pixels
+        indices = {name: stats.to_json() for name, stats in self.index_detector.summarize(pixels).items()}
+        date = datetime.utcnow().strftime("%Y-%m-%d")
+        for marker in markers:
+            marker.add_index_observation({"date": date, "indices": indices, "changes": []},
+                                         self.max_index_observations)
+        return raster.to_display_uint8(pixels[..., :3])
+
+    def _finish_marker(self, marker: LocationMarker, image: Image, report: ObservationReport = None):
+        """
+        Obtain the detection result for the uploaded latest image of a marker, record it and persist the marker.
+        """
+        decision = self._plan_detection(marker, image)
+        marker.set_current_image(image)
+
+        if decision == DETECTION_RUN:
+            detected_objects = self.object_detection_service.detect_object(
+                s3_bucket_name=image.get_s3_bucket_name(), s3_key=image.get_s3_key()
+            )
+            self.record_detection(marker, detected_objects)
+
+        self._save_marker(marker)
+        if report:
+            report.record_detection(decision)
+        logger.info(f"Successfully updated marker with ID {marker.get_marker_id()}.")
+
+    def _save_marker(self, marker: LocationMarker):
+        """
+        Persist an observed marker, through the write buffer if there is one.
+        """
+        if self.write_buffer:
+            self.write_buffer.add(marker)
+        else:
+            self.data_service.update_marker(marker, merge_on_conflict=True)
+
+    def _plan_detection(self, marker: LocationMarker, image: Image) -> str:
+        """
+        Decide how to obtain the detection result for a marker's new image, cheapest option first.
+
+        If the perceptual hashes of the previous and new image are within `max_hash_distance`, the
+        previous detection result is recorded again (DETECTION_REUSED). Otherwise the pixel change is
+        scored and stored on the marker. If the change is not significant, the status says so and no
+        result is recorded (DETECTION_UNCHANGED). Markers without a previous image or detection, and
+        markers whose change cannot be scored, need object detection (DETECTION_RUN).
+
+        :param marker: The observed marker, still holding its previous image.
+        :param image: The new image.
+        :return: DETECTION_RUN, DETECTION_REUSED or DETECTION_UNCHANGED.
+        """
+        previous = marker.get_current_image()
+        if not previous or not marker.get_detected_objects():
+            return DETECTION_RUN
+
+        if self.index_detector:
+            decision = self._plan_from_indices(marker)
+            if decision:
+                return decision
+
+        if previous.get_perceptual_hash() and image.get_perceptual_hash():
+            distance = perceptual_hash.hamming_distance(previous.get_perceptual_hash(), image.get_perceptual_hash())
+            if distance <= self.max_hash_distance:
+                last_detection = marker.get_detected_objects()[-1]
+                self.record_detection(marker, DetectedObjects(
+                    date_detected=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                    detected_objects=list(last_detection.get_detected_objects())
+                ))
+                return DETECTION_REUSED
+
+        if previous.get_s3_key() == image.get_s3_key():
+            # Keys are derived from the content, so the pixels are identical.
+            score, significant = 0.0, False
+        else:
+            try:
+                result = self.change_detector.compare(
+                    self.image_service.load_image_pixels(previous), self.image_service.load_image_pixels(image)
+                )
+            except Exception as e:
+                logger.warning(f"Failed to score the change for marker {marker.get_marker_id()}: {e}")
+                return DETECTION_RUN
+            score, significant = result.score, self.change_detector.is_significant(result)
+
+        marker.set_change_score(f"{score:.4f}")
+        if significant:
+            return DETECTION_RUN
+        marker.set_status(f"No significant change (change score {score:.4f}).")
+        return DETECTION_UNCHANGED
+
+    def _plan_from_indices(self, marker: LocationMarker) -> Optional[str]:
+        """
+        Decide from the last two index observations of a marker whether object detection is needed.
+        The significant changes are stored on the latest observation.
+
+        :param marker: The observed marker, its latest index observation belonging to the new image.
+        :return: DETECTION_RUN or DETECTION_UNCHANGED, or None if no index can be compared.
+        """
+        series = marker.get_index_series()
+        if len(series) < 2:
+            return None
+        previous, current = [
+            {name: IndexStats.from_json(stats) for name, stats in observation.get("indices", {}).items()}
+            for observation in series[-2:]
+        ]
+        change = self.index_detector.compare(previous, current)
+        if not change.deltas:
+            return None
+
+        series[-1]["changes"] = change.changes
+        if self.index_detector.is_significant(change):
+            return DETECTION_RUN
+        deltas = ", ".join(f"{name.upper()} {delta:+.3f}" for name, delta in change.deltas.items())
+        marker.set_status(f"No significant index change ({deltas}).")
+        return DETECTION_UNCHANGED
+
+    def _should_check_acquisition(self, marker: LocationMarker) -> bool:
+        """
+        Only markers that already have imagery can be skipped.
+        """
+        return self.check_acquisitions and bool(marker.get_current_image()) and bool(marker.get_historical_images())
+
+    def _search_acquisition(self, marker: LocationMarker, search):
+        """
+        Decide from the catalog whether a marker has a new acquisition.
+
+        :param marker: The marker to check.
+        :param search: Callable returning the latest acquisition timestamp for the marker's coordinate.
+        :return: _UP_TO_DATE if nothing new was acquired, otherwise the acquisition timestamp to record
+                 (the previous one if the catalog search failed).
+        """
+        try:
+            acquisition = search(marker.get_coordinate())
+        except Exception as e:
+            # The pre-check is an optimization, so observe anyway rather than lose the day.
+            logger.warning(f"Catalog search failed for marker {marker.get_marker_id()}: {e}")
+            return marker.get_last_acquisition()
+
+        last_acquisition = marker.get_last_acquisition()
+        if acquisition is None or (last_acquisition and acquisition <= last_acquisition):
+            logger.info(f"No new acquisition for marker {marker.get_marker_id()} since {last_acquisition}, skipping.")
+            return _UP_TO_DATE
+        return acquisition
+
+    def record_detection(self, marker: LocationMarker, detected_objects: DetectedObjects):
+        """
+        Append a detection result to the marker and update its status with the change since the last one.
+
+        :param marker: The observed marker.
+        :param detected_objects: The new detection result.
+        """
+        if not marker.get_detected_objects():
+            marker.add_detected_objects(detected_objects)
+            marker.set_status("First Observation Occured. Wait another day for more data.")
+        else:
+            change = marker.get_detected_objects()[-1].compare(detected_objects)
+            marker.set_status(change)
+            marker.add_detected_objects(detected_objects)
+
+        if len(marker.get_detected_objects()) > self.max_observations: # discard old obervations
+            marker.get_detected_objects().pop(0)
+
+    async def run_async(self, markers: Iterable[LocationMarker]) -> ObservationReport:
+        """
+        Observe all markers concurrently, bounding each stage by its own semaphore.
+
+        Markers are first checked for new acquisitions, then planned into render groups so that
+        nearby markers share one Process API request and markers with identical AOIs share one
+        image and one detection result. Blocking SDK calls run on a shared thread pool. A failing
+        marker is recorded in the report and does not affect the others.
+
+        :param markers: The markers to observe.
+        :return: An ObservationReport for the run.
+        """
+        report = ObservationReport(MODE_ASYNC)
+        start = time.perf_counter()
+        rekognition_calls = self.object_detection_service.get_rekognition_calls()
+        markers = list(markers)
+        limits = {
+            "sentinel": self.sentinel_concurrency,
+            "s3": self.s3_concurrency,
+            "dynamodb": self.dynamodb_concurrency,
+            "cpu": os.cpu_count() or 2,
+        }
+        detection_stage = DetectionStage(self.object_detection_service, max_workers=self.rekognition_concurrency)
+
+        try:
+            with ThreadPoolExecutor(max_workers=sum(limits.values())) as executor:
+                stages = _Stages(limits, executor, detection_stage)
+                needs_observation = await asyncio.gather(
+                    *(self._check_acquisition_async(marker, stages) for marker in markers)
+                )
+                to_observe = []
+                for marker, observe in zip(markers, needs_observation):
+                    if observe:
+                        to_observe.append(marker)
+                    else:
+                        report.record_skip(marker)
+
+                groups = self.planner.plan(to_observe)
+                report.render_groups = len(groups)
+                await asyncio.gather(*(self._observe_group_async(group, stages, report) for group in groups))
+                report.record_upload_failures(await stages.run("s3", self.image_service.flush_uploads))
+        finally:
+            detection_stage.close()
+        report.detection_batches = detection_stage.get_stats()
+        report.rekognition_calls = self.object_detection_service.get_rekognition_calls() - rekognition_calls
+        report.elapsed_seconds = time.perf_counter() - start
+        return report
+
+    async def _check_acquisition_async(self, marker: LocationMarker, stages: '_Stages') -> bool:
+        """
+        The async counterpart of the acquisition check in observe_marker().
+
+        :return: True if the marker needs to be observed.
+        """
+        if not self._should_check_acquisition(marker):
+            return True
+        acquisition = await stages.run(
+            "sentinel", self._search_acquisition, marker, self.image_service.get_latest_acquisition
+        )
+        if acquisition is _UP_TO_DATE:
+            return False
+        marker.set_last_acquisition(acquisition)
+        return True
+
+    async def _observe_group_async(self, group: ObservationGroup, stages: '_Stages', report: ObservationReport):
+        """
+        Fetch the latest image of every site in a group, then observe each site.
+        """
+        try:
+            images = await self._fetch_group_images_async(group, stages)
+        except Exception as e:
+            for marker in group.get_markers():
+                self._record_failure(report, marker, e)
+            return
+
+        await asyncio.gather(*(
+            self._observe_site_async(site, image, stages, report) for site, image in zip(group.sites, images)
+        ))
+
+    async def _fetch_group_images_async(self, group: ObservationGroup, stages: '_Stages') -> List[Image]:
+        """
+        Fetch and upload the latest image of every site in a group.
+
+        Renders are fetched as raw uint8 arrays, or as spectral reflectances in spectral mode, and only
+        encoded to PNG right before the upload. A group with a single site is rendered directly. A larger
+        group is rendered once over its combined bbox and every site's tile is cropped out of that render
+        locally.
+
+        :return: One Image per site, in the order of group.sites.
+        """
+        if group.is_single():
+            site = group.sites[0]
+            pixels = await stages.run(
+                "sentinel", self.image_service.fetch_epoch_array, site.coordinate, LATEST_EPOCH, site.aoi,
+                **self._render_options()
+            )
+            pixels = await stages.run("cpu", self._prepare_render, site.markers, pixels)
+            image_data = await stages.run("cpu", raster.encode_png, pixels)
+            image_future = await stages.run(
+                "s3", self.image_service.submit_epoch_image, site.coordinate, LATEST_EPOCH, image_data, site.aoi,
+                pixels
+            )
+            return [await asyncio.wrap_future(image_future)]
+
+        bbox, width, height = self.planner.get_render(group)
+        pixels = await stages.run(
+            "sentinel", self.image_service.fetch_area_array, bbox, LATEST_EPOCH, width, height,
+            **self._render_options()
+        )
+        tile_size = self.planner.tile_size
+
+        def crop_tile(site: ObservationSite):
+            row, col, _, _ = raster.pixel_window(bbox, site.aoi, (width, height))
+            tile = self._prepare_render(site.markers, raster.crop(pixels, row, col, tile_size, tile_size))
+            return tile, raster.encode_png(tile)
+
+        async def crop_and_store(site: ObservationSite) -> Image:
+            tile, image_data = await stages.run("cpu", crop_tile, site)
+            image_future = await stages.run(
+                "s3", self.image_service.submit_epoch_image, site.coordinate, LATEST_EPOCH, image_data, site.aoi,
+                tile
+            )
+            return await asyncio.wrap_future(image_future)
+
+        return await asyncio.gather(*(crop_and_store(site) for site in group.sites))
+
+    async def _observe_site_async(self, site: ObservationSite, image: Image, stages: '_Stages',
+                                  report: ObservationReport):
+        """
+        Decide how each marker of a site gets its detection result, run detection once if any of them
+        needs it and finish the observation of each marker.
+        """
+        decisions = await asyncio.gather(*(
+            stages.run("s3", self._plan_detection, marker, image) for marker in site.markers
+        ))
+
+        observations = list(zip(site.markers, decisions))
+        detected_objects = None
+        if DETECTION_RUN in decisions:
+            try:
+                detected_objects = await stages.detect(image)
+            except Exception as e:
+                for marker, decision in observations:
+                    if decision == DETECTION_RUN:
+                        self._record_failure(report, marker, e)
+                observations = [(marker, decision) for marker, decision in observations if decision != DETECTION_RUN]
+
+        await asyncio.gather(*(
+            self._observe_marker_async(marker, site, image, decision, detected_objects, stages, report)
+            for marker, decision in observations
+        ))
+
+    async def _observe_marker_async(self, marker: LocationMarker, site: ObservationSite, image: Image,
+                                    decision: str, detected_objects: Optional[DetectedObjects], stages: '_Stages',
+                                    report: ObservationReport):
+        """
+        Finish the observation of a single marker: historical images for new markers, detection result and update.
+        The shared detection result is only recorded for markers whose decision was DETECTION_RUN.
+        """
+        try:
+            if not marker.get_historical_images():
+                marker.set_historical_images(await self._fetch_historical_async(marker, site, stages))
+            marker.set_current_image(image)
+            if decision == DETECTION_RUN:
+                self.record_detection(marker, DetectedObjects(
+                    date_detected=detected_objects.get_date_detected(),
+                    detected_objects=list(detected_objects.get_detected_objects())
+                ))
+            await stages.run("dynamodb", self._save_marker, marker)
+        except Exception as e:
+            self._record_failure(report, marker, e)
+            return
+        report.record_detection(decision)
+        report.record_success(marker)
+        logger.info(f"Successfully updated marker with ID {marker.get_marker_id()}.")
+
+    async def _fetch_historical_async(self, marker: LocationMarker, site: ObservationSite,
+                                      stages: '_Stages') -> List[Image]:
+        """
+        Fetch the historical images of a new marker, using the site AOI so markers of a site share cache entries.
+        """
+        coordinate = marker.get_coordinate()
+
+        async def fetch_and_store(epoch):
+            cached_image = await stages.run(
+                "s3", self.image_service.get_cached_epoch_image, coordinate, epoch, site.aoi
+            )
+            if cached_image:
+                return cached_image
+            return await stages.run(
+                "sentinel", self.image_service.stream_epoch_to_s3, coordinate, epoch, site.aoi
+            )
+
+        return list(await asyncio.gather(*(fetch_and_store(epoch) for epoch in HISTORICAL_EPOCHS)))
+
+    def _record_failure(self, report: ObservationReport, marker: LocationMarker, error: Exception):
+        logger.error(f"Failed to update marker with ID {marker.get_marker_id()}: {error}")
+        report.record_failure(marker, error)
+
+
+class _Stages:
+    """
+    Runs blocking calls on a thread pool, bounding each named stage by its own semaphore, and hands
+    images to the batched detection stage.
+    """
+
+    def __init__(self, limits: Dict[str, int], executor: ThreadPoolExecutor, detection_stage: DetectionStage):
+        self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in limits.items()}
+        self._executor = executor
+        self._detection_stage = detection_stage
+        self._loop = asyncio.get_running_loop()
+
+    async def detect(self, image: Image) -> DetectedObjects:
+        future = self._detection_stage.submit(image.get_s3_bucket_name(), image.get_s3_key())
+        return await asyncio.wrap_future(future)
+
+    async def run(self, name: str, func, *args, **kwargs):
+        async with self._semaphores[name]:
+            return await self._loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,169 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from coordinate import Coordinate
+from image_fetcher import ImageFetcher
+from location_marker import LocationMarker
+
+
+class ObservationSite:
+    """
+    Markers whose AOIs are identical after quantization. They share one image and one detection result.
+    """
+
+    def __init__(self, key: Optional[Tuple[int, int]], coordinate: Coordinate, aoi: Optional[List[float]]):
+        """
+        Constructor for the ObservationSite class.
+
+        :param key: Quantized center of the site, or None if the coordinate is invalid.
+        :param coordinate: Coordinate used to name the site's images.
+        :param aoi: Bounding box of the site, or None if the coordinate is invalid.
+        """
+        self.key = key
+        self.coordinate = coordinate
+        self.aoi = aoi
+        self.markers: List[LocationMarker] = []
+
+
+class ObservationGroup:
+    """
+    Sites close enough to each other to be rendered with a single Process API request.
+    """
+
+    def __init__(self, site: ObservationSite):
+        """
+        Constructor for the ObservationGroup class.
+
+        :param site: The first site of the group.
+        """
+        self.sites = [site]
+        self.bbox = list(site.aoi) if site.aoi else None
+
+    def is_single(self) -> bool:
+        return len(self.sites) == 1
+
+    def get_markers(self) -> List[LocationMarker]:
+        return [marker for site in self.sites for marker in site.markers]
+
+    def merged_bbox(self, aoi: List[float]) -> List[float]:
+        return [min(self.bbox[0], aoi[0]), min(self.bbox[1], aoi[1]),
+                max(self.bbox[2], aoi[2]), max(self.bbox[3], aoi[3])]
+
+    def add(self, site: ObservationSite):
+        self.bbox = self.merged_bbox(site.aoi)
+        self.sites.append(site)
+
+
+class ObservationPlanner:
+    """
+    Plans the renders of an observe run so that markers close to each other share one render.
+
+    Markers with the same quantized AOI form a site. Sites whose AOIs overlap or lie within
+    `max_distance` degrees of a group join that group, as long as the group's render stays within
+    `max_pixels` on each side at the resolution of a single marker tile.
+    """
+
+    def __init__(self, image_fetcher: ImageFetcher, max_distance: float = 0.005, tile_size: int = 512,
+                 max_pixels: int = 2500, quantum: float = 0.0001):
+        """
+        Initialize the planner.
+
+        :param image_fetcher: ImageFetcher used to build marker AOIs.
+        :param max_distance: Maximum gap in degrees between a site and a group for them to be merged.
+        :param tile_size: Pixel size of a single marker image.
+        :param max_pixels: Maximum width or height of a group render (the Process API limit is 2500).
+        :param quantum: Grid size in degrees used to detect identical AOIs.
+        """
+        self.image_fetcher = image_fetcher
+        self.max_distance = max_distance
+        self.tile_size = tile_size
+        self.max_pixels = max_pixels
+        self.quantum = quantum
+
+    def get_degrees_per_pixel(self) -> float:
+        return 2 * self.image_fetcher.buffer / self.tile_size
+
+    def get_site_key(self, coordinate: Coordinate) -> Tuple[int, int]:
+        """
+        Quantize a coordinate to the grid of `quantum` degrees.
+
+        :param coordinate: The coordinate of a marker.
+        :return: The quantized center as grid indices.
+        :raises ValueError: If the coordinate is not a valid number.
+        """
+        return (round(float(coordinate.get_longitude()) / self.quantum),
+                round(float(coordinate.get_latitude()) / self.quantum))
+
+    def get_aoi(self, coordinate: Coordinate) -> List[float]:
+        """
+        Build the AOI of a marker around its quantized center, the AOI its site is rendered and cached with.
+
+        Both observation modes use this AOI, so they share cached renders and crop the same tile.
+
+        :param coordinate: The coordinate of a marker.
+        :return: Bounding box as [min_lon, min_lat, max_lon, max_lat].
+        :raises ValueError: If the coordinate is invalid.
+        """
+        key = self.get_site_key(coordinate)
+        return self.image_fetcher.build_aoi(str(key[0] * self.quantum), str(key[1] * self.quantum))
+
+    def plan(self, markers: List[LocationMarker]) -> List[ObservationGroup]:
+        """
+        Group markers into sites and sites into render groups.
+
+        :param markers: The markers to observe.
+        :return: The render groups. Markers with invalid coordinates get a single-site group with no AOI.
+        """
+        sites: Dict[Tuple[int, int], ObservationSite] = {}
+        groups: List[ObservationGroup] = []
+        for marker in markers:
+            coordinate = marker.get_coordinate()
+            try:
+                key = self.get_site_key(coordinate)
+                aoi = self.get_aoi(coordinate)
+            except ValueError:
+                # Leave the error to the per-marker fetch so it is reported for this marker.
+                site = ObservationSite(None, coordinate, None)
+                site.markers.append(marker)
+                groups.append(ObservationGroup(site))
+                continue
+
+            site = sites.get(key)
+            if site is None:
+                site = sites[key] = ObservationSite(key, coordinate, aoi)
+            site.markers.append(marker)
+
+        # Sweep sites from west to east so nearby sites meet the same open groups.
+        max_span = self.max_pixels * self.get_degrees_per_pixel()
+        spatial_groups: List[ObservationGroup] = []
+        for site in sorted(sites.values(), key=lambda site: site.aoi[0]):
+            for group in spatial_groups:
+                if self._is_near(group.bbox, site.aoi):
+                    merged = group.merged_bbox(site.aoi)
+                    if merged[2] - merged[0] <= max_span and merged[3] - merged[1] <= max_span:
+                        group.add(site)
+                        break
+            else:
+                spatial_groups.append(ObservationGroup(site))
+
+        return groups + spatial_groups
+
+    def _is_near(self, bbox: List[float], aoi: List[float]) -> bool:
+        return (aoi[0] <= bbox[2] + self.max_distance and bbox[0] <= aoi[2] + self.max_distance and
+                aoi[1] <= bbox[3] + self.max_distance and bbox[1] <= aoi[3] + self.max_distance)
+
+    def get_render(self, group: ObservationGroup) -> Tuple[List[float], int, int]:
+        """
+        Compute the bbox and pixel size of a group render at the resolution of a single marker tile.
+
+        The bbox is extended east and south so that it spans a whole number of pixels.
+
+        :param group: The group to render.
+        :return: (bbox, width, height).
+        """
+        degrees_per_pixel = self.get_degrees_per_pixel()
+        min_lon, min_lat, max_lon, max_lat = group.bbox
+        width = min(math.ceil(round((max_lon - min_lon) / degrees_per_pixel, 6)), self.max_pixels)
+        height = min(math.ceil(round((max_lat - min_lat) / degrees_per_pixel, 6)), self.max_pixels)
+        bbox = [min_lon, max_lat - height * degrees_per_pixel, min_lon + width * degrees_per_pixel, max_lat]
+        return bbox, width, height
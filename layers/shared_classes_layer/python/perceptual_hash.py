@@ -0,0 +1,46 @@
+import numpy as np
+
+# Luma weights of ITU-R BT.601, used to reduce RGB images to grayscale.
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def dhash(pixels: np.ndarray, hash_size: int = 8) -> str:
+    """
+    Compute the difference hash of an image.
+
+    The image is reduced to grayscale and area-averaged to hash_size rows by hash_size + 1 columns.
+    Each bit tells whether a cell is brighter than its right neighbour, so the hash survives
+    rescaling, recompression and uniform brightness changes.
+
+    :param pixels: Image array of shape (height, width) or (height, width, channels).
+    :param hash_size: Number of rows of the hash. The hash has hash_size ** 2 bits.
+    :return: The hash as a hexadecimal string.
+    """
+    gray = pixels.astype(np.float32)
+    if gray.ndim == 3:
+        gray = gray[..., :3] @ _LUMA if gray.shape[2] >= 3 else gray.mean(axis=2)
+    cells = _area_resize(gray, hash_size, hash_size + 1)
+    bits = (cells[:, 1:] > cells[:, :-1]).ravel()
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(first: str, second: str) -> int:
+    """
+    Count the bits that differ between two hashes of the same size.
+
+    :param first: Hexadecimal hash.
+    :param second: Hexadecimal hash.
+    :return: The number of differing bits.
+    """
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+def _area_resize(gray: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """
+    Average a grayscale image over a rows x cols grid of nearly equal cells.
+    """
+    row_starts = np.linspace(0, gray.shape[0], rows + 1).astype(int)[:-1]
+    col_starts = np.linspace(0, gray.shape[1], cols + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(gray, row_starts, axis=0), col_starts, axis=1)
+    counts = np.outer(np.diff(np.append(row_starts, gray.shape[0])), np.diff(np.append(col_starts, gray.shape[1])))
+    return sums / counts
@@ -0,0 +1,323 @@
+import io
+import struct
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # The layer installs Pillow; decode_png() falls back to its NumPy decoder.
+    PILImage = None
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# TIFF tags, field types and sample formats needed to read the Process API output.
+_TIFF_TAGS = {
+    256: "width", 257: "height", 258: "bits_per_sample", 259: "compression", 273: "strip_offsets",
+    277: "samples_per_pixel", 278: "rows_per_strip", 279: "strip_byte_counts", 284: "planar_configuration",
+    317: "predictor", 322: "tile_width", 323: "tile_length", 324: "tile_offsets", 325: "tile_byte_counts",
+    339: "sample_format",
+}
+_TIFF_FIELD_TYPES = {1: "B", 3: "H", 4: "I", 16: "Q"}
+_TIFF_SAMPLE_KINDS = {1: "u", 2: "i", 3: "f"}
+
+# Samples per pixel for the PNG colour types we read and write.
+_PNG_CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+_PNG_COLOR_TYPES = {channels: color_type for color_type, channels in _PNG_CHANNELS.items()}
+
+# Pillow modes of the 8-bit PNG colour types above.
+_PILLOW_MODES = ("L", "RGB", "LA", "RGBA")
+
+
+def decode_png(data: bytes) -> np.ndarray:
+    """
+    Decode an 8-bit PNG into a (height, width, channels) uint8 array.
+
+    Provider PNGs use the Average and Paeth filters, which the NumPy decoder can only reverse byte by
+    byte in Python, so Pillow's decoder is used when it is installed.
+
+    :param data: PNG file contents.
+    :return: The decoded pixels.
+    :raises ValueError: If the data is not a PNG or uses an unsupported layout.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Data is not a PNG image.")
+    if PILImage is not None:
+        return _decode_png_pillow(data)
+
+    offset = len(PNG_SIGNATURE)
+    header = None
+    idat = []
+    while offset < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        chunk = data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+        if chunk_type == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif chunk_type == b"IDAT":
+            idat.append(chunk)
+        elif chunk_type == b"IEND":
+            break
+
+    if header is None:
+        raise ValueError("PNG is missing its IHDR chunk.")
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if bit_depth != 8 or color_type not in _PNG_CHANNELS or interlace:
+        raise ValueError(f"Unsupported PNG layout: bit depth {bit_depth}, colour type {color_type}, interlace {interlace}.")
+
+    channels = _PNG_CHANNELS[color_type]
+    stride = width * channels
+    raw = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(height, stride + 1)
+    filters = raw[:, 0]
+    rows = raw[:, 1:]
+
+    pixels = np.empty((height, stride), dtype=np.uint8)
+    previous = np.zeros(stride, dtype=np.uint8)
+    for y in range(height):
+        row = rows[y]
+        kind = filters[y]
+        if kind == 0:
+            current = row
+        elif kind == 1:
+            current = np.cumsum(row.reshape(width, channels), axis=0, dtype=np.uint8).reshape(stride)
+        elif kind == 2:
+            current = row + previous
+        elif kind in (3, 4):
+            current = _unfilter_sequential(row, previous, channels, kind)
+        else:
+            raise ValueError(f"Invalid PNG filter type {kind} in row {y}.")
+        pixels[y] = current
+        previous = pixels[y]
+
+    return pixels.reshape(height, width, channels)
+
+
+def _decode_png_pillow(data: bytes) -> np.ndarray:
+    with PILImage.open(io.BytesIO(data)) as image:
+        if image.mode not in _PILLOW_MODES:
+            raise ValueError(f"Unsupported PNG layout: mode {image.mode}.")
+        pixels = np.array(image)
+    return pixels.reshape(pixels.shape[0], pixels.shape[1], -1)
+
+
+def _unfilter_sequential(row: np.ndarray, previous: np.ndarray, channels: int, kind: int) -> np.ndarray:
+    """
+    Reverse the Average (3) and Paeth (4) filters, which depend on the already decoded left neighbour
+    and therefore cannot be vectorized along the row.
+    """
+    out = bytearray(row.tobytes())
+    up = previous.tobytes()
+    for i in range(len(out)):
+        left = out[i - channels] if i >= channels else 0
+        above = up[i]
+        if kind == 3:
+            predictor = (left + above) >> 1
+        else:
+            upper_left = up[i - channels] if i >= channels else 0
+            estimate = left + above - upper_left
+            distance_left = abs(estimate - left)
+            distance_above = abs(estimate - above)
+            distance_upper_left = abs(estimate - upper_left)
+            if distance_left <= distance_above and distance_left <= distance_upper_left:
+                predictor = left
+            elif distance_above <= distance_upper_left:
+                predictor = above
+            else:
+                predictor = upper_left
+        out[i] = (out[i] + predictor) & 0xFF
+    return np.frombuffer(bytes(out), dtype=np.uint8)
+
+
+def encode_png(pixels: np.ndarray, compression: int = 6) -> bytes:
+    """
+    Encode a (height, width[, channels]) uint8 array as a PNG.
+
+    :param pixels: The pixels to encode, with 1 to 4 channels.
+    :param compression: zlib compression level.
+    :return: PNG file contents.
+    :raises ValueError: If the array shape or dtype cannot be written as an 8-bit PNG.
+    """
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, np.newaxis]
+    height, width, channels = pixels.shape
+    if pixels.dtype != np.uint8 or channels not in _PNG_COLOR_TYPES:
+        raise ValueError(f"Cannot encode array of shape {pixels.shape} and dtype {pixels.dtype} as PNG.")
+
+    # Every row is written with filter type 0 (None).
+    raw = np.zeros((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, width * channels)
+    header = struct.pack(">IIBBBBB", width, height, 8, _PNG_COLOR_TYPES[channels], 0, 0, 0)
+    return b"".join([
+        PNG_SIGNATURE,
+        _png_chunk(b"IHDR", header),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compression)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+
+def _png_chunk(chunk_type: bytes, payload: bytes) -> bytes:
+    crc = zlib.crc32(payload, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", crc)
+
+
+def decode_tiff(data: bytes) -> np.ndarray:
+    """
+    Decode a single-image TIFF as returned by the Process API into a (height, width, bands) array.
+
+    Uncompressed images whose strips are stored back to back are returned as a read-only view over
+    `data` without copying. Deflate compressed images and tiled layouts are supported at the cost of
+    one copy.
+
+    :param data: TIFF file contents.
+    :return: The decoded samples with the dtype given by the file (e.g. uint8 or float32).
+    :raises ValueError: If the data is not a TIFF or uses an unsupported layout.
+    """
+    byte_order = {b"II": "<", b"MM": ">"}.get(data[:2])
+    if byte_order is None or struct.unpack(byte_order + "H", data[2:4])[0] != 42:
+        raise ValueError("Data is not a classic TIFF image.")
+
+    tags = _read_tiff_tags(data, byte_order)
+    width, height = tags["width"][0], tags["height"][0]
+    bands = tags.get("samples_per_pixel", [1])[0]
+    bits = tags.get("bits_per_sample", [8])[0]
+    kind = _TIFF_SAMPLE_KINDS.get(tags.get("sample_format", [1])[0])
+    compression = tags.get("compression", [1])[0]
+    predictor = tags.get("predictor", [1])[0]
+    if kind is None or tags.get("planar_configuration", [1])[0] != 1:
+        raise ValueError("Unsupported TIFF sample format or planar configuration.")
+    if compression not in (1, 8, 32946) or predictor not in (1, 2) or (predictor == 2 and kind == "f"):
+        raise ValueError(f"Unsupported TIFF compression {compression} with predictor {predictor}.")
+    dtype = np.dtype(f"{byte_order}{kind}{bits // 8}")
+
+    if "tile_offsets" in tags:
+        return _decode_tiff_tiles(data, tags, dtype, width, height, bands, compression, predictor)
+
+    offsets, counts = tags["strip_offsets"], tags["strip_byte_counts"]
+    expected = width * height * bands * dtype.itemsize
+    contiguous = all(offsets[i] + counts[i] == offsets[i + 1] for i in range(len(offsets) - 1))
+    if compression == 1 and predictor == 1 and contiguous:
+        return np.frombuffer(data, dtype=dtype, count=width * height * bands, offset=offsets[0]).reshape(height, width, bands)
+
+    raw = b"".join(_tiff_chunk(data, offset, count, compression) for offset, count in zip(offsets, counts))
+    pixels = np.frombuffer(raw[:expected], dtype=dtype).reshape(height, width, bands)
+    return _undo_tiff_predictor(pixels, predictor)
+
+
+def _read_tiff_tags(data: bytes, byte_order: str) -> dict:
+    """
+    Read the tags of the first image file directory that we know how to use.
+    """
+    ifd_offset = struct.unpack(byte_order + "I", data[4:8])[0]
+    entry_count = struct.unpack(byte_order + "H", data[ifd_offset:ifd_offset + 2])[0]
+    tags = {}
+    for index in range(entry_count):
+        entry = ifd_offset + 2 + index * 12
+        tag, field_type, count = struct.unpack(byte_order + "HHI", data[entry:entry + 8])
+        name = _TIFF_TAGS.get(tag)
+        code = _TIFF_FIELD_TYPES.get(field_type)
+        if name is None or code is None:
+            continue
+        size = struct.calcsize(code) * count
+        value_offset = entry + 8 if size <= 4 else struct.unpack(byte_order + "I", data[entry + 8:entry + 12])[0]
+        tags[name] = list(struct.unpack(f"{byte_order}{count}{code}", data[value_offset:value_offset + size]))
+    return tags
+
+
+def _tiff_chunk(data: bytes, offset: int, count: int, compression: int) -> bytes:
+    chunk = data[offset:offset + count]
+    return chunk if compression == 1 else zlib.decompress(chunk)
+
+
+def _decode_tiff_tiles(data: bytes, tags: dict, dtype: np.dtype, width: int, height: int, bands: int,
+                       compression: int, predictor: int) -> np.ndarray:
+    tile_width, tile_length = tags["tile_width"][0], tags["tile_length"][0]
+    tiles_across = -(-width // tile_width)
+    pixels = np.empty((-(-height // tile_length) * tile_length, tiles_across * tile_width, bands), dtype=dtype)
+    for index, (offset, count) in enumerate(zip(tags["tile_offsets"], tags["tile_byte_counts"])):
+        tile = np.frombuffer(_tiff_chunk(data, offset, count, compression), dtype=dtype)
+        tile = _undo_tiff_predictor(tile[:tile_width * tile_length * bands].reshape(tile_length, tile_width, bands), predictor)
+        row, col = divmod(index, tiles_across)
+        pixels[row * tile_length:(row + 1) * tile_length, col * tile_width:(col + 1) * tile_width] = tile
+    return pixels[:height, :width]
+
+
+def _undo_tiff_predictor(pixels: np.ndarray, predictor: int) -> np.ndarray:
+    if predictor == 2:
+        # Horizontal differencing: every sample is stored relative to its left neighbour.
+        return np.cumsum(pixels, axis=1, dtype=pixels.dtype)
+    return pixels
+
+
+def to_display_uint8(pixels: np.ndarray, gain: float = 2.5) -> np.ndarray:
+    """
+    Convert reflectance samples to display-ready uint8 values, the same way the PNG evalscript does.
+    uint8 input is returned unchanged.
+
+    :param pixels: Array of reflectances in [0, 1], or uint8 values.
+    :param gain: Brightness gain applied before scaling.
+    :return: uint8 array.
+    """
+    if pixels.dtype == np.uint8:
+        return pixels
+    return (np.clip(pixels * gain, 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+
+
+def pixel_window(outer_bbox: List[float], inner_bbox: List[float], outer_size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    Compute the pixel window of an inner bbox inside an image rendered for an outer bbox.
+
+    Both bboxes are [min_lon, min_lat, max_lon, max_lat]. Rows run from north to south.
+
+    :param outer_bbox: Bounding box the image was rendered for.
+    :param inner_bbox: Bounding box to locate inside the image.
+    :param outer_size: (width, height) of the image in pixels.
+    :return: (row, col, height, width) of the window.
+    """
+    width, height = outer_size
+    degrees_per_col = (outer_bbox[2] - outer_bbox[0]) / width
+    degrees_per_row = (outer_bbox[3] - outer_bbox[1]) / height
+    col = int(round((inner_bbox[0] - outer_bbox[0]) / degrees_per_col))
+    row = int(round((outer_bbox[3] - inner_bbox[3]) / degrees_per_row))
+    window_width = int(round((inner_bbox[2] - inner_bbox[0]) / degrees_per_col))
+    window_height = int(round((inner_bbox[3] - inner_bbox[1]) / degrees_per_row))
+    return row, col, window_height, window_width
+
+
+def crop(pixels: np.ndarray, row: int, col: int, height: int, width: int) -> np.ndarray:
+    """
+    Crop a window out of an image, clamping it to the image bounds. The result is a view, not a copy.
+
+    :param pixels: Image array with rows first.
+    :param row: Top row of the window.
+    :param col: Left column of the window.
+    :param height: Window height in pixels.
+    :param width: Window width in pixels.
+    :return: The cropped view.
+    """
+    row = min(max(row, 0), max(pixels.shape[0] - height, 0))
+    col = min(max(col, 0), max(pixels.shape[1] - width, 0))
+    return pixels[row:row + height, col:col + width]
+
+
+def downscale(pixels: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Shrink an image by an integer factor, averaging each factor x factor block of pixels.
+
+    Rows and columns that do not fill a whole block are dropped.
+
+    :param pixels: Image array of shape (height, width) or (height, width, channels).
+    :param factor: Downscale factor, at least 1.
+    :return: The downscaled image, with the input dtype.
+    """
+    if factor <= 1:
+        return pixels
+    height = pixels.shape[0] // factor
+    width = pixels.shape[1] // factor
+    blocks = pixels[:height * factor, :width * factor].reshape(
+        (height, factor, width, factor) + pixels.shape[2:]
+    )
+    means = blocks.mean(axis=(1, 3))
+    if np.issubdtype(pixels.dtype, np.integer):
+        means = np.rint(means)
+    return means.astype(pixels.dtype)
@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# Status codes that signal a transient provider problem worth retrying.
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Status codes that mean we are sending too much and should slow down.
+THROTTLE_STATUSES = (429, 503)
+
+
+class RateLimiter:
+    """
+    A client-side limiter shared by all concurrent requests to one provider.
+
+    Requests are paced by a token bucket (`rate` requests per second with bursts of up to `burst`),
+    and the number of requests in flight is bounded by an AIMD window. The window grows by
+    roughly one slot per window of successful requests and halves whenever the provider throttles
+    us, down to `min_concurrency`.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 10, max_concurrency: int = 8, min_concurrency: int = 1):
+        """
+        Initialize the limiter.
+
+        :param rate: Sustained requests per second.
+        :param burst: Maximum number of requests sent back to back.
+        :param max_concurrency: Upper bound for the concurrency window.
+        :param min_concurrency: Lower bound for the concurrency window.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._stats = {"requests": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+
+    def _take_token(self) -> float:
+        """
+        Take a token if one is available. Must be called with the condition held.
+
+        :return: 0 if a token was taken, otherwise the seconds until the next token.
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Block until a token and a concurrency slot are available.
+        """
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                if self._in_flight < max(int(self._limit), self.min_concurrency):
+                    wait = self._take_token()
+                    if not wait:
+                        break
+                else:
+                    wait = None
+                self._condition.wait(wait)
+            self._in_flight += 1
+            self._stats["requests"] += 1
+            self._stats["wait_seconds"] += time.monotonic() - started
+
+    def release(self, throttled: bool = False):
+        """
+        Release a concurrency slot and adjust the window.
+
+        :param throttled: Whether the provider throttled the request.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+                self._stats["throttled"] += 1
+            else:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold a slot for the duration of the block. Call `throttled()` on the yielded handle when the
+        provider throttles the request.
+        """
+        self.acquire()
+        handle = _SlotHandle()
+        try:
+            yield handle
+        finally:
+            self.release(handle.was_throttled)
+
+    def record_retry(self):
+        with self._condition:
+            self._stats["retries"] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return a snapshot of the limiter counters and the current concurrency window.
+
+        :return: Dictionary of counters.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["concurrency_limit"] = max(int(self._limit), self.min_concurrency)
+            stats["in_flight"] = self._in_flight
+        return stats
+
+
+class _SlotHandle:
+    def __init__(self):
+        self.was_throttled = False
+
+    def throttled(self):
+        self.was_throttled = True
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff that honors the provider's Retry-After header.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        Initialize the policy.
+
+        :param max_attempts: Total number of attempts, including the first one.
+        :param base_delay: Backoff ceiling for the first retry, in seconds.
+        :param max_delay: Upper bound for any single delay, in seconds.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Compute how long to wait before the next attempt.
+
+        :param attempt: Zero-based number of the attempt that just failed.
+        :param retry_after: Value of the Retry-After response header, if any.
+        :return: Delay in seconds.
+        """
+        requested = parse_retry_after(retry_after)
+        if requested is not None:
+            return min(requested, self.max_delay)
+        # Full jitter spreads out retries from concurrent workers.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date.
+
+    :param value: Header value.
+    :return: Delay in seconds, or None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
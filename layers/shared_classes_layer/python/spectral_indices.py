@@ -0,0 +1,173 @@
+import threading
+import time
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from image_fetcher import SPECTRAL_BANDS
+
+NDVI = "ndvi"
+NDBI = "ndbi"
+NDWI = "ndwi"
+
+# Normalized difference indices, (first - second) / (first + second), by their two Sentinel-2 bands.
+INDEX_BANDS = {
+    NDVI: ("B08", "B04"),  # vegetation: near infrared against red
+    NDBI: ("B11", "B08"),  # built-up area: shortwave infrared against near infrared
+    NDWI: ("B03", "B08"),  # open water: green against near infrared
+}
+
+# Change of the mean index between two observations that counts as significant. A negative
+# threshold is crossed by a drop, a positive one by a rise.
+DEFAULT_THRESHOLDS = {NDVI: -0.1, NDBI: 0.1, NDWI: 0.1}
+
+# What crossing the threshold of each index means on the ground.
+CHANGE_NAMES = {NDVI: "Vegetation loss", NDBI: "Construction", NDWI: "Flooding"}
+
+
+class IndexStats(NamedTuple):
+    """
+    Summary of one spectral index over the valid pixels of an image.
+    """
+    mean: float
+    p10: float
+    p90: float
+    valid_fraction: float
+
+    def to_json(self) -> Dict[str, str]:
+        """
+        Converts the statistics to a JSON-compatible dictionary of strings, like the coordinates.
+        """
+        return {"mean": f"{self.mean:.4f}", "p10": f"{self.p10:.4f}", "p90": f"{self.p90:.4f}",
+                "valid": f"{self.valid_fraction:.3f}"}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, str]) -> 'IndexStats':
+        """
+        Creates IndexStats from a dictionary written by to_json().
+        """
+        return cls(float(data["mean"]), float(data["p10"]), float(data["p90"]), float(data["valid"]))
+
+
+class IndexChange(NamedTuple):
+    """
+    The change of the spectral indices between two observations.
+    """
+    deltas: Dict[str, float]
+    changes: List[str]
+
+
+def compute_indices(pixels: np.ndarray, bands: Sequence[str] = SPECTRAL_BANDS,
+                    indices: Dict[str, tuple] = None) -> Dict[str, np.ndarray]:
+    """
+    Compute normalized difference indices for every pixel in one vectorized pass.
+
+    :param pixels: Reflectance array of shape (height, width, bands).
+    :param bands: Band name of every channel of `pixels`.
+    :param indices: Index names and their (first, second) bands. Defaults to INDEX_BANDS.
+    :return: One float32 array of shape (height, width) per index, NaN where the pixel has no data.
+    """
+    indices = indices or INDEX_BANDS
+    channels = {band: channel for channel, band in enumerate(bands)}
+    data = pixels.astype(np.float32, copy=False)
+    first = data[..., [channels[pair[0]] for pair in indices.values()]]
+    second = data[..., [channels[pair[1]] for pair in indices.values()]]
+    total = first + second
+    values = np.divide(first - second, total, out=np.full(total.shape, np.nan, dtype=np.float32),
+                       where=total > 0)
+    return {name: values[..., i] for i, name in enumerate(indices)}
+
+
+def summarize_indices(pixels: np.ndarray, bands: Sequence[str] = SPECTRAL_BANDS,
+                      indices: Dict[str, tuple] = None) -> Dict[str, IndexStats]:
+    """
+    Summarize the spectral indices of an image.
+
+    :param pixels: Reflectance array of shape (height, width, bands).
+    :param bands: Band name of every channel of `pixels`.
+    :param indices: Index names and their (first, second) bands. Defaults to INDEX_BANDS.
+    :return: IndexStats per index. Indices without any valid pixel are left out.
+    """
+    summary = {}
+    for name, values in compute_indices(pixels, bands, indices).items():
+        valid = values[~np.isnan(values)]
+        if not valid.size:
+            continue
+        p10, p90 = np.percentile(valid, [10, 90])
+        summary[name] = IndexStats(float(valid.mean()), float(p10), float(p90), valid.size / values.size)
+    return summary
+
+
+class IndexChangeDetector:
+    """
+    Decides from spectral index statistics whether an area changed in a way users care about.
+
+    Vegetation loss, construction and flooding barely change the RGB labels, but they move the mean
+    NDVI, NDBI and NDWI. A change is significant when the mean of an index moves past its threshold
+    between two observations and both observations have at least `min_valid_fraction` valid pixels.
+    """
+
+    def __init__(self, thresholds: Dict[str, float] = None, min_valid_fraction: float = 0.5,
+                 bands: Sequence[str] = SPECTRAL_BANDS):
+        """
+        Initialize the detector.
+
+        :param thresholds: Significant change of the mean per index. Defaults to DEFAULT_THRESHOLDS.
+        :param min_valid_fraction: Minimum ratio of valid pixels for an index to be compared.
+        :param bands: Bands fetched for the indices, in output order. The first three must be R, G, B.
+        """
+        self.thresholds = thresholds or dict(DEFAULT_THRESHOLDS)
+        self.min_valid_fraction = min_valid_fraction
+        self.bands = list(bands)
+        self._lock = threading.Lock()
+        self._stats = {"summaries": 0, "comparisons": 0, "significant": 0, "seconds": 0.0}
+
+    def summarize(self, pixels: np.ndarray) -> Dict[str, IndexStats]:
+        """
+        Summarize the spectral indices of an image fetched with `bands`.
+
+        :param pixels: Reflectance array of shape (height, width, bands).
+        :return: IndexStats per index.
+        """
+        start = time.perf_counter()
+        summary = summarize_indices(pixels, self.bands, {name: INDEX_BANDS[name] for name in self.thresholds})
+        with self._lock:
+            self._stats["summaries"] += 1
+            self._stats["seconds"] += time.perf_counter() - start
+        return summary
+
+    def compare(self, previous: Dict[str, IndexStats], current: Dict[str, IndexStats]) -> IndexChange:
+        """
+        Compare the index statistics of two observations of the same area.
+
+        :param previous: IndexStats per index of the earlier observation.
+        :param current: IndexStats per index of the later observation.
+        :return: The mean deltas of the indices valid in both, and a description of every significant change.
+        """
+        deltas = {}
+        changes = []
+        for name, threshold in self.thresholds.items():
+            before, after = previous.get(name), current.get(name)
+            if not before or not after or min(before.valid_fraction, after.valid_fraction) < self.min_valid_fraction:
+                continue
+            delta = after.mean - before.mean
+            deltas[name] = delta
+            if (threshold < 0 and delta <= threshold) or (threshold > 0 and delta >= threshold):
+                changes.append(f"{CHANGE_NAMES.get(name, name)} ({name.upper()} {delta:+.3f})")
+
+        with self._lock:
+            self._stats["comparisons"] += 1
+            self._stats["significant"] += int(bool(changes))
+        return IndexChange(deltas, changes)
+
+    def is_significant(self, change: IndexChange) -> bool:
+        return bool(change.changes)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the number of summaries, comparisons and significant changes, and the summary time in seconds.
+
+        :return: Dictionary of counters.
+        """
+        with self._lock:
+            return dict(self._stats)
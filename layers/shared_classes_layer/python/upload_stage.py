@@ -0,0 +1,136 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Upper bound for the image bytes waiting in or being sent by the stage.
+MAX_PENDING_BYTES = 32 * 1024 * 1024
+
+
+class UploadResult(NamedTuple):
+    """
+    The outcome of a single upload. Exactly one of url and error is set.
+    """
+    object_key: str
+    url: Optional[str]
+    size: int
+    seconds: float
+    error: Optional[str]
+
+
+class UploadStage:
+    """
+    Uploads in-memory images on a bounded thread pool so the caller can fetch the next image meanwhile.
+
+    submit() returns immediately with a Future for the image URL, unless the bytes already queued
+    exceed `max_pending_bytes`, in which case it blocks until enough uploads have finished. A single
+    image larger than the budget is still accepted once nothing else is pending. Every finished upload
+    is also put on the completion queue together with its timing.
+    """
+
+    def __init__(self, upload: Callable[[bytes, str], str], max_workers: int = 4,
+                 max_pending_bytes: int = MAX_PENDING_BYTES):
+        """
+        Initialize the stage.
+
+        :param upload: Callable uploading (data, object_key) and returning the URL of the object.
+        :param max_workers: Maximum number of concurrent uploads.
+        :param max_pending_bytes: Maximum number of bytes queued or in flight before submit() blocks.
+        """
+        self.upload = upload
+        self.max_workers = max_workers
+        self.max_pending_bytes = max_pending_bytes
+        self.completed: "queue.Queue[UploadResult]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._condition = threading.Condition()
+        self._pending_bytes = 0
+        self._pending = 0
+        self._timings: List[float] = []
+        self._stats = {"uploads": 0, "failed": 0, "bytes": 0, "backpressure_seconds": 0.0, "peak_pending_bytes": 0}
+
+    def submit(self, data: bytes, object_key: str) -> Future:
+        """
+        Queue an upload, blocking while the pending bytes are over budget.
+
+        :param data: The data to upload.
+        :param object_key: The key to upload the data to.
+        :return: A Future resolving to the URL of the uploaded object.
+        """
+        size = len(data)
+        started = time.perf_counter()
+        with self._condition:
+            while self._pending and self._pending_bytes + size > self.max_pending_bytes:
+                self._condition.wait()
+            self._pending += 1
+            self._pending_bytes += size
+            self._stats["backpressure_seconds"] += time.perf_counter() - started
+            self._stats["peak_pending_bytes"] = max(self._stats["peak_pending_bytes"], self._pending_bytes)
+        try:
+            return self._executor.submit(self._upload, data, object_key)
+        except Exception:
+            self._finish(UploadResult(object_key, None, size, 0.0, "not submitted"))
+            raise
+
+    def _upload(self, data: bytes, object_key: str) -> str:
+        size = len(data)
+        started = time.perf_counter()
+        try:
+            url = self.upload(data, object_key)
+        except Exception as e:
+            self._finish(UploadResult(object_key, None, size, time.perf_counter() - started, str(e)))
+            raise
+        self._finish(UploadResult(object_key, url, size, time.perf_counter() - started, None))
+        return url
+
+    def _finish(self, result: UploadResult):
+        with self._condition:
+            self._pending -= 1
+            self._pending_bytes -= result.size
+            if result.error:
+                self._stats["failed"] += 1
+            else:
+                self._stats["uploads"] += 1
+                self._stats["bytes"] += result.size
+                self._timings.append(result.seconds)
+            # Queued before the pending count is released, so drain() cannot return without it.
+            self.completed.put(result)
+            self._condition.notify_all()
+
+    def drain(self) -> List[UploadResult]:
+        """
+        Wait until every submitted upload has finished and empty the completion queue.
+
+        :return: The results completed since the last drain, in completion order.
+        """
+        with self._condition:
+            while self._pending:
+                self._condition.wait()
+        results = []
+        while True:
+            try:
+                results.append(self.completed.get_nowait())
+            except queue.Empty:
+                return results
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the upload counters and per-upload latency percentiles in seconds.
+
+        :return: Dictionary of counters.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            timings = sorted(self._timings)
+            stats["pending"] = self._pending
+        stats["p50_seconds"] = timings[len(timings) // 2] if timings else 0.0
+        stats["p95_seconds"] = timings[min(len(timings) - 1, int(len(timings) * 0.95))] if timings else 0.0
+        stats["max_seconds"] = timings[-1] if timings else 0.0
+        stats["total_seconds"] = sum(timings)
+        return stats
+
+    def close(self):
+        """
+        Wait for pending uploads and release the worker threads.
+        """
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,64 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The Lambda functions import the shared layer modules by their flat names.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "layers", "shared_classes_layer", "python"))
+
+
+class LocalServer:
+    """
+    A local HTTP/1.1 server answering each request with the next response queued for its path.
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        self.drop_after_response = False
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self._answer()
+
+            def do_POST(self):
+                self._answer()
+
+            def _answer(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.requests.append((self.command, self.path, dict(self.headers), body))
+                status, headers, data = server.responses[self.path].pop(0)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                # Close the socket without announcing it, like a server dropping an idle keep-alive connection.
+                self.close_connection = server.drop_after_response
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def respond(self, path: str, status: int = 200, body: bytes = b"", headers: dict = None):
+        self.responses.setdefault(path, []).append((status, headers or {}, body))
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def local_server():
+    server = LocalServer()
+    yield server
+    server.close()
@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from coordinate import Coordinate
+from image import Image
+from image_fetcher import ConnectionPool, ImageFetcher
+from image_service import ImageService
+from location_marker import LocationMarker
+from observation_engine import MODE_ASYNC, MODE_SEQUENTIAL, ObservationEngine
+from rate_limiter import RateLimiter, RetryPolicy
+
+CATALOG_PATH = "/api/v1/catalog/1.0.0/search"
+
+
+def catalog_page(*datetimes, next_page=None) -> bytes:
+    context = {"next": next_page} if next_page is not None else {}
+    return json.dumps({"features": [{"properties": {"datetime": acquired}} for acquired in datetimes],
+                       "context": context}).encode()
+
+
+@pytest.fixture
+def fetcher(local_server, request):
+    local_server.respond("/oauth/token", body=json.dumps({"access_token": "token", "expires_in": 3600}).encode())
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    fetcher = ImageFetcher(f"catalog-client-{request.node.name}", "secret", pool=pool, rate_limiter=RateLimiter(),
+                           retry_policy=RetryPolicy(max_attempts=1))
+    yield fetcher
+    pool.close()
+
+
+class UnusedDetection:
+    """
+    Stands in for the ObjectDetectionService, whose detector skipped markers never reach.
+    """
+
+    def get_batch_size(self) -> int:
+        return 1
+
+    def get_rekognition_calls(self) -> int:
+        return 0
+
+
+def observed_marker(last_acquisition: str) -> LocationMarker:
+    image = Image("2024-01-01", "https://bucket/site.png", "site.png", "bucket")
+    marker = LocationMarker(Coordinate("10.0", "50.0"), current_image=image, historical_images=[image],
+                            last_acquisition=last_acquisition)
+    marker.set_marker_id("marker-1")
+    return marker
+
+
+def catalog_requests(local_server):
+    return [json.loads(body) for _, path, _, body in local_server.requests if path == CATALOG_PATH]
+
+
+def test_catalog_search_follows_the_next_token(local_server, fetcher):
+    local_server.respond(CATALOG_PATH, body=catalog_page("2024-01-03T10:00:00Z", "2024-01-01T10:00:00Z",
+                                                         next_page=100))
+    local_server.respond(CATALOG_PATH, body=catalog_page("2024-01-05T10:00:00Z", "2024-01-02T10:00:00Z"))
+
+    assert fetcher.get_latest_acquisition("2024-01-01", "2024-01-06", aoi=[0, 0, 1, 1]) == "2024-01-05T10:00:00Z"
+
+    first, second = catalog_requests(local_server)
+    assert "next" not in first
+    assert second["next"] == 100
+    assert second["bbox"] == [0, 0, 1, 1]
+
+
+def test_empty_catalog_has_no_acquisition(local_server, fetcher):
+    local_server.respond(CATALOG_PATH, body=catalog_page())
+
+    assert fetcher.get_latest_acquisition("2024-01-01", "2024-01-06", aoi=[0, 0, 1, 1]) is None
+
+
+@pytest.mark.parametrize("mode", [MODE_SEQUENTIAL, MODE_ASYNC])
+def test_marker_without_a_new_acquisition_is_skipped(local_server, fetcher, mode):
+    local_server.respond(CATALOG_PATH, body=catalog_page("2024-01-05T10:00:00Z"))
+    engine = ObservationEngine(ImageService(None, "bucket", fetcher), UnusedDetection(), None)
+
+    report = engine.run([observed_marker("2024-01-05T10:00:00Z")], mode=mode)
+
+    assert report.skipped == ["marker-1"]
+    assert [path for _, path, _, _ in local_server.requests if path != "/oauth/token"] == [CATALOG_PATH]
+
+
+def test_new_acquisition_is_recorded(local_server, fetcher):
+    local_server.respond(CATALOG_PATH, body=catalog_page("2024-01-06T10:00:00Z"))
+    engine = ObservationEngine(ImageService(None, "bucket", fetcher), None, None)
+
+    acquisition = engine._search_acquisition(observed_marker("2024-01-05T10:00:00Z"),
+                                             engine.image_service.get_latest_acquisition)
+
+    assert acquisition == "2024-01-06T10:00:00Z"
+
+
+def test_failed_catalog_search_observes_with_the_previous_acquisition(local_server, fetcher):
+    local_server.respond(CATALOG_PATH, status=500)
+    engine = ObservationEngine(ImageService(None, "bucket", fetcher), None, None)
+
+    acquisition = engine._search_acquisition(observed_marker("2024-01-05T10:00:00Z"),
+                                             engine.image_service.get_latest_acquisition)
+
+    assert acquisition == "2024-01-05T10:00:00Z"
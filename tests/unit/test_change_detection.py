@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from change_detection import ChangeDetector
+
+
+def test_identical_images_have_no_change():
+    detector = ChangeDetector()
+    pixels = np.full((4, 4, 3), 120, np.uint8)
+
+    result = detector.compare(pixels, pixels.copy())
+
+    assert result.score == 0.0
+    assert not result.mask.any()
+    assert result.band_differences == [0.0, 0.0, 0.0]
+    assert not detector.is_significant(result)
+
+
+def test_changed_pixel_ratio_and_mask():
+    detector = ChangeDetector(pixel_threshold=0.1, score_threshold=0.2)
+    previous = np.zeros((4, 5, 3), np.uint8)
+    current = previous.copy()
+    current[0, 0, 0] = 255  # Changed in one band.
+    current[1, 2] = 51  # Changed in every band, by 0.2.
+    current[3, 4, 2] = 26  # Just above the threshold.
+    current[2, 1, 1] = 25  # Just below the threshold.
+
+    result = detector.compare(previous, current)
+
+    expected_mask = np.zeros((4, 5), bool)
+    expected_mask[0, 0] = expected_mask[1, 2] = expected_mask[3, 4] = True
+    np.testing.assert_array_equal(result.mask, expected_mask)
+    assert result.score == pytest.approx(3 / 20)
+    assert result.band_differences == pytest.approx([(1.0 + 0.2) / 20, (0.2 + 25 / 255) / 20,
+                                                     (0.2 + 26 / 255) / 20])
+    assert not detector.is_significant(result)
+
+
+def test_change_is_symmetric_for_uint8():
+    # The difference is taken in float, so a darker current image does not wrap around.
+    detector = ChangeDetector()
+    bright = np.full((2, 2, 3), 200, np.uint8)
+    dark = np.full((2, 2, 3), 10, np.uint8)
+
+    assert detector.compare(bright, dark).score == detector.compare(dark, bright).score == 1.0
+
+
+def test_float_reflectances_use_the_unit_range():
+    detector = ChangeDetector(pixel_threshold=0.1)
+    previous = np.full((2, 2, 1), 0.3, np.float32)
+    current = previous.copy()
+    current[0, 0, 0] = 0.45
+
+    result = detector.compare(previous, current)
+
+    assert result.score == pytest.approx(0.25)
+    assert result.mask[0, 0] and result.mask.sum() == 1
+
+
+def test_images_of_different_sizes_are_fully_changed():
+    detector = ChangeDetector()
+
+    result = detector.compare(np.zeros((4, 4, 3), np.uint8), np.zeros((2, 3, 3), np.uint8))
+
+    assert result.score == 1.0
+    assert result.mask.shape == (2, 3) and result.mask.all()
+    assert detector.is_significant(result)
+
+
+def test_stats_count_comparisons_and_significant_changes():
+    detector = ChangeDetector(score_threshold=0.5)
+    zeros = np.zeros((2, 2, 3), np.uint8)
+    detector.compare(zeros, zeros)
+    detector.compare(zeros, np.full((2, 2, 3), 255, np.uint8))
+
+    stats = detector.get_stats()
+
+    assert (stats["comparisons"], stats["significant"]) == (2, 1)
+    assert stats["mean_seconds"] == pytest.approx(stats["seconds"] / 2)
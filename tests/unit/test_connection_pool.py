@@ -0,0 +1,61 @@
+import time
+
+from image_fetcher import ConnectionPool
+
+
+def test_requests_reuse_one_connection(local_server):
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    for body in (b"first", b"second", b"third"):
+        local_server.respond("/ping", body=body)
+
+    assert [pool.request("GET", "/ping").read() for _ in range(3)] == [b"first", b"second", b"third"]
+
+    stats = pool.get_stats()
+    assert stats["connections_created"] == 1
+    assert stats["reused"] == 2
+    assert stats["idle"] == 1
+    pool.close()
+
+
+def test_dropped_connection_is_retried_on_a_new_one(local_server):
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    local_server.drop_after_response = True
+    local_server.respond("/ping", body=b"first")
+    local_server.respond("/ping", body=b"second")
+
+    assert pool.request("GET", "/ping").read() == b"first"
+    time.sleep(0.1)  # let the server close the idle socket
+    assert pool.request("GET", "/ping").read() == b"second"
+
+    stats = pool.get_stats()
+    assert stats["connections_created"] == 2
+    assert stats["reconnects"] == 1
+    assert len(local_server.requests) == 2
+    pool.close()
+
+
+def test_unread_stream_closes_its_connection(local_server):
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    local_server.respond("/image", body=b"x" * 1024)
+
+    with pool.stream("GET", "/image") as response:
+        assert response.read(10) == b"x" * 10
+
+    assert pool.get_stats()["idle"] == 0
+    pool.close()
+
+
+def test_full_pool_discards_extra_connections(local_server):
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False, max_size=1)
+    local_server.respond("/a", body=b"a")
+    local_server.respond("/b", body=b"b")
+
+    with pool.stream("GET", "/a") as first, pool.stream("GET", "/b") as second:
+        first.read()
+        second.read()
+
+    stats = pool.get_stats()
+    assert stats["connections_created"] == 2
+    assert stats["idle"] == 1
+    assert stats["discarded"] == 1
+    pool.close()
@@ -0,0 +1,226 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from coordinate import Coordinate
+from data_service import DataService, MarkerConflictError
+from image import Image
+from location_marker import LocationMarker
+from marker_items import summary_key
+from rate_limiter import RetryPolicy
+
+
+class FakeTable:
+    """
+    Answers UpdateItem like DynamoDB, failing the condition for the first `conflicts` calls.
+    """
+
+    def __init__(self, stored: dict = None, conflicts: int = 0):
+        self.stored = stored
+        self.conflicts = conflicts
+        self.updates = []
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+        if self.conflicts:
+            self.conflicts -= 1
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": "failed"}},
+                              "UpdateItem")
+        return {"Attributes": {"version": self.stored["version"] + 1}}
+
+    def get_item(self, Key, ConsistentRead=False):
+        return {"Item": self.stored} if self.stored else {}
+
+
+class FakeResource:
+    """
+    Answers BatchWriteItem, leaving the requests `unprocessed` picks unprocessed and failing calls that `fail` picks.
+    """
+
+    def __init__(self, table: FakeTable = None, unprocessed=None, fail=None):
+        self.table = table
+        self.unprocessed = unprocessed or (lambda call, requests: [])
+        self.fail = fail or (lambda call, requests: False)
+        self.calls = []
+
+    def Table(self, name):
+        return self.table
+
+    def batch_write_item(self, RequestItems):
+        (requests,) = RequestItems.values()
+        self.calls.append(requests)
+        if self.fail(len(self.calls), requests):
+            raise ClientError({"Error": {"Code": "ValidationException", "Message": "invalid"}}, "BatchWriteItem")
+        return {"UnprocessedItems": {"markers": self.unprocessed(len(self.calls), requests)}}
+
+
+def stored_marker(version: int, **changes) -> dict:
+    marker = LocationMarker(Coordinate("10.0", "50.0"), name="site", status="observed",
+                            current_image=Image("2024-01-01", "https://bucket/site.png", "site.png", "bucket"), version=version)
+    marker.set_marker_id("marker-1")
+    item = marker.to_summary_json()
+    item.update(changes)
+    return item
+
+
+def loaded_marker(item: dict) -> LocationMarker:
+    marker = LocationMarker.from_json(item)
+    marker.mark_persisted()
+    return marker
+
+
+def test_update_is_conditioned_on_the_expected_version():
+    update = DataService._build_update("marker-1", {"name": "renamed"}, expected_version=3)
+
+    assert update["Key"] == summary_key("marker-1")
+    assert update["UpdateExpression"] == "SET #a0 = :a0 ADD #version :one"
+    assert update["ConditionExpression"] == "attribute_exists(#markerId) AND #version = :expected"
+    assert update["ExpressionAttributeNames"]["#a0"] == "name"
+    assert update["ExpressionAttributeValues"] == {":one": 1, ":a0": "renamed", ":expected": 3}
+
+
+def test_update_of_an_unversioned_item_accepts_a_missing_version():
+    update = DataService._build_update("marker-1", {"name": "renamed"}, expected_version=0)
+
+    assert update["ConditionExpression"] == \
+        "attribute_exists(#markerId) AND (attribute_not_exists(#version) OR #version = :expected)"
+
+
+def test_update_without_a_version_only_requires_the_marker_to_exist():
+    update = DataService._build_update("marker-1", {"name": "renamed"})
+
+    assert update["ConditionExpression"] == "attribute_exists(#markerId)"
+    assert ":expected" not in update["ExpressionAttributeValues"]
+
+
+def test_concurrent_update_raises_a_conflict():
+    table = FakeTable(stored_marker(version=4), conflicts=1)
+    marker = loaded_marker(stored_marker(version=3))
+    marker.set_name("renamed")
+
+    with pytest.raises(MarkerConflictError) as conflict:
+        DataService("markers", FakeResource(table)).update_marker(marker)
+
+    assert (conflict.value.expected_version, conflict.value.stored_version) == (3, 4)
+    assert len(table.updates) == 1
+    assert marker.get_version() == 3
+
+
+def test_conflict_on_other_attributes_is_merged():
+    table = FakeTable(stored_marker(version=4, status="created"), conflicts=1)
+    marker = loaded_marker(stored_marker(version=3))
+    marker.set_name("renamed")
+
+    DataService("markers", FakeResource(table)).update_marker(marker, merge_on_conflict=True)
+
+    assert [update["ExpressionAttributeValues"][":expected"] for update in table.updates] == [3, 4]
+    assert marker.get_version() == 5
+
+
+def test_conflict_on_the_same_attribute_is_not_merged():
+    table = FakeTable(stored_marker(version=4, name="renamed elsewhere"), conflicts=1)
+    marker = loaded_marker(stored_marker(version=3))
+    marker.set_name("renamed")
+
+    with pytest.raises(MarkerConflictError):
+        DataService("markers", FakeResource(table)).update_marker(marker, merge_on_conflict=True)
+    assert len(table.updates) == 1
+
+
+def test_update_of_a_deleted_marker_is_not_a_conflict():
+    table = FakeTable(conflicts=1)
+    marker = loaded_marker(stored_marker(version=3))
+    marker.set_name("renamed")
+
+    with pytest.raises(Exception, match="does not exist") as error:
+        DataService("markers", FakeResource(table)).update_marker(marker)
+    assert not isinstance(error.value, MarkerConflictError)
+
+
+def test_update_from_a_request_only_writes_the_attributes_it_sets():
+    table = FakeTable(stored_marker(version=3))
+    marker = LocationMarker.from_json({"name": "renamed", "coordinate": {"latitude": "10.0", "longitude": "50.0"},
+                                       "version": 3})
+    marker.set_marker_id("marker-1")
+
+    DataService("markers", FakeResource(table)).update_marker(marker, attribute_names=["name", "coordinate"])
+
+    (update,) = table.updates
+    assert sorted(update["ExpressionAttributeNames"][name] for name in update["ExpressionAttributeNames"]
+                  if name.startswith("#a")) == ["coordinate", "name"]
+    assert update["ExpressionAttributeValues"][":expected"] == 3
+
+
+def test_copy_keeps_a_stored_marker():
+    table = FakeTable(stored_marker(version=4, name="renamed"))
+    marker = LocationMarker.from_json(stored_marker(version=0))
+
+    assert not DataService("markers", FakeResource(table)).put_marker(marker, overwrite=False)
+    assert table.stored["name"] == "renamed"
+
+
+def marker_requests(marker_id: str, count: int):
+    marker = loaded_marker(dict(stored_marker(version=1), markerId=marker_id))
+    requests = [{"PutRequest": {"Item": {"markerId": marker_id, "sk": f"IMAGE#{index:02d}"}}}
+                for index in range(count - 1)]
+    return marker, requests + [{"PutRequest": {"Item": {"markerId": marker_id, "sk": "MARKER"}}}]
+
+
+def write(resource: FakeResource, batch):
+    buffer = DataService("markers", resource).create_write_buffer(
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0), check_versions=False)
+    buffer._put_batch(batch)
+    results = {result.marker_id: result.success for result in buffer.close()}
+    return results, buffer
+
+
+def call_markers(resource: FakeResource):
+    return [sorted({request["PutRequest"]["Item"]["markerId"] for request in call}) for call in resource.calls]
+
+
+def test_a_marker_is_written_in_one_call():
+    resource = FakeResource()
+
+    results, _ = write(resource, [marker_requests(f"m{index}", 10) for index in range(3)])
+
+    assert call_markers(resource) == [["m0", "m1"], ["m2"]]
+    assert results == {"m0": True, "m1": True, "m2": True}
+
+
+def test_a_marker_too_large_for_one_call_gets_calls_of_its_own():
+    resource = FakeResource()
+
+    results, _ = write(resource, [marker_requests("small", 5), marker_requests("large", 30)])
+
+    assert [len(call) for call in resource.calls] == [5, 25, 5]
+    assert resource.calls[-1][-1]["PutRequest"]["Item"]["sk"] == "MARKER"
+    assert results == {"small": True, "large": True}
+
+
+def test_unprocessed_requests_are_retried_until_written():
+    resource = FakeResource(unprocessed=lambda call, requests: requests[:3] if call == 1 else [])
+    batch = [marker_requests("m0", 2), marker_requests("m1", 2)]
+
+    results, buffer = write(resource, batch)
+
+    assert [len(call) for call in resource.calls] == [4, 3]
+    assert results == {"m0": True, "m1": True}
+    assert batch[0][0].get_version() == 2
+    assert buffer.get_stats()["retries"] == 1
+
+
+def test_failed_call_only_fails_its_markers():
+    resource = FakeResource(fail=lambda call, requests: call == 1)
+
+    results, _ = write(resource, [marker_requests(f"m{index}", 10) for index in range(3)])
+
+    assert results == {"m0": False, "m1": False, "m2": True}
+
+
+def test_requests_left_unprocessed_fail_their_markers():
+    resource = FakeResource(unprocessed=lambda call, requests: [request for request in requests
+                                                                 if request["PutRequest"]["Item"]["markerId"] == "m1"])
+
+    results, _ = write(resource, [marker_requests("m0", 2), marker_requests("m1", 2)])
+
+    assert results == {"m0": True, "m1": False}
+    assert len(resource.calls) == 3
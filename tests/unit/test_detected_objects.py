@@ -0,0 +1,61 @@
+import random
+
+from detected_objects import DetectedObjects
+from label_vocabulary import LabelVocabulary
+
+LABELS = [f"Label{index}" for index in range(150)] + ["Car", "Building", "Tree", "Road", "Water"]
+
+
+def set_based_compare(previous, current) -> str:
+    """
+    The set-based compare() the bitsets replaced, which the messages must stay identical to.
+    """
+    differences = []
+    new_objects = set(current) - set(previous)
+    missing_objects = set(previous) - set(current)
+    if new_objects:
+        differences.append(f"New objects: {sorted(new_objects)}")
+    if missing_objects:
+        differences.append(f"Objects no longer detected: {sorted(missing_objects)}")
+    if not differences:
+        return "No object changes."
+    return "\n".join(differences)
+
+
+def test_compare_matches_the_set_based_messages():
+    rng = random.Random(0)
+    vocabulary = LabelVocabulary()
+    for _ in range(10000):
+        previous = rng.sample(LABELS, rng.randint(0, 8))
+        current = rng.sample(previous, rng.randint(0, len(previous))) + rng.sample(LABELS, rng.randint(0, 4))
+
+        message = DetectedObjects("2024-01-01", previous, vocabulary).compare(
+            DetectedObjects("2024-01-02", current, vocabulary))
+
+        assert message == set_based_compare(previous, current)
+
+
+def test_messages_list_the_labels_sorted():
+    vocabulary = LabelVocabulary()
+    previous = DetectedObjects("2024-01-01", ["Tree", "Car"], vocabulary)
+    current = DetectedObjects("2024-01-02", ["Road", "Building", "Car", "Car"], vocabulary)
+
+    assert previous.compare(current) == "New objects: ['Building', 'Road']\nObjects no longer detected: ['Tree']"
+    assert current.compare(current) == "No object changes."
+
+
+def test_json_keeps_the_label_names_in_their_order():
+    data = {"dateDetected": "2024-01-01", "detectedObjects": ["Tree", "Car", "Tree"]}
+
+    detected_objects = DetectedObjects.from_json(data)
+
+    assert detected_objects.to_json() == data
+    assert DetectedObjects.from_json(detected_objects.to_json()).compare(detected_objects) == "No object changes."
+
+
+def test_labels_beyond_one_word_are_compared():
+    vocabulary = LabelVocabulary()
+    previous = DetectedObjects("2024-01-01", LABELS[:100], vocabulary)
+    current = DetectedObjects("2024-01-02", LABELS[1:101], vocabulary)
+
+    assert previous.compare(current) == "New objects: ['Label100']\nObjects no longer detected: ['Label0']"
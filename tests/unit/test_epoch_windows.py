@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+import image_fetcher
+from coordinate import Coordinate
+from image_fetcher import ImageFetcher
+from image_service import HISTORICAL_EPOCHS, LATEST_EPOCH, ImageService
+
+
+def freeze_today(monkeypatch, day: str):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return cls.fromisoformat(f"{day}T15:30:00")
+
+    monkeypatch.setattr(image_fetcher, "datetime", FrozenDatetime)
+
+
+@pytest.fixture
+def service():
+    return ImageService(None, "bucket", ImageFetcher("epoch-client", "secret"))
+
+
+@pytest.mark.parametrize("today, days_ago, expected", [
+    ("2024-03-31", 30, ("2024-03-01", "2024-03-31")),
+    ("2024-03-31", 180, ("2023-10-01", "2023-10-31")),
+    ("2024-08-31", 184, ("2024-02-01", "2024-02-29")),
+    ("2025-01-15", 365, ("2024-01-01", "2024-01-31")),
+    ("2025-12-20", 0, ("2025-12-01", "2025-12-31")),
+])
+def test_month_range_covers_the_whole_calendar_month(monkeypatch, today, days_ago, expected):
+    freeze_today(monkeypatch, today)
+
+    assert ImageFetcher.month_range_days_ago(days_ago) == expected
+
+
+def test_historical_cache_keys_are_stable_within_a_month(monkeypatch, service):
+    coordinate = Coordinate("10.0", "50.0")
+
+    def keys(day):
+        freeze_today(monkeypatch, day)
+        return [service._build_cache_key(coordinate, epoch) for epoch in HISTORICAL_EPOCHS]
+
+    # 180 days before both days falls into April 2026.
+    assert keys("2026-10-17") == keys("2026-10-27")
+    assert len(set(keys("2026-10-17"))) == len(HISTORICAL_EPOCHS)
+    # 180 days before 2026-10-28 is the first of May.
+    assert keys("2026-10-28")[0] != keys("2026-10-27")[0]
+
+
+def test_historical_windows_are_calendar_months_and_the_latest_ends_today(monkeypatch, service):
+    freeze_today(monkeypatch, "2026-10-17")
+
+    assert [service._get_date_range(epoch) for epoch in HISTORICAL_EPOCHS] == [
+        ("2026-04-01", "2026-04-30"), ("2025-10-01", "2025-10-31"), ("2024-10-01", "2024-10-31"),
+        ("2021-10-01", "2021-10-31"),
+    ]
+    assert service._get_date_range(LATEST_EPOCH) == ("2026-09-17", "2026-10-17")
@@ -0,0 +1,152 @@
+import threading
+import time
+import zlib
+
+import pytest
+
+from coordinate import Coordinate
+from data_service import DataService
+from image import Image
+from location_marker import LocationMarker
+from marker_items import history_items, summary_item
+
+
+class FakeScanTable:
+    """
+    Scans its items like DynamoDB: partitions lie in the segment of their key's hash, Limit counts the
+    items read before the FilterExpression is applied, and a page that reaches the Limit returns a
+    LastEvaluatedKey even if no items follow.
+    """
+
+    def __init__(self, items, fail_segment: int = None):
+        self.items = sorted(items, key=lambda item: (zlib.crc32(item["markerId"].encode()), item["sk"]))
+        self.fail_segment = fail_segment
+        self.scans = []
+        self.page_sizes = []
+
+    def scan(self, **kwargs):
+        self.scans.append(kwargs)
+        segment = kwargs.get("Segment")
+        if segment is not None and segment == self.fail_segment:
+            raise RuntimeError("segment unavailable")
+        items = [item for item in self.items
+                 if segment is None or zlib.crc32(item["markerId"].encode()) % kwargs["TotalSegments"] == segment]
+        start = 0
+        if "ExclusiveStartKey" in kwargs:
+            start = items.index(next(item for item in items if self._key(item) == kwargs["ExclusiveStartKey"])) + 1
+        limit = kwargs.get("Limit", len(items))
+        read = items[start:start + limit]
+
+        names = kwargs.get("ExpressionAttributeNames", {})
+        if "FilterExpression" in kwargs:
+            assert kwargs["FilterExpression"] == "#sk = :summary" and names["#sk"] == "sk"
+            read_items = [item for item in read if item["sk"] == kwargs["ExpressionAttributeValues"][":summary"]]
+        else:
+            read_items = read
+        if "ProjectionExpression" in kwargs:
+            attributes = [names[path.strip()] for path in kwargs["ProjectionExpression"].split(",")]
+            read_items = [{name: item[name] for name in attributes if name in item} for item in read_items]
+
+        self.page_sizes.append(len(read_items))
+        response = {"Items": read_items}
+        if len(read) == limit:
+            response["LastEvaluatedKey"] = self._key(read[-1])
+        return response
+
+    @staticmethod
+    def _key(item):
+        return {"markerId": item["markerId"], "sk": item["sk"]}
+
+
+class FakeResource:
+    def __init__(self, table: FakeScanTable):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+def stored_items(count: int, images: int):
+    items = []
+    for index in range(count):
+        marker = LocationMarker(Coordinate("10.0", f"{50 + index / 100:.2f}"), name=f"marker {index}", version=1,
+                                historical_images=[Image(f"2024-01-{day + 1:02d}", "https://bucket/i.png", "i.png",
+                                                         "bucket") for day in range(images)])
+        marker.set_marker_id(f"marker-{index}")
+        items.append(summary_item(marker))
+        items += history_items(marker).values()
+    return items
+
+
+def scan(table: FakeScanTable, **kwargs):
+    return list(DataService("markers", FakeResource(table)).iter_markers(**kwargs))
+
+
+def test_partition_spanning_pages_is_one_marker():
+    table = FakeScanTable(stored_items(5, images=6))
+
+    markers = scan(table, page_size=4, history=True)
+
+    assert sorted(marker.get_marker_id() for marker in markers) == [f"marker-{index}" for index in range(5)]
+    assert all(len(marker.get_historical_images()) == 6 for marker in markers)
+    assert len(table.scans) == 9
+
+
+def test_filtered_empty_pages_do_not_end_the_scan():
+    table = FakeScanTable(stored_items(4, images=8))
+
+    markers = scan(table, page_size=3)
+
+    assert sorted(marker.get_marker_id() for marker in markers) == [f"marker-{index}" for index in range(4)]
+    # Pages read only history items and come back empty before the scan reaches the next summary.
+    assert 0 in table.page_sizes[:-1]
+    # 36 items in pages of 3, and the empty page after the last full one.
+    assert len(table.scans) == 13
+
+
+def test_projection_without_the_keys_still_groups_markers():
+    table = FakeScanTable(stored_items(3, images=2))
+
+    markers = scan(table, page_size=2, projection=["coordinate"])
+
+    projected = {table.scans[0]["ExpressionAttributeNames"][path.strip()]
+                 for path in table.scans[0]["ProjectionExpression"].split(",")}
+    assert projected == {"coordinate", "markerId", "sk"}
+    assert sorted(marker.get_marker_id() for marker in markers) == ["marker-0", "marker-1", "marker-2"]
+    assert markers[0].get_coordinate().get_longitude() == "10.0"
+    assert markers[0].get_name() is None
+
+
+@pytest.mark.parametrize("total_segments", [1, 4])
+def test_every_marker_is_read_once(total_segments):
+    table = FakeScanTable(stored_items(40, images=3))
+
+    markers = scan(table, page_size=5, total_segments=total_segments, history=True)
+
+    assert sorted(marker.get_marker_id() for marker in markers) == sorted(f"marker-{index}" for index in range(40))
+    assert all(len(marker.get_historical_images()) == 3 for marker in markers)
+    assert {kwargs.get("TotalSegments") for kwargs in table.scans} == ({None} if total_segments == 1 else {4})
+
+
+def test_failing_segment_raises_in_the_consumer():
+    table = FakeScanTable(stored_items(40, images=1), fail_segment=2)
+
+    with pytest.raises(Exception, match="Failed to retrieve markers"):
+        scan(table, page_size=5, total_segments=4)
+
+
+def test_closing_the_scan_stops_the_workers():
+    table = FakeScanTable(stored_items(400, images=0))
+    markers = DataService("markers", FakeResource(table)).iter_markers(page_size=1, total_segments=4)
+
+    next(markers)
+    time.sleep(0.3)
+    # The bounded queue pauses the workers: two pages per segment, plus one page held by each worker
+    # and one held back by each segment's grouping.
+    assert len(table.scans) <= 4 * 4 + 1
+
+    closer = threading.Thread(target=markers.close)
+    closer.start()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("scan")]
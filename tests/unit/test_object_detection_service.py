@@ -0,0 +1,90 @@
+import pytest
+
+from detection_cache import DetectionCache
+from detectors import BACKEND_ONNX, Detector, RekognitionDetector
+from object_detection_service import ObjectDetectionService
+
+
+class FakeRekognition:
+    def __init__(self):
+        self.calls = []
+
+    def detect_labels(self, Image, MaxLabels, MinConfidence):
+        self.calls.append(Image["S3Object"]["Name"])
+        return {"Labels": [{"Name": "Car"}, {"Name": "Road"}]}
+
+
+class FakeS3:
+    """
+    Identifies images by content through their ETag and does not persist detection results.
+    """
+
+    def __init__(self, etags):
+        self.etags = etags
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": f'"{self.etags[Key]}"'}
+
+    def get_object(self, Bucket, Key):
+        raise KeyError(Key)
+
+    def put_object(self, **kwargs):
+        pass
+
+
+class LocalDetector(Detector):
+    name = BACKEND_ONNX
+    batch_size = 8
+
+    def detect_labels(self, s3_bucket_name, s3_key):
+        return ["Tree"]
+
+    def get_parameters(self):
+        return {"model": "local"}
+
+
+def test_rekognition_calls_are_counted_per_image():
+    rekognition = FakeRekognition()
+    service = ObjectDetectionService(detector=RekognitionDetector(rekognition))
+
+    service.detect_objects([("bucket", "a.png"), ("bucket", "b.png")])
+    service.detect_object("bucket", "c.png")
+
+    assert service.get_rekognition_calls() == len(rekognition.calls) == 3
+    assert service.get_detector_stats() == {"batches": 2, "images": 3}
+
+
+def test_cache_hits_do_not_count_as_rekognition_calls():
+    rekognition = FakeRekognition()
+    cache = DetectionCache(FakeS3({"a.png": "content-1", "b.png": "content-1", "c.png": "content-2"}), "bucket")
+    service = ObjectDetectionService(detector=RekognitionDetector(rekognition), cache=cache)
+
+    first = service.detect_object("bucket", "a.png")
+    again = service.detect_objects([("bucket", "b.png"), ("bucket", "a.png")])
+    service.detect_object("bucket", "c.png")
+
+    assert [result.get_detected_objects() for result in again] == [first.get_detected_objects()] * 2
+    assert rekognition.calls == ["a.png", "c.png"]
+    assert service.get_rekognition_calls() == 2
+    assert cache.get_stats()["memory_hits"] == 2
+
+
+def test_other_backends_make_no_rekognition_calls():
+    service = ObjectDetectionService(detector=LocalDetector())
+
+    service.detect_objects([("bucket", "a.png"), ("bucket", "b.png")])
+
+    assert service.get_rekognition_calls() == 0
+    assert service.get_detector_stats() == {"batches": 1, "images": 2}
+
+
+def test_failed_detections_are_not_counted():
+    class FailingRekognition:
+        def detect_labels(self, **kwargs):
+            raise RuntimeError("throttled")
+
+    service = ObjectDetectionService(detector=RekognitionDetector(FailingRekognition()))
+
+    with pytest.raises(RuntimeError):
+        service.detect_object("bucket", "a.png")
+    assert service.get_rekognition_calls() == 0
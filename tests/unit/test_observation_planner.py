@@ -0,0 +1,206 @@
+import math
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from coordinate import Coordinate
+from detectors import BACKEND_REKOGNITION, Detector
+from image import Image
+from image_fetcher import ImageFetcher
+from location_marker import LocationMarker
+from object_detection_service import ObjectDetectionService
+from observation_engine import MODE_ASYNC, ObservationEngine
+from observation_planner import ObservationPlanner
+
+
+def make_planner(**kwargs) -> ObservationPlanner:
+    return ObservationPlanner(ImageFetcher("planner-client", "secret"), **kwargs)
+
+
+def make_marker(marker_id: str, lon: str, lat: str = "50.0") -> LocationMarker:
+    marker = LocationMarker(Coordinate(lon, lat))
+    marker.set_marker_id(marker_id)
+    return marker
+
+
+def group_ids(groups):
+    return [sorted(marker.get_marker_id() for marker in group.get_markers()) for group in groups]
+
+
+def render(bbox, width: int, height: int, degrees_per_pixel: float) -> np.ndarray:
+    """
+    Render a synthetic scene whose pixels encode the column and row of their center on a global grid.
+    """
+    lons = bbox[0] + (np.arange(width) + 0.5) * (bbox[2] - bbox[0]) / width
+    lats = bbox[3] - (np.arange(height) + 0.5) * (bbox[3] - bbox[1]) / height
+    pixels = np.zeros((height, width, 3), np.uint8)
+    pixels[..., 0] = (np.floor(lons / degrees_per_pixel) % 256).astype(np.uint8)[None, :]
+    pixels[..., 1] = (np.floor(-lats / degrees_per_pixel) % 256).astype(np.uint8)[:, None]
+    return pixels
+
+
+class RenderingImageService:
+    """
+    Stands in for the ImageService, rendering the synthetic scene and keeping the submitted pixels.
+    """
+
+    def __init__(self, degrees_per_pixel: float):
+        self.degrees_per_pixel = degrees_per_pixel
+        self.epoch_renders = []
+        self.area_renders = []
+        self.submitted = {}
+
+    def fetch_epoch_array(self, coordinate, epoch, aoi=None, **kwargs):
+        self.epoch_renders.append(aoi)
+        return render(aoi, 512, 512, self.degrees_per_pixel)
+
+    def fetch_area_array(self, bbox, epoch, width, height, **kwargs):
+        self.area_renders.append((bbox, width, height))
+        return render(bbox, width, height, self.degrees_per_pixel)
+
+    def submit_epoch_image(self, coordinate, epoch, image_data, aoi=None, pixels=None):
+        key = f"{coordinate.get_longitude()}_{coordinate.get_latitude()}.png"
+        self.submitted[tuple(aoi)] = pixels.copy()
+        future = Future()
+        future.set_result(Image("2024-01-01", f"https://bucket/{key}", key, "bucket"))
+        return future
+
+    def flush_uploads(self):
+        return []
+
+
+class StaticDetector(Detector):
+    name = BACKEND_REKOGNITION
+
+    def detect_labels(self, s3_bucket_name, s3_key):
+        return ["car"]
+
+    def get_parameters(self):
+        return {}
+
+
+class DiscardingDataService:
+    def update_marker(self, marker, **kwargs):
+        pass
+
+
+def observed_marker(marker_id: str, lon: str, lat: str) -> LocationMarker:
+    marker = make_marker(marker_id, lon, lat)
+    # A marker with history needs only its latest image.
+    marker.set_historical_images([Image("2023-01-01", "https://bucket/old.png", "old.png", "bucket")])
+    return marker
+
+
+def run_async(planner, markers):
+    service = RenderingImageService(planner.get_degrees_per_pixel())
+    engine = ObservationEngine(service, ObjectDetectionService(detector=StaticDetector()), DiscardingDataService(),
+                               check_acquisitions=False, planner=planner)
+    report = engine.run(markers, mode=MODE_ASYNC)
+    return service, report
+
+
+def test_markers_with_identical_quantized_aois_share_one_site():
+    planner = make_planner()
+    markers = [make_marker("a", "10.00001"), make_marker("b", "10.00004"), make_marker("c", "10.00006")]
+
+    groups = planner.plan(markers)
+
+    assert len(groups) == 1
+    sites = {site.key: sorted(marker.get_marker_id() for marker in site.markers) for site in groups[0].sites}
+    assert sites == {(100000, 500000): ["a", "b"], (100001, 500000): ["c"]}
+    assert planner.get_aoi(markers[0].get_coordinate()) == planner.get_aoi(markers[1].get_coordinate())
+
+
+def test_sites_are_grouped_by_distance():
+    planner = make_planner(max_distance=0.005)
+    # AOIs are 0.01 degrees wide: a gap of 0.004 joins the group, a gap of 0.006 does not.
+    markers = [make_marker("a", "10.0"), make_marker("b", "10.014"), make_marker("c", "10.03"),
+               make_marker("d", "11.0")]
+
+    assert group_ids(planner.plan(markers)) == [["a", "b"], ["c"], ["d"]]
+
+
+def test_group_span_is_capped_at_max_pixels():
+    planner = make_planner(max_pixels=1000)
+    max_span = 1000 * planner.get_degrees_per_pixel()
+    markers = [make_marker("a", "10.0"), make_marker("b", "10.008"), make_marker("c", "10.016")]
+
+    groups = planner.plan(markers)
+
+    assert group_ids(groups) == [["a", "b"], ["c"]]
+    for group in groups:
+        bbox, width, height = planner.get_render(group)
+        assert group.bbox[2] - group.bbox[0] <= max_span
+        assert width <= 1000 and height <= 1000
+
+
+def test_invalid_coordinates_get_their_own_group():
+    planner = make_planner()
+
+    groups = planner.plan([make_marker("a", "10.0"), make_marker("bad", "east"), make_marker("b", "10.001")])
+
+    assert group_ids(groups) == [["bad"], ["a", "b"]]
+    assert groups[0].bbox is None and groups[0].sites[0].key is None
+
+
+def test_render_spans_whole_pixels_at_tile_resolution():
+    planner = make_planner()
+    group = planner.plan([make_marker("a", "10.0", "50.0"), make_marker("b", "10.00123", "50.00071")])[0]
+
+    bbox, width, height = planner.get_render(group)
+
+    degrees_per_pixel = planner.get_degrees_per_pixel()
+    assert (width, height) == (math.ceil(round((group.bbox[2] - group.bbox[0]) / degrees_per_pixel, 6)),
+                               math.ceil(round((group.bbox[3] - group.bbox[1]) / degrees_per_pixel, 6)))
+    assert bbox[0] == group.bbox[0] and bbox[3] == group.bbox[3]
+    assert bbox[2] - bbox[0] == pytest.approx(width * degrees_per_pixel)
+    assert bbox[3] - bbox[1] == pytest.approx(height * degrees_per_pixel)
+
+
+def test_group_crops_line_up_with_single_marker_renders():
+    planner = make_planner()
+    # Sites 25 quanta apart lie a whole number of pixels apart, so the crops match the single renders exactly.
+    markers = [observed_marker("a", "10.0", "50.0"), observed_marker("b", "10.0025", "50.0025"),
+               observed_marker("c", "10.005", "49.9975")]
+
+    service, report = run_async(planner, markers)
+
+    assert sorted(report.succeeded) == ["a", "b", "c"]
+    assert report.rekognition_calls == 3
+    assert len(service.area_renders) == 1 and not service.epoch_renders
+    degrees_per_pixel = planner.get_degrees_per_pixel()
+    for marker in markers:
+        aoi = planner.get_aoi(marker.get_coordinate())
+        tile = service.submitted[tuple(aoi)]
+        assert tile.shape == (512, 512, 3)
+        np.testing.assert_array_equal(tile, render(aoi, 512, 512, degrees_per_pixel))
+
+
+def test_group_crops_are_within_a_pixel_of_single_marker_renders():
+    planner = make_planner()
+    markers = [observed_marker("a", "10.00013", "50.00041"), observed_marker("b", "10.00347", "50.00218")]
+
+    service, report = run_async(planner, markers)
+
+    assert sorted(report.succeeded) == ["a", "b"]
+    assert len(service.area_renders) == 1
+    degrees_per_pixel = planner.get_degrees_per_pixel()
+    for marker in markers:
+        aoi = planner.get_aoi(marker.get_coordinate())
+        tile = service.submitted[tuple(aoi)].astype(int)
+        expected = render(aoi, 512, 512, degrees_per_pixel).astype(int)
+        # Grid positions wrap at 256, so an offset of one pixel shows up as a difference of 1 or 255.
+        assert set(np.unique((tile - expected) % 256)) <= {0, 1, 255}
+
+
+def test_single_site_group_is_rendered_directly():
+    planner = make_planner()
+    markers = [observed_marker("a", "10.00001", "50.0"), observed_marker("b", "10.00002", "50.0")]
+
+    service, report = run_async(planner, markers)
+
+    assert sorted(report.succeeded) == ["a", "b"]
+    assert report.rekognition_calls == 1
+    assert service.epoch_renders == [planner.get_aoi(markers[0].get_coordinate())]
+    assert not service.area_renders
@@ -0,0 +1,185 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import raster
+
+
+@pytest.fixture(params=["pillow", "numpy"])
+def decoder(request, monkeypatch):
+    """
+    Run a test against Pillow's PNG decoder and against the NumPy fallback.
+    """
+    if request.param == "numpy":
+        monkeypatch.setattr(raster, "PILImage", None)
+    return request.param
+
+
+def random_pixels(height: int, width: int, channels: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (height, width, channels), dtype=np.uint8)
+
+
+def paeth(left: int, above: int, upper_left: int) -> int:
+    estimate = left + above - upper_left
+    distances = [abs(estimate - left), abs(estimate - above), abs(estimate - upper_left)]
+    return [left, above, upper_left][distances.index(min(distances))]
+
+
+def filter_row(kind: int, row: bytes, previous: bytes, channels: int) -> bytes:
+    """
+    Apply a PNG filter to a row, the reference way, byte by byte.
+    """
+    out = bytearray(len(row))
+    for i, value in enumerate(row):
+        left = row[i - channels] if i >= channels else 0
+        above = previous[i]
+        upper_left = previous[i - channels] if i >= channels else 0
+        predictor = [0, left, above, (left + above) >> 1, paeth(left, above, upper_left)][kind]
+        out[i] = (value - predictor) & 0xFF
+    return bytes(out)
+
+
+def encode_filtered_png(pixels: np.ndarray, filters) -> bytes:
+    """
+    Encode pixels as a PNG whose rows use the given filter types, as provider PNGs do.
+    """
+    height, width, channels = pixels.shape
+    rows = pixels.reshape(height, width * channels)
+    previous = bytes(width * channels)
+    raw = bytearray()
+    for y in range(height):
+        kind = filters[y % len(filters)]
+        raw += bytes([kind]) + filter_row(kind, rows[y].tobytes(), previous, channels)
+        previous = rows[y].tobytes()
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return b"".join([raster.PNG_SIGNATURE, png_chunk(b"IHDR", header), png_chunk(b"IDAT", zlib.compress(bytes(raw))),
+                     png_chunk(b"IEND", b"")])
+
+
+def png_chunk(chunk_type: bytes, payload: bytes) -> bytes:
+    crc = zlib.crc32(chunk_type + payload) & 0xFFFFFFFF
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", crc)
+
+
+def encode_tiff(pixels: np.ndarray, sample_format: int, rows_per_strip: int = None) -> bytes:
+    """
+    Write a little-endian, uncompressed, chunky TIFF with back-to-back strips, like the Process API output.
+    """
+    height, width, bands = pixels.shape
+    rows_per_strip = rows_per_strip or height
+    strip_size = rows_per_strip * width * bands * pixels.dtype.itemsize
+    strip_count = -(-height // rows_per_strip)
+    data = pixels.astype(pixels.dtype.newbyteorder("<")).tobytes()
+    counts = [min(strip_size, len(data) - strip * strip_size) for strip in range(strip_count)]
+
+    entries = 10
+    ifd_size = 2 + entries * 12 + 4
+    arrays_offset = 8 + ifd_size
+    data_offset = arrays_offset + 8 * strip_count
+    offsets = [data_offset + strip * strip_size for strip in range(strip_count)]
+
+    def entry(tag, field_type, values, array_offset=None):
+        if array_offset is not None:
+            return struct.pack("<HHII", tag, field_type, len(values), array_offset)
+        # A single value is stored in the entry itself, padded to four bytes.
+        if field_type == 3:
+            return struct.pack("<HHIHH", tag, field_type, 1, values, 0)
+        return struct.pack("<HHII", tag, field_type, 1, values)
+
+    ifd = struct.pack("<H", entries) + b"".join([
+        entry(256, 4, width),
+        entry(257, 4, height),
+        entry(258, 3, pixels.dtype.itemsize * 8),
+        entry(259, 3, 1),
+        entry(273, 4, offsets, arrays_offset) if strip_count > 1 else entry(273, 4, offsets[0]),
+        entry(277, 3, bands),
+        entry(278, 4, rows_per_strip),
+        entry(279, 4, counts, arrays_offset + 4 * strip_count) if strip_count > 1 else entry(279, 4, counts[0]),
+        entry(284, 3, 1),
+        entry(339, 3, sample_format),
+    ]) + struct.pack("<I", 0)
+    arrays = struct.pack(f"<{strip_count}I", *offsets) + struct.pack(f"<{strip_count}I", *counts)
+    return b"II" + struct.pack("<HI", 42, 8) + ifd + arrays + data
+
+
+@pytest.mark.parametrize("channels", [1, 2, 3, 4])
+def test_png_round_trip(decoder, channels):
+    pixels = random_pixels(7, 5, channels)
+
+    decoded = raster.decode_png(raster.encode_png(pixels))
+
+    assert decoded.dtype == np.uint8
+    np.testing.assert_array_equal(decoded, pixels)
+
+
+def test_png_round_trip_of_a_2d_array(decoder):
+    pixels = random_pixels(6, 9, 1)[..., 0]
+
+    np.testing.assert_array_equal(raster.decode_png(raster.encode_png(pixels)), pixels[..., None])
+
+
+@pytest.mark.parametrize("filters", [[3], [4], [0, 1, 2, 3, 4]], ids=["average", "paeth", "mixed"])
+@pytest.mark.parametrize("channels", [1, 3, 4])
+def test_png_filtered_rows_are_reversed(decoder, filters, channels):
+    pixels = random_pixels(10, 8, channels, seed=channels)
+
+    decoded = raster.decode_png(encode_filtered_png(pixels, filters))
+
+    np.testing.assert_array_equal(decoded, pixels)
+
+
+def test_png_decoders_agree_on_smooth_images(monkeypatch):
+    # Smooth gradients make the Paeth predictor pick each of its three neighbours.
+    y, x = np.mgrid[0:16, 0:16]
+    pixels = np.stack([x * 16, y * 16, (x * y) % 256], axis=-1).astype(np.uint8)
+    data = encode_filtered_png(pixels, [4, 3])
+
+    with_pillow = raster.decode_png(data)
+    monkeypatch.setattr(raster, "PILImage", None)
+
+    np.testing.assert_array_equal(raster.decode_png(data), with_pillow)
+    np.testing.assert_array_equal(with_pillow, pixels)
+
+
+def test_png_rejects_other_data(decoder):
+    with pytest.raises(ValueError):
+        raster.decode_png(b"GIF89a")
+
+
+def test_png_encoding_rejects_unsupported_arrays():
+    with pytest.raises(ValueError):
+        raster.encode_png(np.zeros((2, 2, 3), np.float32))
+    with pytest.raises(ValueError):
+        raster.encode_png(np.zeros((2, 2, 5), np.uint8))
+
+
+def test_tiff_uint8_is_a_view_over_the_data():
+    pixels = random_pixels(4, 6, 3)
+    data = encode_tiff(pixels, sample_format=1)
+
+    decoded = raster.decode_tiff(data)
+
+    assert decoded.dtype == np.uint8 and decoded.shape == (4, 6, 3)
+    np.testing.assert_array_equal(decoded, pixels)
+    assert not decoded.flags.writeable
+    assert np.shares_memory(decoded, np.frombuffer(data, np.uint8))
+
+
+@pytest.mark.parametrize("rows_per_strip", [None, 2, 3], ids=["one-strip", "even-strips", "short-last-strip"])
+def test_tiff_float32_bands_keep_their_layout(rows_per_strip):
+    pixels = np.random.default_rng(1).random((5, 4, 5), dtype=np.float32)
+    pixels[0, 0] = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+    decoded = raster.decode_tiff(encode_tiff(pixels, sample_format=3, rows_per_strip=rows_per_strip))
+
+    assert decoded.dtype == np.dtype("<f4") and decoded.shape == (5, 4, 5)
+    np.testing.assert_array_equal(decoded, pixels)
+    assert decoded[0, 0].tolist() == [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def test_tiff_rejects_other_data():
+    with pytest.raises(ValueError):
+        raster.decode_tiff(b"\x89PNG\r\n\x1a\n")
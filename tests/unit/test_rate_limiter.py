@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from image_fetcher import ConnectionPool, ImageFetcher
+from rate_limiter import RateLimiter, RetryPolicy, parse_retry_after
+
+
+def test_retry_after_in_seconds():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("1.5") == 1.5
+    assert parse_retry_after("-3") == 0.0
+
+
+def test_retry_after_as_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=120)
+    assert 100 < parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 120
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_missing_or_malformed_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+
+
+def test_retry_after_is_capped_at_the_maximum_delay():
+    policy = RetryPolicy(max_delay=10)
+
+    assert policy.get_delay(0, "3") == 3.0
+    assert policy.get_delay(0, "3600") == 10.0
+
+
+def test_backoff_is_jittered_below_the_exponential_ceiling():
+    policy = RetryPolicy(base_delay=0.5, max_delay=3)
+
+    for attempt, ceiling in ((0, 0.5), (1, 1.0), (2, 2.0), (5, 3.0)):
+        delays = [policy.get_delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_throttling_halves_the_window_down_to_the_minimum():
+    limiter = RateLimiter(rate=1000, burst=1000, max_concurrency=8, min_concurrency=2)
+
+    for expected in (4, 2, 2):
+        with limiter.slot() as slot:
+            slot.throttled()
+        assert limiter.get_stats()["concurrency_limit"] == expected
+    assert limiter.get_stats()["throttled"] == 3
+
+
+def test_successes_grow_the_window_back_to_the_maximum():
+    limiter = RateLimiter(rate=1000, burst=1000, max_concurrency=4)
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.get_stats()["concurrency_limit"] == 1
+
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release()
+
+    stats = limiter.get_stats()
+    assert stats["concurrency_limit"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_requests_wait_for_a_free_slot():
+    limiter = RateLimiter(rate=1000, burst=1000, max_concurrency=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(5)
+    limiter.release()
+    waiter.join(5)
+
+
+def test_token_bucket_paces_requests_after_the_burst():
+    limiter = RateLimiter(rate=20, burst=2, max_concurrency=8)
+
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+        limiter.release()
+    elapsed = time.monotonic() - started
+
+    # Two requests go out immediately, the other four wait for a token each.
+    assert 0.15 <= elapsed < 1.0
+    assert limiter.get_stats()["wait_seconds"] > 0
+
+
+def test_throttled_request_is_retried_after_retry_after(local_server):
+    local_server.respond("/oauth/token", body=json.dumps({"access_token": "token", "expires_in": 3600}).encode())
+    local_server.respond("/api/v1/process", status=429, headers={"Retry-After": "0"})
+    local_server.respond("/api/v1/process", status=503, headers={"Retry-After": "0"})
+    local_server.respond("/api/v1/process", body=b"image")
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    limiter = RateLimiter(max_concurrency=8)
+    fetcher = ImageFetcher("throttled-client", "secret", pool=pool, rate_limiter=limiter,
+                           retry_policy=RetryPolicy(base_delay=60))
+
+    assert fetcher.get_images_by_date("2024-01-01", "2024-01-31", aoi=[0, 0, 1, 1]) == b"image"
+
+    stats = limiter.get_stats()
+    assert stats["retries"] == 2
+    assert stats["throttled"] == 2
+    assert stats["concurrency_limit"] == 2
+    pool.close()
+
+
+def test_retries_stop_after_the_last_attempt(local_server):
+    local_server.respond("/oauth/token", body=json.dumps({"access_token": "token", "expires_in": 3600}).encode())
+    for _ in range(2):
+        local_server.respond("/api/v1/process", status=500)
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    fetcher = ImageFetcher("failing-client", "secret", pool=pool, rate_limiter=RateLimiter(),
+                           retry_policy=RetryPolicy(max_attempts=2, base_delay=0))
+
+    response = fetcher._authorized_request("POST", "/api/v1/process", "{}")
+
+    assert response.status == 500
+    assert len([path for _, path, _, _ in local_server.requests if path == "/api/v1/process"]) == 2
+    pool.close()
+
+
+def test_streamed_response_releases_its_slot_before_the_body_is_read(local_server):
+    local_server.respond("/oauth/token", body=json.dumps({"access_token": "token", "expires_in": 3600}).encode())
+    local_server.respond("/api/v1/process", status=429, headers={"Retry-After": "0"})
+    local_server.respond("/api/v1/process", body=b"streamed image")
+    local_server.respond("/api/v1/process", body=b"other image")
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    limiter = RateLimiter(rate=1000, burst=1000, max_concurrency=1)
+    fetcher = ImageFetcher("streaming-client", "secret", pool=pool, rate_limiter=limiter,
+                           retry_policy=RetryPolicy(base_delay=0))
+
+    with fetcher.stream_images_by_date("2024-01-01", "2024-01-31", aoi=[0, 0, 1, 1]) as body:
+        assert limiter.get_stats()["in_flight"] == 0
+        # With the only slot free, another request goes out while the body is still unread.
+        assert fetcher.get_images_by_date("2024-01-01", "2024-01-31", aoi=[0, 0, 1, 1]) == b"other image"
+        assert body.read() == b"streamed image"
+
+    stats = limiter.get_stats()
+    assert (stats["requests"], stats["throttled"], stats["retries"], stats["in_flight"]) == (3, 1, 1, 0)
+    pool.close()
+
+
+
+def test_failed_stream_releases_its_slot(local_server, monkeypatch):
+    local_server.respond("/oauth/token", body=json.dumps({"access_token": "token", "expires_in": 3600}).encode())
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    limiter = RateLimiter(rate=1000, burst=1000, max_concurrency=1)
+    fetcher = ImageFetcher("unreachable-client", "secret", pool=pool, rate_limiter=limiter,
+                           retry_policy=RetryPolicy(max_attempts=2, base_delay=0))
+
+    def refuse(*args, **kwargs):
+        raise ConnectionRefusedError("refused")
+
+    monkeypatch.setattr(pool, "stream", refuse)
+
+    with pytest.raises(ConnectionRefusedError):
+        with fetcher.stream_images_by_date("2024-01-01", "2024-01-31", aoi=[0, 0, 1, 1]):
+            pass
+
+    stats = limiter.get_stats()
+    assert (stats["requests"], stats["retries"], stats["in_flight"]) == (2, 1, 0)
+    pool.close()
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from spectral_indices import NDBI, NDVI, NDWI, IndexChangeDetector, IndexStats, compute_indices, summarize_indices
+
+BANDS = ["B04", "B03", "B02", "B08", "B11"]
+
+
+def reflectances(red, green, nir, swir) -> np.ndarray:
+    """
+    Build a (1, n, 5) image in the order of BANDS from per-pixel values of the bands the indices use.
+    """
+    red, green, nir, swir = (np.asarray(values, np.float32) for values in (red, green, nir, swir))
+    return np.stack([red, green, np.zeros_like(red), nir, swir], axis=-1)[None]
+
+
+def stats(mean: float, valid_fraction: float = 1.0) -> IndexStats:
+    return IndexStats(mean, mean, mean, valid_fraction)
+
+
+def test_indices_are_normalized_differences():
+    pixels = reflectances(red=[0.1], green=[0.2], nir=[0.5], swir=[0.3])
+
+    indices = compute_indices(pixels, BANDS)
+
+    assert indices[NDVI][0, 0] == pytest.approx((0.5 - 0.1) / (0.5 + 0.1))
+    assert indices[NDBI][0, 0] == pytest.approx((0.3 - 0.5) / (0.3 + 0.5))
+    assert indices[NDWI][0, 0] == pytest.approx((0.2 - 0.5) / (0.2 + 0.5))
+    assert all(values.dtype == np.float32 for values in indices.values())
+
+
+def test_indices_are_nan_where_the_band_sum_is_zero():
+    pixels = reflectances(red=[0.0, 0.2, 0.0], green=[0.0, 0.1, 0.3], nir=[0.0, 0.2, 0.0], swir=[0.0, 0.0, 0.0])
+
+    indices = compute_indices(pixels, BANDS)
+
+    assert np.isnan(indices[NDVI][0]).tolist() == [True, False, True]
+    assert indices[NDVI][0, 1] == 0.0
+    assert np.isnan(indices[NDBI][0]).tolist() == [True, False, True]
+    assert np.isnan(indices[NDWI][0]).tolist() == [True, False, False]
+
+
+def test_summary_covers_valid_pixels_only():
+    # Two no-data pixels, and NDVI values of 0.6 and 0.2 in the others.
+    pixels = reflectances(red=[0.0, 0.1, 0.0, 0.2], green=[0.0, 0.1, 0.0, 0.1], nir=[0.0, 0.4, 0.0, 0.3],
+                          swir=[0.0, 0.1, 0.0, 0.1])
+
+    summary = summarize_indices(pixels, BANDS)
+
+    assert summary[NDVI].mean == pytest.approx(0.4)
+    assert summary[NDVI].valid_fraction == 0.5
+    assert summary[NDVI].p10 == pytest.approx(0.24) and summary[NDVI].p90 == pytest.approx(0.56)
+
+
+def test_summary_leaves_out_indices_without_valid_pixels():
+    pixels = reflectances(red=[0.0, 0.0], green=[0.2, 0.2], nir=[0.0, 0.0], swir=[0.0, 0.0])
+
+    summary = summarize_indices(pixels, BANDS)
+
+    assert set(summary) == {NDWI}
+    assert summary[NDWI].mean == pytest.approx(1.0)
+
+
+def test_stats_survive_a_json_round_trip():
+    original = IndexStats(0.41234, -0.1, 0.75, 0.9)
+
+    assert IndexStats.from_json(original.to_json()) == IndexStats(0.4123, -0.1, 0.75, 0.9)
+
+
+def test_thresholds_are_crossed_in_their_direction():
+    detector = IndexChangeDetector()
+    previous = {NDVI: stats(0.6), NDBI: stats(0.0), NDWI: stats(0.0)}
+    current = {NDVI: stats(0.45), NDBI: stats(-0.2), NDWI: stats(0.05)}
+
+    change = detector.compare(previous, current)
+
+    assert change.deltas == pytest.approx({NDVI: -0.15, NDBI: -0.2, NDWI: 0.05})
+    assert change.changes == ["Vegetation loss (NDVI -0.150)"]
+    assert detector.is_significant(change)
+
+
+def test_indices_below_the_min_valid_fraction_are_not_compared():
+    detector = IndexChangeDetector(min_valid_fraction=0.5)
+    previous = {NDVI: stats(0.6, valid_fraction=0.4), NDBI: stats(0.0), NDWI: stats(0.0, valid_fraction=0.5)}
+    current = {NDVI: stats(0.1), NDBI: stats(0.3, valid_fraction=0.2), NDWI: stats(0.2)}
+
+    change = detector.compare(previous, current)
+
+    assert change.deltas == pytest.approx({NDWI: 0.2})
+    assert change.changes == ["Flooding (NDWI +0.200)"]
+
+
+def test_indices_missing_from_either_observation_are_not_compared():
+    detector = IndexChangeDetector()
+
+    change = detector.compare({NDVI: stats(0.6)}, {NDBI: stats(0.5)})
+
+    assert change.deltas == {} and change.changes == []
+    assert not detector.is_significant(change)
+    assert detector.get_stats()["comparisons"] == 1
+
+
+def test_detector_summarizes_only_its_thresholds():
+    detector = IndexChangeDetector(thresholds={NDVI: -0.1}, bands=BANDS)
+
+    summary = detector.summarize(reflectances(red=[0.1], green=[0.2], nir=[0.5], swir=[0.3]))
+
+    assert set(summary) == {NDVI}
+    assert detector.get_stats()["summaries"] == 1
@@ -0,0 +1,110 @@
+import json
+import threading
+
+from image_fetcher import ConnectionPool, ImageFetcher, TokenCache
+from rate_limiter import RateLimiter, RetryPolicy
+
+
+class TokenSource:
+    """
+    Hands out numbered tokens with a fixed lifetime and counts the fetches.
+    """
+
+    def __init__(self, expires_in: float):
+        self.expires_in = expires_in
+        self.fetches = 0
+
+    def __call__(self):
+        self.fetches += 1
+        return f"token-{self.fetches}", self.expires_in
+
+
+def test_valid_token_is_served_from_the_cache():
+    cache = TokenCache(refresh_margin=60)
+    fetch = TokenSource(expires_in=3600)
+
+    assert cache.get("key", fetch) == "token-1"
+    assert cache.get("key", fetch) == "token-1"
+    assert fetch.fetches == 1
+    assert cache.get_stats() == {"hits": 1, "refreshes": 1, "invalidations": 0}
+
+
+def test_token_within_the_refresh_margin_is_refreshed():
+    cache = TokenCache(refresh_margin=60)
+    fetch = TokenSource(expires_in=30)
+
+    assert cache.get("key", fetch) == "token-1"
+    assert cache.get("key", fetch) == "token-2"
+    assert fetch.fetches == 2
+
+
+def test_invalidate_keeps_a_token_refreshed_meanwhile():
+    cache = TokenCache()
+    fetch = TokenSource(expires_in=3600)
+    cache.get("key", fetch)
+
+    cache.invalidate("key", "stale-token")
+    assert cache.get("key", fetch) == "token-1"
+
+    cache.invalidate("key", "token-1")
+    assert cache.get("key", fetch) == "token-2"
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_concurrent_callers_share_one_fetch():
+    cache = TokenCache()
+    started = threading.Event()
+    release = threading.Event()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        started.set()
+        release.wait(5)
+        return "shared", 3600
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("key", fetch))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["shared"] * 8
+    assert len(fetches) == 1
+
+
+def test_rejected_token_is_refreshed_once_and_the_request_retried(local_server):
+    for token in ("first", "second"):
+        local_server.respond("/oauth/token", body=json.dumps({"access_token": token, "expires_in": 3600}).encode())
+    local_server.respond("/api/v1/process", status=401)
+    local_server.respond("/api/v1/process", body=b"image")
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    fetcher = ImageFetcher("refresh-client", "secret", pool=pool, rate_limiter=RateLimiter(),
+                           retry_policy=RetryPolicy(base_delay=0))
+
+    assert fetcher.get_images_by_date("2024-01-01", "2024-01-31", aoi=[0, 0, 1, 1]) == b"image"
+
+    authorizations = [headers["Authorization"] for _, path, headers, _ in local_server.requests
+                      if path == "/api/v1/process"]
+    assert authorizations == ["Bearer first", "Bearer second"]
+    assert fetcher.token == "second"
+    pool.close()
+
+
+def test_second_rejection_is_returned(local_server):
+    for token in ("first", "second"):
+        local_server.respond("/oauth/token", body=json.dumps({"access_token": token, "expires_in": 3600}).encode())
+    local_server.respond("/api/v1/process", status=401)
+    local_server.respond("/api/v1/process", status=401)
+    pool = ConnectionPool("127.0.0.1", port=local_server.port, use_https=False)
+    fetcher = ImageFetcher("rejected-client", "secret", pool=pool, rate_limiter=RateLimiter(),
+                           retry_policy=RetryPolicy(base_delay=0))
+
+    response = fetcher._authorized_request("POST", "/api/v1/process", "{}")
+
+    assert response.status == 401
+    assert len([path for _, path, _, _ in local_server.requests if path == "/oauth/token"]) == 2
+    pool.close()
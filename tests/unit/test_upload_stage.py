@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from upload_stage import UploadStage
+
+
+class SlowUploads:
+    """
+    Upload callable that holds every upload until released and fails the keys it is told to.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.released = threading.Event()
+        self.started = []
+
+    def __call__(self, data, object_key):
+        self.started.append(object_key)
+        self.released.wait(5)
+        time.sleep(0.01)
+        if object_key in self.failing:
+            raise RuntimeError(f"upload of {object_key} failed")
+        return f"s3://bucket/{object_key}"
+
+
+def submit_in_thread(stage, data, object_key):
+    futures = []
+    thread = threading.Thread(target=lambda: futures.append(stage.submit(data, object_key)), daemon=True)
+    thread.start()
+    return thread, futures
+
+
+def test_drain_returns_every_result_including_failures():
+    upload = SlowUploads(failing={"b"})
+    stage = UploadStage(upload, max_workers=2, max_pending_bytes=1024)
+    futures = {key: stage.submit(b"x" * 10, key) for key in ("a", "b", "c", "d")}
+
+    upload.released.set()
+    results = stage.drain()
+
+    assert sorted(result.object_key for result in results) == ["a", "b", "c", "d"]
+    by_key = {result.object_key: result for result in results}
+    assert by_key["b"].url is None and by_key["b"].error == "upload of b failed"
+    assert all(by_key[key].url == f"s3://bucket/{key}" and by_key[key].error is None for key in "acd")
+    assert all(result.size == 10 and result.seconds > 0 for result in results)
+    with pytest.raises(RuntimeError):
+        futures["b"].result()
+    assert futures["c"].result() == "s3://bucket/c"
+
+    stats = stage.get_stats()
+    assert (stats["uploads"], stats["failed"], stats["bytes"], stats["pending"]) == (3, 1, 30, 0)
+    assert stage.drain() == []
+    stage.close()
+
+
+def test_submit_blocks_once_the_byte_budget_is_exhausted():
+    upload = SlowUploads()
+    stage = UploadStage(upload, max_workers=4, max_pending_bytes=100)
+    stage.submit(b"x" * 60, "first")
+
+    thread, futures = submit_in_thread(stage, b"x" * 60, "second")
+    thread.join(0.3)
+    assert thread.is_alive() and not futures
+    assert stage.get_stats()["pending"] == 1
+
+    upload.released.set()
+    thread.join(5)
+    assert not thread.is_alive() and len(futures) == 1
+    assert len(stage.drain()) == 2
+
+    stats = stage.get_stats()
+    assert stats["backpressure_seconds"] >= 0.3
+    assert stats["peak_pending_bytes"] == 60
+    stage.close()
+
+
+def test_an_image_over_the_budget_is_accepted_once_nothing_is_pending():
+    upload = SlowUploads()
+    upload.released.set()
+    stage = UploadStage(upload, max_workers=2, max_pending_bytes=100)
+
+    assert stage.submit(b"x" * 500, "large").result(5) == "s3://bucket/large"
+    results = stage.drain()
+
+    assert [(result.object_key, result.size) for result in results] == [("large", 500)]
+    assert stage.get_stats()["peak_pending_bytes"] == 500
+    stage.close()
+
+
+def test_drain_waits_for_slow_uploads():
+    upload = SlowUploads()
+    stage = UploadStage(upload, max_workers=1, max_pending_bytes=1024)
+    for key in ("a", "b", "c"):
+        stage.submit(b"x", key)
+
+    drained = []
+    thread = threading.Thread(target=lambda: drained.extend(stage.drain()), daemon=True)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive() and not drained
+
+    upload.released.set()
+    thread.join(5)
+    assert [result.object_key for result in drained] == ["a", "b", "c"]
+    assert upload.started == ["a", "b", "c"]
+    stage.close()